@@ -1,13 +1,26 @@
 import os
+import re
+import io
+import csv
+import json
+import base64
+import bisect
+import hashlib
 import operator
 import random
+import time
+import threading
+import click
 import googleapiclient
 import yagmail
 import secrets
+from collections import deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from sqlite3 import dbapi2 as sqlite3
-from flask import Flask, request, g, redirect, url_for, render_template, flash, session
+from flask import Flask, request, g, redirect, url_for, render_template, flash, session, jsonify
+from werkzeug.datastructures import MultiDict
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -15,7 +28,8 @@ from flask_limiter.errors import RateLimitExceeded
 
 try:
     from google.oauth2 import service_account
-    from googleapiclient.discovery import build
+    from google.auth.credentials import AnonymousCredentials
+    from googleapiclient.discovery import build_from_document
     GOOGLE_CALENDAR_AVAILABLE = True
 except ImportError:
     GOOGLE_CALENDAR_AVAILABLE = False
@@ -46,6 +60,40 @@ limiter = Limiter(
 app.config.update(
     DATABASE=os.path.join(app.root_path, 'interlinkData.db'),
     SECRET_KEY=os.getenv('SECRET_KEY'),  # use a strong secret in dev; env var in prod
+    # SQLite tuning applied to every connection, None leaves SQLite's default
+    SQLITE_JOURNAL_MODE='WAL',  # readers don't block the writer and the writer doesn't block readers
+    SQLITE_SYNCHRONOUS='NORMAL',  # safe with WAL, only the last commits can be lost on power failure
+    SQLITE_MMAP_SIZE=256 * 1024 * 1024,
+    SQLITE_CACHE_SIZE=-64000,  # negative means KiB, so about 64MB of page cache per connection
+    SQLITE_BUSY_TIMEOUT=5000,  # milliseconds to wait for a lock before "database is locked"
+    SQLITE_REUSE_CONNECTIONS=True,  # keep one warm connection per worker thread between requests
+    # Per-request SQL instrumentation
+    SQL_INSTRUMENTATION=True,
+    SQL_N_PLUS_ONE_THRESHOLD=10,  # same statement shape this many times in one request is logged as N+1
+    SQL_QUERY_BUDGETS={  # endpoint -> max queries per request
+        'home_page': 3,
+        'league_page': 8,
+        'user_page': 5,
+        'match_schedule': 4,
+        'league_manager': 6,
+        'team_view': 6,
+        'team_manager': 6,
+        'join_team_submit': 10,
+        'api_league': 3,
+        'api_standings': 2,
+        'api_games': 2,
+        'api_team': 4,
+    },
+    SQL_ENFORCE_BUDGETS=False,  # raise QueryBudgetExceeded instead of logging, the tests turn this on
+    # Schedules with at least this many games are generated by a background job
+    SCHEDULE_BACKGROUND_MIN_GAMES=5000,
+    SCHEDULE_JOB_CHUNK_SIZE=2000,  # games written per commit by a schedule job
+    SCHEDULE_JOB_STALE_MINUTES=15,  # a running job without progress for this long is marked failed
+    # Score ingestion API
+    SCORE_API_MAX_BATCH=500,  # scores accepted in one request
+    IDEMPOTENCY_KEY_TTL_HOURS=24,  # how long a keyed response is replayed to retries
+    # Mixed into page ETags, e.g. the deploy version. None uses a hash of app.py and the templates
+    PAGE_ETAG_SEED=os.getenv('PAGE_ETAG_SEED'),
 )
 
 # Set up email and password from .env for sending verification emails
@@ -56,19 +104,93 @@ PASSWORD = os.getenv('PASSWORD')
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 SERVICE_ACCOUNT_FILE = os.getenv("SERVICE_ACCOUNT_FILE")
 PUBLIC_CALENDAR_ID = os.getenv('PUBLIC_CALENDAR_ID')
+# Points the calendar client at another server, e.g. the offline stand-in in fake_calendar.py
+CALENDAR_API_ROOT = os.getenv('CALENDAR_API_ROOT')
+# Google allows at most 50 calls in one Calendar batch request
+CALENDAR_BATCH_SIZE = 50
+# Mixed into the derived event IDs so two databases never claim the same events on one calendar
+CALENDAR_EVENT_NAMESPACE = os.getenv('CALENDAR_EVENT_NAMESPACE', 'interlink')
+# Calendar API quota the governor paces calls to, and how failed calls are retried
+CALENDAR_QUOTA_PER_SECOND = float(os.getenv('CALENDAR_QUOTA_PER_SECOND', 10))
+CALENDAR_MAX_RETRIES = 5
+CALENDAR_BACKOFF_BASE = 0.5
+CALENDAR_BACKOFF_CAP = 32
+# Max number of ids bound into one "IN (...)" query
+SQL_CHUNK_SIZE = 500
+# Games per section on one match schedule page, ?per_page= can ask for up to the max
+SCHEDULE_PAGE_SIZE = 50
+# Start time of generated games when the form doesn't list any
+SCHEDULE_GAME_TIME = '19:00:00'
+# How long a game holds its venue, also the length of its calendar event
+SCHEDULE_GAME_DURATION = timedelta(hours=2)
+# Days a team rests between games, 1 means no back to back days
+SCHEDULE_REST_DAYS = 1
+# How far ahead, in game days, the scheduler looks for free slots before giving up
+SCHEDULE_MAX_DAYS = 3650
+SCHEDULE_MAX_PAGE_SIZE = 200
+# Calendar discovery document shipped with the app so building a client never fetches it
+CALENDAR_DISCOVERY_FILE = os.path.join(app.root_path, 'calendar_v3_discovery.json')
+
+# Credentials and discovery document are shared by the process, clients are kept per thread
+_calendar_lock = threading.Lock()
+_calendar_shared = {}
+_calendar_local = threading.local()
 
 def connect_db():
     """Connects to the specific database."""
     rv = sqlite3.connect(app.config['DATABASE'])
     rv.row_factory = sqlite3.Row
+
+    # Applies the SQLite tuning from the config
+    pragmas = [
+        ('busy_timeout', app.config['SQLITE_BUSY_TIMEOUT']),
+        ('journal_mode', app.config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', app.config['SQLITE_SYNCHRONOUS']),
+        ('mmap_size', app.config['SQLITE_MMAP_SIZE']),
+        ('cache_size', app.config['SQLITE_CACHE_SIZE']),
+    ]
+    for name, value in pragmas:
+        if value is not None:
+            rv.execute(f'PRAGMA {name} = {value}')
     return rv
 
+# One connection per worker thread, reused across requests when SQLITE_REUSE_CONNECTIONS is on
+_db_local = threading.local()
+
+def database_identity(database):
+    """Identifies the database file, so a file replaced under the same path is noticed"""
+    try:
+        stat = os.stat(database)
+    except OSError:
+        return database, None, None
+    return database, stat.st_dev, stat.st_ino
+
+def get_thread_db():
+    """Returns this thread's warm connection, reconnecting if the database file changed"""
+    database = app.config['DATABASE']
+    if getattr(_db_local, 'identity', None) != database_identity(database):
+        close_thread_db()
+        _db_local.connection = connect_db()
+        # Connecting can create the file, so identify it afterwards
+        _db_local.identity = database_identity(database)
+    return _db_local.connection
+
+def close_thread_db():
+    """Closes this thread's warm connection, if it has one"""
+    connection = getattr(_db_local, 'connection', None)
+    if connection is not None:
+        connection.close()
+    _db_local.connection = None
+    _db_local.identity = None
+
 def init_db():
     """Initializes the database."""
     from seed import seed
     db = get_db()
     with app.open_resource('schema.sql', mode='r') as f:
         db.cursor().executescript(f.read())
+    # schema.sql already includes every migration
+    db.execute(f'PRAGMA user_version = {get_migrations()[-1][0]}')
     db.commit()
     seed()
 
@@ -79,19 +201,184 @@ def initdb_command():
     init_db()
     print('Initialized the database.')
 
+def get_migrations():
+    """Returns (version, filename) for every migration in the migrations folder, oldest first"""
+    migrations = []
+    for filename in os.listdir(os.path.join(app.root_path, 'migrations')):
+        if filename.endswith('.sql'):
+            migrations.append((int(filename.split('_', 1)[0]), filename))
+    return sorted(migrations)
+
+def skip_existing_columns(db, script):
+    """Drops the ALTER TABLE ... ADD COLUMN statements whose column already exists
+
+    SQLite has no ADD COLUMN IF NOT EXISTS, this keeps migrations that add columns safe to re-run.
+    """
+    def add_column(match):
+        columns = {row[1] for row in db.execute(f'PRAGMA table_info({match.group(1)})')}
+        return '' if match.group(2) in columns else match.group(0)
+    return re.sub(r'ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+(\w+)[^;]*;', add_column, script, flags=re.IGNORECASE)
+
+def migrate_db():
+    """Applies the migrations newer than the database's user_version, returns the versions applied"""
+    db = get_db()
+    current = db.execute('PRAGMA user_version').fetchone()[0]
+    applied = []
+    for version, filename in get_migrations():
+        if version <= current:
+            continue
+        with app.open_resource(os.path.join('migrations', filename), mode='r') as f:
+            script = skip_existing_columns(db, f.read())
+        # Each migration and its version bump commit together, so a failed one can simply be re-run
+        try:
+            db.executescript(f'BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;')
+        except sqlite3.Error:
+            db.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Brings an existing database up to date without re-running initdb."""
+    applied = migrate_db()
+    if applied:
+        print(f"Applied migrations: {', '.join(str(version) for version in applied)}")
+    else:
+        print('Database is up to date.')
+
+def normalize_sql(sql):
+    """Reduces a statement to its shape: literals become ?, IN lists collapse and whitespace is squeezed"""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', sql)
+    return ' '.join(sql.split())
+
+class QueryBudgetExceeded(Exception):
+    """Raised when an endpoint runs more queries than its SQL_QUERY_BUDGETS entry allows"""
+
+class QueryStats:
+    """The SQL statements run in one app context and how long each took"""
+
+    def __init__(self):
+        self.statements = []
+
+    def record(self, sql, seconds):
+        self.statements.append((sql, seconds))
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def total_time(self):
+        return sum(seconds for _, seconds in self.statements)
+
+    def by_shape(self):
+        """Returns {normalized sql: [count, seconds]}"""
+        shapes = {}
+        for sql, seconds in self.statements:
+            shape = shapes.setdefault(normalize_sql(sql), [0, 0.0])
+            shape[0] += 1
+            shape[1] += seconds
+        return shapes
+
+    def n_plus_one(self, threshold):
+        """Returns (shape, count) for statement shapes repeated at least threshold times, most repeated first"""
+        repeated = [(shape, count) for shape, (count, _) in self.by_shape().items() if count >= threshold]
+        return sorted(repeated, key=lambda item: -item[1])
+
+class InstrumentedConnection:
+    """Wraps a sqlite3 connection and records every execute into a QueryStats"""
+
+    def __init__(self, connection, stats):
+        self.connection = connection
+        self.stats = stats
+
+    def execute(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return self.connection.execute(sql, *args)
+        finally:
+            self.stats.record(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return self.connection.executemany(sql, *args)
+        finally:
+            self.stats.record(sql, time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+# Lists that collect (endpoint, QueryStats) for every request while record_queries() is active
+_query_recorders = []
+
+@contextmanager
+def record_queries():
+    """Collects (endpoint, QueryStats) of each request made inside the with block, used by the tests"""
+    recorded = []
+    _query_recorders.append(recorded)
+    try:
+        yield recorded
+    finally:
+        _query_recorders.remove(recorded)
+
 def get_db():
     """Opens a new database connection if there is none yet for the
     current application context.
     """
     if not hasattr(g, 'sqlite_db'):
-        g.sqlite_db = connect_db()
+        if app.config['SQLITE_REUSE_CONNECTIONS']:
+            g.sqlite_db = get_thread_db()
+        else:
+            g.sqlite_db = connect_db()
+        if app.config['SQL_INSTRUMENTATION']:
+            g.sql_stats = QueryStats()
+            g.sqlite_db = InstrumentedConnection(g.sqlite_db, g.sql_stats)
     return g.sqlite_db
 
+@app.before_request
+def start_query_stats():
+    """Gives each request its own QueryStats, even when it runs inside a longer app context"""
+    if isinstance(g.get('sqlite_db'), InstrumentedConnection):
+        g.sql_stats = g.sqlite_db.stats = QueryStats()
+
+@app.after_request
+def check_query_budget(response):
+    """Flags requests that ran more queries than their endpoint's budget"""
+    stats = g.get('sql_stats')
+    budget = app.config['SQL_QUERY_BUDGETS'].get(request.endpoint)
+    if stats is not None and budget is not None and stats.count > budget:
+        message = f"{request.endpoint} ran {stats.count} queries, its budget is {budget}"
+        if app.config['SQL_ENFORCE_BUDGETS']:
+            raise QueryBudgetExceeded(message)
+        app.logger.warning(message)
+    return response
+
+@app.teardown_request
+def report_queries(error):
+    """Logs the request's query count and time, and any statement shape that looks like an N+1"""
+    stats = g.get('sql_stats')
+    if stats is None:
+        return
+    for recorded in _query_recorders:
+        recorded.append((request.endpoint, stats))
+    app.logger.debug(f"{request.endpoint}: {stats.count} queries in {stats.total_time * 1000:.1f}ms")
+    for shape, count in stats.n_plus_one(app.config['SQL_N_PLUS_ONE_THRESHOLD']):
+        app.logger.warning(f"Possible N+1 in {request.endpoint}: {count} x {shape}")
+
 @app.teardown_appcontext
 def close_db(error):
-    """Closes the database again at the end of the request."""
+    """Closes the database again at the end of the request, or hands a reused connection back clean."""
     if hasattr(g, 'sqlite_db'):
-        g.sqlite_db.close()
+        if app.config['SQLITE_REUSE_CONNECTIONS']:
+            # Don't let a failed request's open transaction hold locks into the next request
+            if g.sqlite_db.in_transaction:
+                g.sqlite_db.rollback()
+        else:
+            g.sqlite_db.close()
 
 
 @app.errorhandler(RateLimitExceeded)
@@ -105,6 +392,13 @@ def home_page():
     filter = request.args.get('filter', None)
     db = get_db()
 
+    # Versions only grow, so their sum changes whenever any league does
+    version = db.execute('SELECT COALESCE(SUM(version), 0), MAX(updated_at) FROM league_versions').fetchone()
+    validators = page_validators('home', version[0], version[1])
+    cached = not_modified(*validators)
+    if cached:
+        return cached
+
     # Checks and applies filter to league results
     if filter:
         cur = db.execute('SELECT id, league_name, sport, max_teams, status FROM leagues where SPORT=?', (filter,))
@@ -114,14 +408,8 @@ def home_page():
         cur = db.execute("SELECT id, league_name, sport, max_teams, status from leagues")
         leagues = cur.fetchall()
 
-    # Syncs Google Calendar games when route is run
-    if GOOGLE_CALENDAR_AVAILABLE:
-        success = sync_games_to_calendar()
-        if success:
-            # Set a flag so we know calendar is synced
-            session['calendar_connected'] = True
-
-    return render_template('homepage.html', leagues=leagues, filter=filter)
+    # Google Calendar syncing is handled by the `flask calendar-sync` command, not this route
+    return cache_page(render_template('homepage.html', leagues=leagues, filter=filter), *validators)
 
 @app.route('/user_page', methods=["GET", "POST"])
 def user_page():
@@ -140,6 +428,9 @@ def user_page():
 
     # Get user information from db
     user = db.execute("SELECT id, username, name, email FROM users WHERE username=?", (username,)).fetchone()
+    if user is None:
+        flash('User not found.')
+        return redirect(url_for('home_page'))
     user_id = user['id']
 
     # If regular user, check if their id is a league admin from leagues table to retrieve managed leagues
@@ -150,10 +441,11 @@ def user_page():
     else:
         managed_leagues = db.execute("SELECT id, league_name, sport, status FROM leagues",).fetchall()
 
-    # Select teams from leagues that user belongs to
-    teams = db.execute("SELECT DISTINCT leagues.id, leagues.league_name, leagues.sport, leagues.status FROM memberships "
-                       "JOIN teams ON memberships.team_id = teams.id JOIN leagues ON teams.league_id = leagues.id "
-                       "WHERE memberships.user_id=?", (user_id,)).fetchall()
+    # Get specific team info for display, the leagues the user plays in come from the same rows
+    teams = db.execute('SELECT teams.id, teams.name, teams.team_manager, leagues.id AS league_id, leagues.league_name, leagues.sport, '
+                       'leagues.status FROM memberships '
+                       'JOIN teams ON memberships.team_id=teams.id JOIN leagues ON teams.league_id=leagues.id WHERE '
+                       'memberships.user_id=? ORDER BY leagues.league_name', [user_id]).fetchall()
 
     # Add leagues and joined teams into one dictionary
     all_leagues = {}
@@ -165,45 +457,48 @@ def user_page():
             'status': league['status'],
             'role': 'League Manager'
         }
-    for league in teams:
-        if league['id'] not in all_leagues:
-            all_leagues[league['id']] = {
-                'id': league['id'],
-                'league_name': league['league_name'],
-                'sport': league['sport'],
-                'status': league['status'],
+    for team in teams:
+        if team['league_id'] not in all_leagues:
+            all_leagues[team['league_id']] = {
+                'id': team['league_id'],
+                'league_name': team['league_name'],
+                'sport': team['sport'],
+                'status': team['status'],
                 'role': 'Team Member'
             }
 
     all_league = list(all_leagues.values())
 
-    # Get specific team info for display
-    teams = db.execute('SELECT teams.id, teams.name, teams.team_manager, leagues.id AS league_id, leagues.league_name, leagues.sport FROM memberships '
-                       'JOIN teams ON memberships.team_id=teams.id JOIN leagues ON teams.league_id=leagues.id WHERE '
-                       'memberships.user_id=? ORDER BY leagues.league_name', [user_id]).fetchall()
-
     # Format games by league for display page
     games_in_league = {}
+    league_identifiers = {}
     for team in teams:
         league_identifier = f"{team['league_name']} ({team['sport']})"
+        league_identifiers[team['league_id']] = league_identifier
 
         # Add league entry if doesn't already exist
         if league_identifier not in games_in_league:
             games_in_league[league_identifier] = {'league_id': team['league_id'], 'league_name': team['league_name'],
                 'sport': team['sport'], 'games': []}
 
-        # Get all games involving specific team
-        games = db.execute("SELECT games.id, games.game_date, games.home_score, games.away_score, home_teams.name AS home_team, "
-                         "away_teams.name AS away_team, home_teams.id AS home_team_id, away_teams.id AS away_team_id "
-                         "FROM games JOIN teams as home_teams ON games.home_team_id=home_teams.id JOIN teams AS away_teams "
-                         "ON games.away_team_id=away_teams.id WHERE games.league_id=? AND (home_teams.id=? OR away_teams.id=?)"
-                         "ORDER BY games.game_date ASC", [team['league_id'], team['id'], team['id']]).fetchall()
-
-        # Add games to league game list
-        for game in games:
-            game_tracker = dict(game)
-            if not any(g['id'] == game_tracker['id'] for g in games_in_league[league_identifier]['games']):
-                games_in_league[league_identifier]['games'].append(game_tracker)
+    # Get all games involving any of the user's teams in one query
+    games = db.execute("SELECT games.id, games.league_id, games.game_date, games.home_score, games.away_score, "
+                       "home_teams.name AS home_team, away_teams.name AS away_team, home_teams.id AS home_team_id, "
+                       "away_teams.id AS away_team_id "
+                       "FROM games JOIN teams as home_teams ON games.home_team_id=home_teams.id JOIN teams AS away_teams "
+                       "ON games.away_team_id=away_teams.id "
+                       "WHERE games.home_team_id IN (SELECT team_id FROM memberships WHERE user_id=?) "
+                       "OR games.away_team_id IN (SELECT team_id FROM memberships WHERE user_id=?) "
+                       "ORDER BY games.game_date ASC, games.id ASC", [user_id, user_id]).fetchall()
+
+    # Add games to league game list, a game between two of the user's teams is only listed once
+    seen_games = set()
+    for game in games:
+        league_identifier = league_identifiers.get(game['league_id'])
+        if league_identifier is None or game['id'] in seen_games:
+            continue
+        seen_games.add(game['id'])
+        games_in_league[league_identifier]['games'].append(dict(game))
 
     return render_template('user_page.html', username=username, user=user, teams=teams,
                            all_league=all_league, games_in_league=games_in_league, managed_leagues=managed_leagues)
@@ -219,6 +514,7 @@ def leave_team():
     # Remove player from the team in the membership table
     db = get_db()
     db.execute("DELETE FROM memberships WHERE user_id = ? AND team_id = ?", [user_id, team_id])
+    bump_league_versions(db, [row['league_id'] for row in db.execute('SELECT league_id FROM teams WHERE id = ?', [team_id])])
     db.commit()
 
     flash(f"You have left {team_name}.")
@@ -237,11 +533,18 @@ def team_view():
 
     db = get_db()
 
-    # Get the actual team from database to get the real team_manager ID
-    team = db.execute("SELECT * FROM teams WHERE id = ?", [team_id]).fetchone()
+    # Get the actual team from database to get the real team_manager ID, older links only have the name
+    if team_id:
+        team = db.execute("SELECT * FROM teams WHERE id = ?", [team_id]).fetchone()
+    else:
+        team = db.execute("SELECT * FROM teams WHERE name = ?", [team_name]).fetchone()
+    if team is None:
+        flash('Team does not exist!')
+        return redirect(url_for('home_page'))
+    team_id = team['id']
 
     # Gets the roster and the player
-    roster = get_roster(team_name, 'name')
+    roster = get_rosters([team_id], 'name')[team_id]
     user = get_current_user()
 
     # Gets information for game display
@@ -254,7 +557,7 @@ def team_view():
                         FROM games
                                  JOIN teams ON games.home_team_id = teams.id
                                  JOIN teams as teams2 ON games.away_team_id = teams2.id
-                        WHERE (teams.id = ? OR teams2.id = ?)
+                        WHERE (games.home_team_id = ? OR games.away_team_id = ?)
                           AND games.home_score IS NULL
                           AND games.away_score IS NULL
                         ORDER BY games.game_date ASC""", [team_id, team_id])
@@ -283,27 +586,29 @@ def team_view():
 
 
 
-# Helper method to get a teams roster with only their team name
-def get_roster(team_name, type):
-    """Helper function to get the roster with either just names or sql object"""
-    db = get_db()
-    # Finds a team id from the name
-    team_id = db.execute('SELECT id FROM teams WHERE name=?', [team_name]).fetchone()[0]
-    cur = db.execute("SELECT user_id FROM memberships WHERE team_id=?", [team_id])
-    roster_ids = [row[0] for row in cur.fetchall()]
-    roster = []
-    if type == 'object':
-        # Loops and gets the players SQL object
-        for player_id in roster_ids:
-            cur=db.execute('SELECT * FROM users where id=?', [player_id])
-            roster.append(cur.fetchone())
-    elif type == "name":
-        # Loops through player ids and gets their real name for display
-        for player_id in roster_ids:
-            cur=db.execute('SELECT name FROM users WHERE id=?',[player_id])
-            roster.append(cur.fetchone()[0])
-    return roster
+# Helper methods to get team rosters by team id
+def get_rosters(team_ids, type):
+    """Helper function to get the rosters of many teams with one query per chunk of team ids
 
+    Returns {team_id: roster} with a (possibly empty) list for every requested team. With type 'name'
+    a roster is the players' names, with 'object' it is their users rows.
+    """
+    db = get_db()
+    team_ids = sorted(set(int(team_id) for team_id in team_ids))
+    rosters = {team_id: [] for team_id in team_ids}
+    for start in range(0, len(team_ids), SQL_CHUNK_SIZE):
+        chunk = team_ids[start:start + SQL_CHUNK_SIZE]
+        marks = ','.join('?' * len(chunk))
+        cur = db.execute(f"""SELECT memberships.team_id AS roster_team_id, users.*
+                             FROM memberships JOIN users ON users.id = memberships.user_id
+                             WHERE memberships.team_id IN ({marks})
+                             ORDER BY memberships.team_id, memberships.user_id""", chunk)
+        for player in cur:
+            if type == 'object':
+                rosters[player['roster_team_id']].append(player)
+            elif type == 'name':
+                rosters[player['roster_team_id']].append(player['name'])
+    return rosters
 
 
 @app.route('/league_creation', methods=["GET", "POST"])
@@ -370,27 +675,25 @@ def delete_league(league_id):
     if GOOGLE_CALENDAR_AVAILABLE:
         service = get_calendar_service()
         if service:
-            # Look up each games calendar event ID from the sync table
-            synced_record = db.execute(
-                'SELECT calendar_event_id FROM calendar_synced_games WHERE league_id = ?',
+            # Find the games that were pushed to the calendar and the event IDs they were stored with
+            synced_records = db.execute(
+                'SELECT game_id, league_id, calendar_event_id FROM calendar_synced_games WHERE league_id = ?',
                 (league_id,)
             ).fetchall()
 
-            if synced_record:
-                for record in synced_record:
-                    # Delete the event using the stored event ID
-                    service.events().delete(
-                        calendarId=PUBLIC_CALENDAR_ID,
-                        eventId=record['calendar_event_id']
-                    ).execute()
-
-                # Remove from synced games table
-                db.execute('DELETE FROM calendar_synced_games WHERE league_id = ?', (league_id,))
+            # Delete the events in batches and only forget the ones Google actually removed
+            deleted, failed = delete_calendar_events(service, synced_records)
+            db.executemany('DELETE FROM calendar_synced_games WHERE game_id = ?', [(game_id,) for game_id in deleted])
+            if failed:
+                app.logger.warning(f"League {league_id}: {len(failed)} calendar events could not be deleted")
 
     # Delete games first
     db.execute("DELETE FROM games WHERE league_id = ?", (league_id,))
+    prune_game_changes(db)
+    db.execute("DELETE FROM standings WHERE league_id = ?", (league_id,))
     # Delete all memberships for that league
     db.execute("DELETE FROM memberships WHERE league_id = ?", (league_id,))
+    bump_league_versions(db, [league_id])
     db.commit()
     # And the league itself
     db.execute("DELETE FROM leagues WHERE id = ?", (league_id,))
@@ -398,37 +701,478 @@ def delete_league(league_id):
     flash(f'League has been deleted.')
     return redirect(url_for('home_page'))
 
-def month_days(month, year):
-    """Days in month helper function for schedule auto-generation route"""
-    # Months with thirty days versus thirty one
-    days_thirty_one = [1, 3, 5, 7, 8, 10, 12]
-    days_thirty = [4, 6, 9, 11]
-    if month in days_thirty_one:
-        return 31
-    elif month in days_thirty:
-        return 30
-
-    # Leap year calculation
+def round_robin_rounds(team_ids, double=True):
+    """Pairs teams into rounds with the circle method
+
+    One team stays put while the others rotate around it, so every team plays at most once per round
+    and every pair meets once per cycle; with an odd count one team has a bye each round. Home and away
+    swap every round, so the fixed team alternates perfectly and the others break the pattern only when
+    they cross sides of the circle. With double, a second cycle repeats the rounds with home and away
+    swapped. Returns a list of rounds, each a list of (home_id, away_id).
+    """
+    teams = list(team_ids)
+    if len(teams) < 2:
+        return []
+    if len(teams) % 2:
+        teams.append(None)
+    count = len(teams)
+    rotating = teams[1:]
+    rounds = []
+    for number in range(count - 1):
+        lineup = [teams[0]] + rotating
+        pairs = []
+        for i in range(count // 2):
+            home, away = lineup[i], lineup[count - 1 - i]
+            if home is None or away is None:
+                continue
+            if number % 2:
+                home, away = away, home
+            pairs.append((home, away))
+        rounds.append(pairs)
+        rotating = rotating[-1:] + rotating[:-1]
+    if double:
+        rounds += [[(away, home) for home, away in pairs] for pairs in rounds]
+    return rounds
+
+def round_dates(start_date, round_count, rounds_per_week):
+    """Dates of the rounds: rounds_per_week rounds spread evenly over each week, starting on start_date"""
+    spacing = max(1, 7 // rounds_per_week)
+    return [start_date + timedelta(days=7 * (number // rounds_per_week) + spacing * (number % rounds_per_week))
+            for number in range(round_count)]
+
+def play_days(start_date, weekdays, blackout_dates=()):
+    """Yields the dates from start_date on that fall on one of the weekdays (Monday is 0) and aren't blacked out"""
+    if not weekdays:
+        return
+    day = start_date
+    while True:
+        if day.weekday() in weekdays and day not in blackout_dates:
+            yield day
+        day += timedelta(days=1)
+
+def schedule_seconds(game_date):
+    """Start of a "YYYY-MM-DD HH:MM:SS" game in seconds from 0001-01-01, a game without a time starts at SCHEDULE_GAME_TIME"""
+    date_part, _, time_part = str(game_date).replace('T', ' ').partition(' ')
+    time_part = time_part[:8] if len(time_part) >= 8 else SCHEDULE_GAME_TIME
+    start = datetime.strptime(f"{date_part} {time_part}", '%Y-%m-%d %H:%M:%S')
+    return start.toordinal() * 86400 + start.hour * 3600 + start.minute * 60 + start.second
+
+def pack_schedule(rounds, days, times, venue_ids=(), booked=None, rest_days=SCHEDULE_REST_DAYS):
+    """Assigns every game of the rounds to a free (date, time, venue) slot
+
+    Games are placed round by round, each in the earliest slot where neither team has played within
+    rest_days days before, so a team never plays twice a day and with rest_days=1 never on back to back
+    days. Every game holds its venue for SCHEDULE_GAME_DURATION, so a slot is only used if that interval
+    doesn't overlap another game at the venue: one placed here, or one in booked, which maps venue_id
+    to the sorted schedule_seconds() starts of other leagues' games. Without venues there is no venue
+    to double-book, so every time has room for a full round.
+
+    Days are loaded lazily from the days iterator. Each day keeps its free slots in time order and days
+    that fill up are skipped with path compressed pointers, so placing a game costs a bisect plus
+    near constant time rather than a scan of the games already placed. A slot that turns out to overlap
+    a game is dropped when it comes up.
+    Returns (home_id, away_id, game_date, venue_id) tuples.
+    """
+    times = sorted(times)
+    duration = int(SCHEDULE_GAME_DURATION.total_seconds())
+    # Seconds from midnight of each "HH:MM:SS" time
+    offsets = {time: sum(int(part) * unit for part, unit in zip(time.split(':'), (3600, 60, 1))) for time in times}
+    # Starts of the games at each venue so far, sorted
+    taken = {venue_id: list((booked or {}).get(venue_id, ())) for venue_id in venue_ids}
+
+    def overlaps(venue_id, start):
+        starts = taken[venue_id]
+        index = bisect.bisect_left(starts, start - duration + 1)
+        return index < len(starts) and starts[index] < start + duration
+
+    if venue_ids:
+        slot_template = [(time, venue_id) for time in times for venue_id in venue_ids]
     else:
-        if (year % 4 == 0 and year % 100 != 0) or (year % 400 == 0):
-            return 29
-        return 28
+        round_size = max((len(pairs) for pairs in rounds), default=0)
+        slot_template = [(time, None) for time in times for _ in range(round_size)]
+    if not slot_template:
+        raise ValueError('At least one game time is needed')
+
+    dates = []      # "YYYY-MM-DD" of the days loaded so far
+    ordinals = []   # their date ordinals, for bisect
+    free = []       # free (time, venue_id) slots of each day, earliest first
+    skip = []       # where to look next once a day is full
+
+    def load_day():
+        day = next(days, None)
+        if day is None or len(dates) >= SCHEDULE_MAX_DAYS:
+            raise ValueError('Not enough free slots to fit the schedule')
+        date_str = f"{day:%Y-%m-%d}"
+        dates.append(date_str)
+        ordinals.append(day.toordinal())
+        free.append(deque(slot_template))
+        skip.append(len(skip) + 1)
+
+    def first_free_day(index):
+        # Follows the skip pointers from index to the first day with a free slot, loading days as needed
+        path = []
+        while True:
+            while index >= len(dates):
+                load_day()
+            if free[index]:
+                break
+            path.append(index)
+            index = skip[index]
+        for full in path:
+            skip[full] = index
+        return index
+
+    last_played = {}
+    games = []
+    for pairs in rounds:
+        for home_id, away_id in pairs:
+            earliest = max(last_played.get(home_id, -rest_days - 1), last_played.get(away_id, -rest_days - 1)) + rest_days + 1
+            while not ordinals or ordinals[-1] < earliest:
+                load_day()
+            index = first_free_day(bisect.bisect_left(ordinals, earliest))
+            while True:
+                time, venue_id = free[index].popleft()
+                if venue_id is None:
+                    break
+                start = ordinals[index] * 86400 + offsets[time]
+                if not overlaps(venue_id, start):
+                    bisect.insort(taken[venue_id], start)
+                    break
+                index = first_free_day(index)
+            last_played[home_id] = last_played[away_id] = ordinals[index]
+            games.append((home_id, away_id, f"{dates[index]} {time}", venue_id))
+    return games
+
+def default_weekdays(start_date, games_per_week):
+    """Weekdays of games_per_week game days spread evenly over the week, starting on start_date's weekday"""
+    return {day.weekday() for day in round_dates(start_date, games_per_week, games_per_week)}
+
+def get_venue_ids(db, names):
+    """Returns the ids of the venues with these names, creating the ones that don't exist yet
+
+    Known venues are only read. New ones are inserted and committed right away, so the caller is
+    never left holding the write lock for them.
+    """
+    query = f"SELECT id, name FROM venues WHERE name IN ({','.join('?' * len(names))})"
+    ids = {row['name']: row['id'] for row in db.execute(query, names)}
+    missing = [name for name in names if name not in ids]
+    if missing:
+        db.executemany('INSERT OR IGNORE INTO venues (name) VALUES (?)', [(name,) for name in missing])
+        db.commit()
+        ids = {row['name']: row['id'] for row in db.execute(query, names)}
+    return [ids[name] for name in names]
+
+def get_venue_bookings(db, venue_ids, start_date, league_id):
+    """Sorted schedule_seconds() starts of the games at each venue from start_date on, except this league's unplayed games
+
+    Returns {venue_id: [start, ...]}. Games from the day before are included, a late one can run past midnight.
+    """
+    bookings = {venue_id: [] for venue_id in venue_ids}
+    if not venue_ids:
+        return bookings
+    cur = db.execute(f"""SELECT game_date, venue_id FROM games
+                         WHERE venue_id IN ({','.join('?' * len(venue_ids))}) AND game_date >= ?
+                           AND NOT (league_id = ? AND home_score IS NULL AND away_score IS NULL)""",
+                     [*venue_ids, f"{start_date - timedelta(days=1):%Y-%m-%d}", league_id])
+    for row in cur:
+        bookings[row['venue_id']].append(schedule_seconds(row['game_date']))
+    for starts in bookings.values():
+        starts.sort()
+    return bookings
+
+def parse_schedule_form(form):
+    """Reads the generate schedule form, raises ValueError with a message for the user when it's invalid
+
+    Returns a dict with start_date, weekdays, times, venues (names) and blackout_dates.
+    """
+    try:
+        start_date = datetime.strptime(form['start_date'], '%Y-%m-%d').date()
+        games_per_week = min(max(int(form.get('games_per_week', 2)), 1), 7)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('Please choose a valid start date and games per week')
+
+    weekdays = {int(day) for day in form.getlist('weekdays') if day.isdecimal() and int(day) < 7}
+    if not weekdays:
+        weekdays = default_weekdays(start_date, games_per_week)
+
+    times = []
+    for time in (form.get('times') or SCHEDULE_GAME_TIME).replace(',', ' ').split():
+        try:
+            times.append(datetime.strptime(time, '%H:%M').strftime('%H:%M:%S'))
+        except ValueError:
+            try:
+                times.append(datetime.strptime(time, '%H:%M:%S').strftime('%H:%M:%S'))
+            except ValueError:
+                raise ValueError(f'"{time}" is not a valid game time, use HH:MM')
+
+    venues = list(dict.fromkeys(name.strip() for name in (form.get('venues') or '').split(',') if name.strip()))
+
+    blackout_dates = set()
+    for day in (form.get('blackout_dates') or '').replace(',', ' ').split():
+        try:
+            blackout_dates.add(datetime.strptime(day, '%Y-%m-%d').date())
+        except ValueError:
+            raise ValueError(f'"{day}" is not a valid blackout date, use YYYY-MM-DD')
+
+    return {'start_date': start_date, 'weekdays': weekdays, 'times': sorted(set(times)), 'venues': venues,
+            'blackout_dates': blackout_dates}
 
-def date(year, month, day, add_days):
-    """Helper function for schedule auto-generation feature that increments dates"""
-    day += add_days
+def build_schedule(db, league_id, team_ids, options):
+    """Builds a league's double round robin from parsed schedule form options
 
-    # Change to next month
-    while day > month_days(month, year):
-        day -= month_days(month, year)
-        month += 1
+    Returns (home_id, away_id, game_date, venue_id) tuples that avoid the other leagues' venue bookings.
+    """
+    venue_ids = get_venue_ids(db, options['venues']) if options['venues'] else []
+    booked = get_venue_bookings(db, venue_ids, options['start_date'], league_id)
+    days = play_days(options['start_date'], options['weekdays'], options['blackout_dates'])
+    return pack_schedule(round_robin_rounds(team_ids), days, options['times'], venue_ids, booked)
+
+def plan_reschedule(existing, schedule):
+    """Diffs a wanted schedule against a league's unplayed games
+
+    existing are game rows (id, home_team_id, away_team_id, game_date, venue_id), schedule is
+    (home_id, away_id, game_date, venue_id) tuples. Games with the same pairing and slot are kept, games
+    whose pairing is still wanted in another slot are moved, and the rest are added or removed.
+    Returns {'keep': [ids], 'move': [(game_date, venue_id, id)], 'insert': [schedule tuples], 'delete': [ids]}.
+    """
+    # Exact matches first, grouped so repeated pairings in one slot are matched one to one
+    unmatched = {}
+    for game in sorted(existing, key=lambda game: (game['game_date'] or '', game['id'])):
+        key = (game['home_team_id'], game['away_team_id'], game['game_date'], game['venue_id'])
+        unmatched.setdefault(key, deque()).append(game['id'])
+    keep = []
+    wanted = []
+    for slot in schedule:
+        ids = unmatched.get(slot)
+        if ids:
+            keep.append(ids.popleft())
+        else:
+            wanted.append(slot)
+
+    # Then a leftover game of the same pairing is moved into each slot that's still wanted, earliest first
+    leftovers = {}
+    for (home_id, away_id, _, _), ids in sorted(unmatched.items(), key=lambda item: item[0][2] or ''):
+        leftovers.setdefault((home_id, away_id), deque()).extend(ids)
+    move = []
+    insert = []
+    for home_id, away_id, game_date, venue_id in wanted:
+        ids = leftovers.get((home_id, away_id))
+        if ids:
+            move.append((game_date, venue_id, ids.popleft()))
+        else:
+            insert.append((home_id, away_id, game_date, venue_id))
+    delete = [game_id for ids in leftovers.values() for game_id in ids]
+    return {'keep': keep, 'move': move, 'insert': insert, 'delete': delete}
+
+def apply_reschedule(db, league_id, plan, chunk_size=None, progress=None):
+    """Writes a plan_reschedule() plan to the games table
+
+    Without chunk_size the caller commits. With it, every chunk_size games are committed on their own
+    after calling progress(done, total), so a large schedule never holds the write lock for long.
+    """
+    steps = [
+        ('DELETE FROM games WHERE id = ?', [(game_id,) for game_id in plan['delete']]),
+        ('UPDATE games SET game_date = ?, venue_id = ? WHERE id = ?', plan['move']),
+        ('INSERT INTO games (league_id, home_team_id, away_team_id, game_date, venue_id, home_score, away_score) '
+         'VALUES (?, ?, ?, ?, ?, NULL, NULL)',
+         [(league_id, home_id, away_id, game_date, venue_id) for home_id, away_id, game_date, venue_id in plan['insert']]),
+    ]
+    if chunk_size is None:
+        for statement, rows in steps:
+            db.executemany(statement, rows)
+        prune_game_changes(db)
+        bump_league_versions(db, [league_id])
+        return
+
+    total = sum(len(rows) for _, rows in steps)
+    done = 0
+    for statement, rows in steps:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            db.executemany(statement, chunk)
+            done += len(chunk)
+            prune_game_changes(db)
+            bump_league_versions(db, [league_id])
+            if progress:
+                progress(done, total)
+            db.commit()
+
+def reschedule_league(db, league_id, team_ids, options, incremental, chunk_size=None, progress=None):
+    """Builds a league's schedule and writes it over its unplayed games, returns the plan_reschedule() plan
 
-        # Change to next year
-        if month > 12:
-            month = 1
-            year += 1
+    Incremental mode only touches the games that differ, otherwise every unplayed game is replaced.
+    Raises ValueError before changing anything when the schedule doesn't fit. The caller commits unless
+    chunk_size is given, see apply_reschedule().
+    """
+    # Build the whole schedule before touching the games or the calendar, nothing is written until the
+    # calendar calls are done so other writers aren't blocked while they are paced
+    schedule = build_schedule(db, league_id, team_ids, options)
+    existing = db.execute('SELECT id, home_team_id, away_team_id, game_date, venue_id FROM games '
+                          'WHERE league_id=? AND home_score IS NULL AND away_score IS NULL', [league_id]).fetchall()
+    if incremental:
+        plan = plan_reschedule(existing, schedule)
+    else:
+        plan = {'keep': [], 'move': [], 'insert': list(schedule), 'delete': [game['id'] for game in existing]}
+
+    # Delete the removed games from Google Calendar if available, moved games are patched by the next sync
+    if GOOGLE_CALENDAR_AVAILABLE and plan['delete']:
+        service = get_calendar_service()
+        if service:
+            # Find the removed games that were pushed to the calendar, chunked to stay under SQLite's variable limit
+            synced_records = []
+            for start in range(0, len(plan['delete']), SQL_CHUNK_SIZE):
+                chunk = plan['delete'][start:start + SQL_CHUNK_SIZE]
+                synced_records += db.execute(
+                    f"SELECT game_id, league_id, calendar_event_id FROM calendar_synced_games "
+                    f"WHERE game_id IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall()
+
+            # Delete the events in batches and remove them from the synced games table
+            deleted, failed = delete_calendar_events(service, synced_records)
+            db.executemany('DELETE FROM calendar_synced_games WHERE game_id = ?', [(game_id,) for game_id in deleted])
+            if failed:
+                app.logger.warning(f"League {league_id}: {len(failed)} calendar events could not be deleted")
+
+    apply_reschedule(db, league_id, plan, chunk_size, progress)
+    return plan
+
+def reschedule_summary(plan):
+    """The delta of a reschedule, as shown to the admin"""
+    return (f"Schedule updated: {len(plan['keep'])} games unchanged, {len(plan['move'])} moved, "
+            f"{len(plan['insert'])} added, {len(plan['delete'])} removed")
+
+def run_schedule_job(job_id):
+    """Runs a queued schedule job, recording its progress and outcome in its schedule_jobs row"""
+    with app.app_context():
+        db = get_db()
+        # Claiming the job with a conditional update keeps two workers from running it
+        claimed = db.execute("UPDATE schedule_jobs SET status = 'running', updated_at = CURRENT_TIMESTAMP "
+                             "WHERE id = ? AND status = 'queued'", [job_id]).rowcount
+        db.commit()
+        if not claimed:
+            return
+        job = db.execute('SELECT league_id, form FROM schedule_jobs WHERE id = ?', [job_id]).fetchone()
+
+        def progress(done, total):
+            db.execute('UPDATE schedule_jobs SET done = ?, total = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                       [done, total, job_id])
+
+        try:
+            form = MultiDict(json.loads(job['form']))
+            team_ids = [row['id'] for row in db.execute('SELECT id FROM teams WHERE league_id=?', [job['league_id']])]
+            plan = reschedule_league(db, job['league_id'], team_ids, parse_schedule_form(form),
+                                     bool(form.get('incremental')), app.config['SCHEDULE_JOB_CHUNK_SIZE'], progress)
+            status, message = 'done', reschedule_summary(plan)
+        except Exception as error:
+            db.rollback()
+            app.logger.exception(f"Schedule job {job_id} failed")
+            status, message = 'failed', str(error)
+        db.execute('UPDATE schedule_jobs SET status = ?, message = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                   [status, message, job_id])
+        db.commit()
 
-    return year, month, day
+def start_schedule_job(job_id):
+    """Runs a schedule job on a background thread"""
+    def work():
+        try:
+            run_schedule_job(job_id)
+        finally:
+            close_thread_db()
+    threading.Thread(target=work, daemon=True).start()
+
+def fail_stale_schedule_jobs(db):
+    """Marks running jobs that stopped reporting progress as failed, returns how many
+
+    A job only lives in its process's thread, if the process dies the row would stay running and block
+    the league's next job. The caller commits.
+    """
+    return db.execute("""UPDATE schedule_jobs SET status = 'failed', updated_at = CURRENT_TIMESTAMP,
+                                message = 'The schedule job stopped responding, please try again'
+                         WHERE status = 'running' AND updated_at < datetime('now', ?)""",
+                      [f"-{app.config['SCHEDULE_JOB_STALE_MINUTES']} minutes"]).rowcount
+
+def resume_schedule_jobs():
+    """Fails stale jobs and starts the queued ones no thread picked up, returns the job ids started
+
+    Run when the app starts. A job is claimed with a conditional update, so starting one that
+    another process already runs is harmless.
+    """
+    db = connect_db()
+    try:
+        fail_stale_schedule_jobs(db)
+        queued = [row['id'] for row in db.execute("SELECT id FROM schedule_jobs WHERE status = 'queued'")]
+        db.commit()
+    finally:
+        db.close()
+    for job_id in queued:
+        start_schedule_job(job_id)
+    return queued
+
+_schedule_jobs_resumed = False
+_schedule_jobs_lock = threading.Lock()
+
+@app.before_request
+def resume_schedule_jobs_once():
+    """Recovers the schedule jobs left behind by the previous process, on this process's first request"""
+    global _schedule_jobs_resumed
+    if _schedule_jobs_resumed:
+        return
+    with _schedule_jobs_lock:
+        if _schedule_jobs_resumed:
+            return
+        _schedule_jobs_resumed = True
+        try:
+            resumed = resume_schedule_jobs()
+        except sqlite3.Error:
+            # e.g. a database that still needs flask migrate, requests shouldn't fail over this
+            app.logger.exception("Could not resume schedule jobs")
+            return
+    if resumed:
+        app.logger.info(f"Resumed schedule jobs {resumed}")
+
+def parse_schedule_cursor(cursor):
+    """Turns a "game_date,id" cursor from the url into (game_date, id), or None if it's missing or malformed"""
+    if not cursor:
+        return None
+    game_date, _, game_id = cursor.rpartition(',')
+    if not game_date or not game_id.isdecimal():
+        return None
+    return game_date, int(game_id)
+
+def get_schedule_page(league_id, finished, after=None, per_page=SCHEDULE_PAGE_SIZE):
+    """Gets one page of a league's upcoming or finished games with the team names joined in
+
+    Pages are keyed on (game_date, id): upcoming games run oldest first, finished games newest first,
+    and after is the (game_date, id) of the last game on the previous page. Returns (games, next cursor),
+    the cursor is None on the last page.
+    """
+    db = get_db()
+    if finished:
+        condition = 'games.home_score IS NOT NULL AND games.away_score IS NOT NULL'
+        keyset, order = '(games.game_date, games.id) < (?, ?)', 'DESC'
+    else:
+        condition = '(games.home_score IS NULL OR games.away_score IS NULL)'
+        keyset, order = '(games.game_date, games.id) > (?, ?)', 'ASC'
+    params = [league_id]
+    if after is not None:
+        condition += ' AND ' + keyset
+        params.extend(after)
+    # One extra row tells whether there is another page
+    params.append(per_page + 1)
+    games = db.execute(f"""SELECT games.id, games.game_date, games.home_score, games.away_score,
+                                  games.home_team_id, games.away_team_id, games.version,
+                                  home.name AS home_team, away.name AS away_team, venues.name AS venue
+                           FROM games
+                           JOIN teams home ON games.home_team_id = home.id
+                           JOIN teams away ON games.away_team_id = away.id
+                           LEFT JOIN venues ON games.venue_id = venues.id
+                           WHERE games.league_id = ? AND {condition}
+                           ORDER BY games.game_date {order}, games.id {order}
+                           LIMIT ?""", params).fetchall()
+    if len(games) <= per_page:
+        return games, None
+    games = games[:per_page]
+    return games, f"{games[-1]['game_date']},{games[-1]['id']}"
 
 @app.route('/match-schedule/<int:league_id>')
 def match_schedule(league_id):
@@ -436,48 +1180,29 @@ def match_schedule(league_id):
     db = get_db()
 
     # Make sure league exists
-    league = db.execute('SELECT * FROM leagues WHERE id=?', [league_id]).fetchone()
+    league = get_league_version(league_id)
     if league is None:
         flash('League does not exist!')
         return redirect(url_for('home_page'))
 
-    # Retrieve all games in league ordered by date (starting with most recent)
-    games = db.execute('''
-                       SELECT games.id, games.game_date, games.home_score, games.away_score, games.home_team_id,
-                       games.away_team_id FROM games WHERE games.league_id = ? ORDER BY games.game_date ASC
-                       ''', [league_id]).fetchall()
-
-    # Select home and away team names
-    team_games = []
-    for game in games:
-        home_team = db.execute('SELECT name FROM teams WHERE id=?', [game['home_team_id']]).fetchone()
-        away_team = db.execute('SELECT name FROM teams WHERE id=?', [game['away_team_id']]).fetchone()
-
-        # Add all info about games into dictionary for retrieving later
-        game_dict = {
-            'id': game['id'],
-            'game_date': game['game_date'],
-            'home_score': game['home_score'],
-            'away_score': game['away_score'],
-            'home_team_id': game['home_team_id'],
-            'away_team_id': game['away_team_id'],
-            'home_team': home_team['name'],
-            'away_team': away_team['name']
-        }
-        team_games.append(game_dict)
+    validators = page_validators('schedule', league['version'], league['version_updated_at'])
+    cached = not_modified(*validators)
+    if cached:
+        return cached
 
-    finished_games = []
-    future_games = []
+    per_page = request.args.get('per_page', '')
+    per_page = min(int(per_page), SCHEDULE_MAX_PAGE_SIZE) if per_page.isdecimal() and int(per_page) > 0 else SCHEDULE_PAGE_SIZE
+    upcoming_cursor = request.args.get('upcoming')
+    finished_cursor = request.args.get('finished')
 
-    # Separate future nad finished games for display on user page
-    for game in team_games:
-        if game['home_score'] is None or game['away_score'] is None:
-            future_games.append(game)
-        else:
-            finished_games.append(game)
+    # Each section pages on its own, so its next link keeps the other section where it is
+    future_games, next_upcoming = get_schedule_page(league_id, False, parse_schedule_cursor(upcoming_cursor), per_page)
+    finished_games, next_finished = get_schedule_page(league_id, True, parse_schedule_cursor(finished_cursor), per_page)
 
-    return render_template('match_schedule.html', league=league, future_games=future_games,
-                           finished_games=finished_games)
+    return cache_page(render_template('match_schedule.html', league=league, future_games=future_games,
+                                      finished_games=finished_games, per_page=per_page,
+                                      upcoming_cursor=upcoming_cursor, finished_cursor=finished_cursor,
+                                      next_upcoming=next_upcoming, next_finished=next_finished), *validators)
 
 @app.route('/league/<int:league_id>/generate-schedule', methods=['GET', 'POST'])
 def generate_schedule(league_id):
@@ -515,100 +1240,43 @@ def generate_schedule(league_id):
             flash('League is not ready yet')
             return redirect(url_for('match_schedule', league_id=league_id))
 
-        # For displaying date of matches and incrementing
-        starting_date = request.form['start_date']
-        games_week = int(request.form.get('games_per_week'))
-
-        # Clear games that have been scheduled but not played if the matches havent started but schedule needs to be redone
-        games = db.execute(
-            'SELECT * FROM games WHERE league_id=? and home_score IS NULL AND away_score IS NULL',
-            [league_id]).fetchall()
-
-        # Delete from Google Calendar if available
-        if GOOGLE_CALENDAR_AVAILABLE:
-            service = get_calendar_service()
-            if service:
-                # Look up each games calendar event ID from the sync table
-                for game in games:
-                    synced_record = db.execute(
-                        'SELECT calendar_event_id FROM calendar_synced_games WHERE game_id = ?',
-                        [game['id']]
-                    ).fetchone()
-
-                    if synced_record:
-                            # Delete the event using the stored event ID if games are found
-                            try:
-                                service.events().delete(
-                                    calendarId=PUBLIC_CALENDAR_ID,
-                                    eventId=synced_record['calendar_event_id']
-                                ).execute()
-                            # Error handling for if a game was already deleted
-                            except googleapiclient.errors.HttpError as e:
-                                if e.resp.status == 410:  # Resource already deleted
-                                    print(f"Calendar event {game['calendar_event_id']} already deleted")
-                                    pass
-                            # Remove from synced games table
-                            db.execute('DELETE FROM calendar_synced_games WHERE game_id = ?', [game['id']])
-
-        # Remove the unplayed games from the games table
-        db.execute('DELETE FROM games WHERE league_id=? AND home_score IS NULL AND away_score IS NULL', [league_id])
-        db.commit()
-        flash('Games successfully cleared!')
-
-        # Generate team pairing with nested loops incrementing offset by one
-        pairings = []
-        for i in range(len(teams)):
-            for j in range(i + 1, len(teams)):
-                pairings.append((teams[i]['id'], teams[j]['id']))
-                pairings.append((teams[j]['id'], teams[i]['id']))
-        # For mixing up order of matches (team 1 doesn't always play first)
-        random.shuffle(pairings)
-
-        # For formatting of date and start date for schedulign
-        start_date = starting_date.split('-')
-        year = int(start_date[0])
-        month = int(start_date[1])
-        day = int(start_date[2])
-        current_game_count = 0
-
-        # Schedule pairings with associated dates, ensuring correct format
-        for home_id, away_id in pairings:
-            if month < 10:
-                month_str = '0' + str(month)
-            else:
-                month_str = str(month)
-
-            if day < 10:
-                day_str = '0' + str(day)
-            else:
-                day_str = str(day)
-
-            # Put together full date string with YYYY-MM-DD + Time format
-            game_date = str(year) + '-' + month_str + '-' + day_str + ' 19:00:00'
-
-            # Add game with information into database, default score values to NULL
-            db.execute('INSERT INTO games (league_id, home_team_id, away_team_id, game_date, home_score, away_score) '
-                       'VALUES (?, ?, ?, ?, NULL, NULL)',
-                [league_id, home_id, away_id, game_date])
-
-            # Update schedule counter
-            current_game_count += 1
-            if current_game_count >= games_week:
-                # Move to next week
-                result = date(year, month, day, 7)
-                year = result[0]
-                month = result[1]
-                day = result[2]
-                current_game_count = 0
-            else:
-                # move to next day (3 days interval between games)
-                result = date(year, month, day, 3)
-                year = result[0]
-                month = result[1]
-                day = result[2]
-
+        # Start date, game days, times, venues and blackout dates
+        try:
+            options = parse_schedule_form(request.form)
+        except ValueError as error:
+            flash(str(error))
+            return redirect(url_for('generate_schedule', league_id=league_id))
+
+        # Large leagues are scheduled by a background job that the page polls
+        team_count = len(teams)
+        if team_count * (team_count - 1) >= app.config['SCHEDULE_BACKGROUND_MIN_GAMES']:
+            # A job whose worker died doesn't block a new one
+            if fail_stale_schedule_jobs(db):
+                db.commit()
+            job = db.execute("SELECT id FROM schedule_jobs WHERE league_id=? AND status IN ('queued', 'running')",
+                             [league_id]).fetchone()
+            if job is not None:
+                flash('A schedule is already being generated for this league')
+                return redirect(url_for('generate_schedule', league_id=league_id, job=job['id']))
+            job_id = db.execute('INSERT INTO schedule_jobs (league_id, form) VALUES (?, ?)',
+                                [league_id, json.dumps(request.form.to_dict(flat=False))]).lastrowid
+            db.commit()
+            start_schedule_job(job_id)
+            return redirect(url_for('generate_schedule', league_id=league_id, job=job_id))
+
+        incremental = bool(request.form.get('incremental'))
+        try:
+            plan = reschedule_league(db, league_id, [team['id'] for team in teams], options, incremental)
+        except ValueError as error:
+            db.rollback()
+            flash(str(error))
+            return redirect(url_for('generate_schedule', league_id=league_id))
         db.commit()
-        flash('Games generated!')
+        if incremental:
+            flash(reschedule_summary(plan))
+        else:
+            flash('Games successfully cleared!')
+            flash('Games generated!')
         return redirect(url_for('match_schedule', league_id=league_id))
 
     # Display schedule generation form if the schedule already done. Check games exist
@@ -616,8 +1284,28 @@ def generate_schedule(league_id):
                      [league_id]).fetchone()
     existing_games = row['count']
 
+    # A running or finished background job is shown with its progress
+    job = None
+    if request.args.get('job', '').isdigit():
+        job = db.execute('SELECT id, status FROM schedule_jobs WHERE id=? AND league_id=?',
+                         [request.args['job'], league_id]).fetchone()
+
     return render_template('generate_schedule.html', league=league, teams=teams, num_teams=len(teams),
-                           existing_games=existing_games)
+                           existing_games=existing_games, job=job)
+
+@app.route('/league/<int:league_id>/generate-schedule/jobs/<int:job_id>')
+def schedule_job_status(league_id, job_id):
+    """Progress of a background schedule job as JSON, polled by the generate schedule page"""
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Please log in to access that page.'}), 401
+    db = get_db()
+    if fail_stale_schedule_jobs(db):
+        db.commit()
+    job = db.execute('SELECT id, status, total, done, message FROM schedule_jobs WHERE id=? AND league_id=?',
+                     [job_id, league_id]).fetchone()
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(dict(job))
 @app.route('/team-creation')
 def team_creation():
     """Route to the team creation form"""
@@ -676,11 +1364,11 @@ def join_team_submit():
     user = get_current_user()
     db = get_db()
 
-    # Gets the required ids
+    # Gets the required ids, team names are only unique within a league
     user_id = user["id"]
-    cur = db.execute('SELECT id FROM teams where name =?', [team_name])
-    team_id = cur.fetchone()[0]
     league_id = db.execute('SELECT id FROM leagues where league_name =?', [league_name]).fetchone()[0]
+    cur = db.execute('SELECT id FROM teams where name =? AND league_id =?', [team_name, league_id])
+    team_id = cur.fetchone()[0]
 
     #Checks that the user is not already a member of the team
     existing = db.execute(
@@ -699,13 +1387,15 @@ def join_team_submit():
         return redirect("/join_team_form")
 
     # Gets roster and checks if user is first in roster and should be team manager
-    roster = get_roster(team_name, "name")
+    roster = get_rosters([team_id], "name")[team_id]
     if len(roster) > 0:
         db.execute('INSERT INTO memberships (user_id, team_id, league_id) VALUES (?,?,?)', [user_id, team_id, league_id])
+        bump_league_versions(db, [league_id])
         db.commit()
     elif len(roster) == 0:
         db.execute('INSERT INTO memberships (user_id, team_id, league_id) VALUES (?,?,?)',
                    [user_id, team_id, league_id])
+        bump_league_versions(db, [league_id])
         db.commit()
         db.execute("UPDATE teams SET team_manager = ? WHERE id = ?", [user_id, team_id])
         db.commit()
@@ -783,6 +1473,7 @@ def create_team():
         # Automatically adds the user that created the team to the team
         team_id = db.execute("SELECT id FROM teams WHERE name=?", (team_name,)).fetchone()[0]
         db.execute("INSERT INTO memberships (user_id, team_id, league_id) VALUES (?,?,?)", [activeuser['id'], team_id, league_id])
+        bump_league_versions(db, [league_id])
         db.commit()
 
         flash("Team created successfully")
@@ -919,16 +1610,13 @@ def submit_score():
         home_score = request.form['home_score']
         away_score = request.form['away_score']
         # Simple validation
-        if not home_score.isdigit() or not away_score.isdigit():
-            flash('Scores must be numbers')
-        elif int(home_score) < 0 or int(away_score) < 0:
-            flash('Scores cannot be negative')
+        error = score_error(home_score, away_score)
+        if error:
+            flash(error)
         else:
             try:
-                # Updates game table with scores for specific game
-                db.execute(
-                    'UPDATE games SET home_score=?, away_score=? WHERE id=?',
-                    [home_score, away_score, game_id])
+                # Updates game table with scores for specific game, and the standings with it
+                set_game_score(db, game_id, home_score, away_score)
                 db.commit()
                 flash('Score submitted successfully!')
                 return redirect(url_for('home_page'))
@@ -982,8 +1670,7 @@ def team_manager(team_id):
     league = db.execute("SELECT * FROM leagues WHERE id=?", (team['league_id'],)).fetchone()
 
     # Get roster
-    roster = get_roster(team['name'], 'object')
-    print(roster)
+    roster = get_rosters([team['id']], 'object')[team['id']]
 
     # Get team's games
     games = db.execute("""
@@ -1077,6 +1764,7 @@ def team_manager_remove_player(team_id):
         "DELETE FROM memberships WHERE user_id = ? AND team_id = ?",
         (user_id, team_id)
     )
+    bump_league_versions(db, [team['league_id']])
     db.commit()
 
     flash(f'Removed {player_name} from team.')
@@ -1150,6 +1838,7 @@ def team_manager_add_player(team_id):
         "INSERT INTO memberships (user_id, team_id, league_id) VALUES (?, ?, ?)",
         (user_id, team_id, league_id)
     )
+    bump_league_versions(db, [league_id])
     db.commit()
 
     flash(f'Added "{username}" to team.')
@@ -1199,6 +1888,8 @@ def del_team(league_id):
 
     #Delete all memberships for that team
     db.execute("DELETE FROM memberships WHERE team_id = ?", (team_id,))
+    #Its standings row, a rebuild wouldn't remove it
+    db.execute("DELETE FROM standings WHERE team_id = ?", (team_id,))
     #And the team itself
     db.execute("DELETE FROM teams WHERE id = ?", (team_id,))
     db.commit()
@@ -1217,14 +1908,20 @@ def league_page(league_id):
     """Route to the league information page"""
     db = get_db()
 
-    # Gets the information for the league
-    league = db.execute('SELECT * FROM leagues WHERE id = ?', (league_id,)).fetchone()
+    # Gets the information for the league with its version
+    league = get_league_version(league_id)
 
     # Checks the league exists
     if league is None:
         flash("League not found")
         return redirect(url_for('home_page'))
 
+    # An unchanged league is answered without rendering
+    validators = page_validators('league', league['version'], league['version_updated_at'])
+    cached = not_modified(*validators)
+    if cached:
+        return cached
+
     # Gets teams in league
     teams = db.execute('SELECT * FROM teams WHERE league_id = ?', (league_id,)).fetchall()
 
@@ -1242,20 +1939,18 @@ def league_page(league_id):
             if activeuser['role'] == 'admin' or league['league_admin'] == activeuser['id']:
                 league_manager = True
 
-    # Sort by wins/name
+    # Sort by any of the STANDINGS_SORT_KEYS options
     sort_by = request.args.get('sort', 'wins')
+    if sort_by not in STANDINGS_SORT_KEYS:
+        sort_by = 'wins'
+    standings = sort_standings(standings, sort_by)
 
-    if sort_by == 'wins':
-        standings = sorted(standings, key=operator.itemgetter('wins'), reverse=True)
-    elif sort_by == 'name':
-        standings = sorted(standings, key=operator.itemgetter('team_name'))
-
-    return render_template('league_page.html',
-                           league=league,
-                           teams=teams,
-                           standings=standings,
-                           games=games,
-                           sort_by=sort_by, league_manager=league_manager)
+    return cache_page(render_template('league_page.html',
+                                      league=league,
+                                      teams=teams,
+                                      standings=standings,
+                                      games=games,
+                                      sort_by=sort_by, league_manager=league_manager), *validators)
 
 @app.route('/league/<int:league_id>/league_manager')
 def league_manager(league_id):
@@ -1288,14 +1983,14 @@ def league_manager(league_id):
 
     # Finds all needed team info
     team_rows = db.execute("SELECT id, name FROM teams WHERE league_id = ? ORDER BY name",(league_id,)).fetchall()
-    # Puts teams into a list of dictionary values
+    # Puts teams into a list of dictionary values, with every roster loaded in one query
+    rosters = get_rosters([row['id'] for row in team_rows], 'name')
     teams = []
     for row in team_rows:
-        roster_names = get_roster(row['name'], 'name')
         teams.append({
             'id': row['id'],
             'name': row['name'],
-            'roster': roster_names,
+            'roster': rosters[row['id']],
         })
 
     # get all games for the league, and break it up into different python variables so we can more easily use different parts of it to
@@ -1364,19 +2059,22 @@ def edit_score():
         home_score = request.form['home_score']
         away_score = request.form['away_score']
 
-        # Checks if both scores are numbers
-        if not home_score.isdigit() or not away_score.isdigit():
-            flash('Scores must be numbers')
-        elif int(home_score) < 0 or int(away_score) < 0:
-            flash('Scores cannot be negative')
+        # Checks if both scores are numbers, and that nobody changed the score since the form was loaded
+        error = score_error(home_score, away_score)
+        version = request.form.get('version')
+        current = db.execute('SELECT version FROM games WHERE id = ?', [game_id]).fetchone()
+        if error:
+            flash(error)
+        elif version is not None and current is not None and version != str(current['version']):
+            flash('This score was changed by someone else, check it and try again.')
         else:
-            # If checks were successful, update the database with scores
-            db.execute("UPDATE games SET home_score = ?, away_score = ? WHERE id = ?",[home_score, away_score, game_id])
+            # If checks were successful, update the database with scores and move the standings
+            set_game_score(db, game_id, home_score, away_score)
             db.commit()
             flash('Score updated successfully!')
             return redirect(url_for('home_page'))
 
-    game = db.execute("SELECT id, home_score, away_score, game_date FROM games WHERE id = ?", [game_id])
+    game = db.execute("SELECT id, home_score, away_score, game_date, version FROM games WHERE id = ?", [game_id])
     game = game.fetchone()
 
     # Check if game exists, if not redirect
@@ -1386,52 +2084,470 @@ def edit_score():
 
     return render_template('edit_score.html', game=game)
 
+@app.route('/league/<int:league_id>/import-scores', methods=['GET', 'POST'])
+def import_scores_page(league_id):
+    """Route for league admins to upload a CSV of scores"""
+    if not session.get('logged_in'):
+        flash('Please log in to access this page.')
+        return redirect(url_for('login'))
+    activeuser = get_current_user()
+    db = get_db()
+    league = db.execute('SELECT * FROM leagues WHERE id=?', (league_id,)).fetchone()
+    if league is None:
+        flash("League doesn't exist")
+        return redirect(url_for('home_page'))
+    if activeuser is None or (activeuser['role'] != 'admin' and activeuser['id'] != league['league_admin']):
+        flash('You do not have permission to view this page.')
+        return redirect('/')
+
+    errors = []
+    if request.method == 'POST':
+        upload = request.files.get('scores_file')
+        if upload is None or not upload.filename:
+            flash('Please choose a CSV file.')
+        else:
+            try:
+                imported, errors = import_scores(db, league_id, io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''))
+            except (UnicodeDecodeError, csv.Error):
+                imported, errors = 0, [(1, 'The file is not a UTF-8 CSV file')]
+            if imported:
+                flash(f'{imported} scores imported successfully!')
+                return redirect(url_for('league_manager', league_id=league_id))
+            if not errors:
+                flash('The file has no scores.')
+
+    return render_template('import_scores.html', league=league, errors=errors)
+
+@app.route('/api/v1/scores', methods=['POST'])
+def api_submit_scores():
+    """JSON score ingestion, see ingest_scores(). An Idempotency-Key header makes retries safe."""
+    if not session.get('logged_in'):
+        return jsonify({'error': 'Please log in to submit scores.'}), 401
+    user = get_current_user()
+    if user is None:
+        return jsonify({'error': 'Please log in to submit scores.'}), 401
+    key = request.headers.get('Idempotency-Key', '').strip()
+    if len(key) > 255:
+        return jsonify({'error': 'Idempotency-Key is too long'}), 400
+    request_hash = hashlib.sha256(request.get_data()).hexdigest()
+
+    db = get_db()
+    # Taking the write lock first makes the key lookup, version checks and writes one atomic step
+    db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        if key:
+            stored = db.execute('SELECT request_hash, status_code, response FROM idempotency_keys '
+                                'WHERE user_id = ? AND idempotency_key = ?', [user['id'], key]).fetchone()
+            if stored is not None:
+                db.rollback()
+                if stored['request_hash'] != request_hash:
+                    return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+                # A retry gets the first response again, nothing is written twice
+                response = app.response_class(stored['response'], status=stored['status_code'], mimetype='application/json')
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+        body, status = ingest_scores(db, request.get_json(silent=True), user)
+        if key:
+            db.execute('INSERT INTO idempotency_keys (user_id, idempotency_key, request_hash, status_code, response) '
+                       'VALUES (?, ?, ?, ?, ?)', [user['id'], key, request_hash, status, json.dumps(body)])
+            db.execute("DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)",
+                       [f"-{app.config['IDEMPOTENCY_KEY_TTL_HOURS']} hours"])
+        if status == 200 or key:
+            db.commit()
+        else:
+            db.rollback()
+    except Exception:
+        db.rollback()
+        raise
+    return jsonify(body), status
+
+def league_etag(kind, league_id, version):
+    """Strong ETag of one JSON representation of a league at a version, kind tells the representations apart"""
+    return hashlib.sha256(f"{kind}:{league_id}:{version}".encode()).hexdigest()[:32]
+
+def conditional_json(etag, build):
+    """Answers 304 when the client already has etag, otherwise the JSON of build() with the ETag set"""
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    # Clients may store the response but must revalidate it, which is cheap
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Same upsert as the leagues and teams triggers in schema.sql
+LEAGUE_VERSION_BUMP = """INSERT INTO league_versions (league_id, version, updated_at) VALUES (?, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP"""
+
+def bump_league_versions(db, league_ids):
+    """Moves each league's version forward once, for writes to its games, memberships or standings
+
+    Those tables are written in bulk, so they have no per-row version triggers. Readers only see
+    committed data, so one bump in the writing transaction is enough. The caller commits.
+    """
+    db.executemany(LEAGUE_VERSION_BUMP, [(league_id,) for league_id in sorted(set(league_ids)) if league_id is not None])
+
+def get_league_version(league_id):
+    """The league row with its version and when it last changed, or None if the league doesn't exist"""
+    return get_db().execute("""SELECT leagues.*, COALESCE(league_versions.version, 0) AS version,
+                                      league_versions.updated_at AS version_updated_at
+                               FROM leagues LEFT JOIN league_versions ON league_versions.league_id = leagues.id
+                               WHERE leagues.id = ?""", [league_id]).fetchone()
+
+def code_fingerprint():
+    """Hash of app.py and the templates, the same in every worker and across restarts of the same code"""
+    digest = hashlib.sha256()
+    templates = os.path.join(app.root_path, 'templates')
+    paths = [os.path.abspath(__file__)] + [os.path.join(templates, name) for name in sorted(os.listdir(templates))]
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+# Rendered pages change with the code and templates, so page ETags start over when either changes
+PAGE_ETAG_SEED = code_fingerprint()
+
+def page_validators(kind, version, updated_at):
+    """(ETag, Last-Modified) of a rendered page
+
+    The layout shows who is logged in, so the ETag covers the session user as well as the url and
+    the version. updated_at is the league_versions timestamp of the last write.
+    """
+    key = f"{app.config['PAGE_ETAG_SEED'] or PAGE_ETAG_SEED}:{kind}:{version}:{request.full_path}:" \
+          f"{session.get('logged_in')}:{session.get('username')}:{session.get('role')}"
+    etag = hashlib.sha256(key.encode()).hexdigest()[:32]
+    last_modified = None
+    if updated_at:
+        last_modified = datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return etag, last_modified
+
+def not_modified(etag, last_modified):
+    """A 304 response if the client's copy of the page is current, otherwise None
+
+    Only the ETag decides. If-Modified-Since is ignored: it can't tell visitors apart and has one
+    second resolution, so a write in the same second would be missed. Last-Modified is informational.
+    A page with flashed messages waiting is always rendered.
+    """
+    if session.get('_flashes') or etag not in request.if_none_match:
+        return None
+    return cache_page(app.response_class(status=304), etag, last_modified)
+
+def cache_page(response, etag, last_modified):
+    """Adds the page validators to a response, browsers keep the page but check it on every visit"""
+    response = app.make_response(response)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+@app.route('/api/v1/leagues/<int:league_id>')
+def api_league(league_id):
+    """A league and its teams as JSON"""
+    league = get_league_version(league_id)
+    if league is None:
+        return jsonify({'error': 'League not found'}), 404
+
+    def build():
+        teams = get_db().execute('SELECT id, name, team_manager FROM teams WHERE league_id = ? ORDER BY name',
+                                 [league_id]).fetchall()
+        return {'id': league['id'], 'name': league['league_name'], 'sport': league['sport'], 'status': league['status'],
+                'max_teams': league['max_teams'], 'version': league['version'],
+                'teams': [{'id': team['id'], 'name': team['name'], 'manager_id': team['team_manager']} for team in teams]}
+    return conditional_json(league_etag('league', league_id, league['version']), build)
+
+@app.route('/api/v1/leagues/<int:league_id>/standings')
+def api_standings(league_id):
+    """A league's standings as JSON, sorted like league_page with ?sort="""
+    league = get_league_version(league_id)
+    if league is None:
+        return jsonify({'error': 'League not found'}), 404
+    sort_by = request.args.get('sort', 'wins')
+    if sort_by not in STANDINGS_SORT_KEYS:
+        sort_by = 'wins'
+
+    def build():
+        return {'league_id': league_id, 'version': league['version'], 'sort': sort_by,
+                'standings': sort_standings(get_standings(league_id), sort_by)}
+    return conditional_json(league_etag(f'standings:{sort_by}', league_id, league['version']), build)
+
+@app.route('/api/v1/leagues/<int:league_id>/games')
+def api_games(league_id):
+    """One page of a league's upcoming games, or finished ones with ?finished=1, as JSON
+
+    Pages follow match_schedule: ?after= takes the previous page's next cursor and ?per_page= the size.
+    """
+    league = get_league_version(league_id)
+    if league is None:
+        return jsonify({'error': 'League not found'}), 404
+    finished = request.args.get('finished') == '1'
+    after = parse_schedule_cursor(request.args.get('after'))
+    per_page = request.args.get('per_page', '')
+    per_page = min(int(per_page), SCHEDULE_MAX_PAGE_SIZE) if per_page.isdecimal() and int(per_page) > 0 else SCHEDULE_PAGE_SIZE
+
+    def build():
+        games, next_cursor = get_schedule_page(league_id, finished, after, per_page)
+        return {'league_id': league_id, 'version': league['version'], 'next': next_cursor,
+                'games': [{'id': game['id'], 'date': game['game_date'], 'home_team_id': game['home_team_id'],
+                           'away_team_id': game['away_team_id'], 'home_team': game['home_team'],
+                           'away_team': game['away_team'], 'home_score': game['home_score'],
+                           'away_score': game['away_score'], 'venue': game['venue'], 'version': game['version']}
+                          for game in games]}
+    page = f"games:{int(finished)}:{after}:{per_page}"
+    return conditional_json(league_etag(page, league_id, league['version']), build)
+
+@app.route('/api/v1/teams/<int:team_id>')
+def api_team(team_id):
+    """A team with its roster, record and games as JSON"""
+    team = get_db().execute("""SELECT teams.id, teams.name, teams.league_id, teams.team_manager,
+                                      COALESCE(league_versions.version, 0) AS version
+                               FROM teams LEFT JOIN league_versions ON league_versions.league_id = teams.league_id
+                               WHERE teams.id = ?""", [team_id]).fetchone()
+    if team is None:
+        return jsonify({'error': 'Team not found'}), 404
+
+    def build():
+        db = get_db()
+        record = next((row for row in get_standings(team['league_id']) if row['team_id'] == team_id), None)
+        games = db.execute("""SELECT id, game_date, home_team_id, away_team_id, home_score, away_score, version
+                              FROM games WHERE home_team_id = ? OR away_team_id = ?
+                              ORDER BY game_date, id""", [team_id, team_id]).fetchall()
+        return {'id': team['id'], 'name': team['name'], 'league_id': team['league_id'],
+                'manager_id': team['team_manager'], 'version': team['version'],
+                'roster': [{'id': player['id'], 'name': player['name']}
+                           for player in get_rosters([team_id], 'object')[team_id]],
+                'record': record,
+                'games': [{'id': game['id'], 'date': game['game_date'], 'home_team_id': game['home_team_id'],
+                           'away_team_id': game['away_team_id'], 'home_score': game['home_score'],
+                           'away_score': game['away_score'], 'version': game['version']} for game in games]}
+    return conditional_json(league_etag(f'team:{team_id}', team['league_id'], team['version']), build)
+
 # GOOGLE CALENDAR METHODS
+def calendar_sync_enabled():
+    """True if the Calendar client is installed and configured, i.e. something will read the game change log"""
+    return GOOGLE_CALENDAR_AVAILABLE and bool(SERVICE_ACCOUNT_FILE or CALENDAR_API_ROOT)
+
+def prune_game_changes(db):
+    """Empties the game change log when no calendar sync runs, returns the rows removed
+
+    The triggers on games log every write, and only sync_games_to_calendar() drops the rows it handled.
+    Without Calendar the log would grow forever, so the bulk game write paths call this. The ids keep
+    counting up, so the sync watermark stays valid if Calendar is configured later. The caller commits.
+    """
+    if calendar_sync_enabled():
+        return 0
+    return db.execute('DELETE FROM game_changes').rowcount
+
 def get_calendar_service():
     """Get Google Calendar service with service account credentials"""
-    if not GOOGLE_CALENDAR_AVAILABLE:
+    if not calendar_sync_enabled():
         return None
 
-    if not SERVICE_ACCOUNT_FILE:
-        return None
+    # Reuse this thread's client, httplib2 connections are not safe to share between threads
+    service = getattr(_calendar_local, 'service', None)
+    if service is not None:
+        return service
+
+    with _calendar_lock:
+        if 'credentials' not in _calendar_shared:
+            with open(CALENDAR_DISCOVERY_FILE) as f:
+                discovery = json.load(f)
+            if CALENDAR_API_ROOT:
+                # Stand-in servers don't check auth, so no service account is needed
+                discovery['rootUrl'] = CALENDAR_API_ROOT
+                _calendar_shared['credentials'] = AnonymousCredentials()
+            else:
+                # Creates the credentials once using the service account .json file, refreshed tokens are then reused
+                _calendar_shared['credentials'] = service_account.Credentials.from_service_account_file(
+                    SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+            _calendar_shared['discovery'] = discovery
+
+    # Builds the Google calendar resource from the bundled discovery document
+    service = build_from_document(_calendar_shared['discovery'], credentials=_calendar_shared['credentials'])
+    _calendar_local.service = service
+    return service
 
-    # Creates the credentials using the service account .json file
-    credentials = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+class TokenBucket:
+    """Thread-safe token bucket that blocks callers until the quota allows their calls"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, tokens=1):
+        """Waits until the given number of tokens is available and uses them"""
+        tokens = min(tokens, self.capacity)
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                time.sleep((tokens - self.tokens) / self.rate)
+
+# Every Calendar call in the process goes through this bucket, each call in a batch counts against the quota
+calendar_bucket = TokenBucket(CALENDAR_QUOTA_PER_SECOND, max(CALENDAR_QUOTA_PER_SECOND, CALENDAR_BATCH_SIZE))
+
+def calendar_error_retryable(error):
+    """Checks if a Calendar error is a rate limit (429 or 403 rateLimitExceeded) or server error worth retrying"""
+    if not isinstance(error, googleapiclient.errors.HttpError):
+        return False
+    status = error.resp.status
+    if status == 429 or status >= 500:
+        return True
+    content = error.content.decode('utf-8', 'replace') if isinstance(error.content, bytes) else str(error.content)
+    return status == 403 and 'ratelimitexceeded' in content.lower()
 
-    # Builds the Google calendar resource
-    service = build('calendar', 'v3', credentials=credentials)
-    return service
+def calendar_backoff(attempt):
+    """Exponential backoff with full jitter for the given retry attempt"""
+    return random.uniform(0, min(CALENDAR_BACKOFF_CAP, CALENDAR_BACKOFF_BASE * 2 ** attempt))
+
+def execute_calendar_batch(service, requests):
+    """Executes (key, request) pairs as Calendar batch requests and returns {key: (response, error)}
+
+    Calls are paced by calendar_bucket, and calls that hit rate limits or server errors are
+    retried with backoff up to CALENDAR_MAX_RETRIES times before their error is returned.
+    """
+    results = {}
+    pending = list(requests)
+    attempt = 0
+    while pending:
+        retry = []
+        for start in range(0, len(pending), CALENDAR_BATCH_SIZE):
+            chunk = pending[start:start + CALENDAR_BATCH_SIZE]
+            keys = {str(key): key for key, _ in chunk}
+            answered = set()
+
+            def callback(request_id, response, exception):
+                # Each sub-response is reported separately so one failure doesn't sink the batch
+                results[keys[request_id]] = (response, exception)
+                answered.add(keys[request_id])
+
+            calendar_bucket.take(len(chunk))
+            batch = service.new_batch_http_request(callback=callback)
+            for key, request in chunk:
+                batch.add(request, request_id=str(key))
+            try:
+                batch.execute()
+            except googleapiclient.errors.HttpError as e:
+                # The whole batch failed, so mark every call in it that didn't get an answer
+                for key, _ in chunk:
+                    if key not in answered:
+                        results[key] = (None, e)
+
+            for key, request in chunk:
+                if attempt < CALENDAR_MAX_RETRIES and calendar_error_retryable(results[key][1]):
+                    retry.append((key, request))
+
+        if retry:
+            attempt += 1
+            time.sleep(calendar_backoff(attempt))
+        pending = retry
+    return results
+
+def calendar_event_gone(error, derived=True):
+    """Checks if a delete call left the event removed, 404/410 mean it was already gone
+
+    A 404 only proves that for an event ID we derived. For an ID Google assigned before events
+    had derived IDs, it may just as well mean the ID is wrong, so the event is not assumed gone.
+    """
+    if error is None:
+        return True
+    if not isinstance(error, googleapiclient.errors.HttpError):
+        return False
+    return error.resp.status == 410 or (error.resp.status == 404 and derived)
+
+def synced_event_id(record):
+    """Returns (event_id, derived) for a calendar_synced_games row
+
+    Rows synced before event IDs were derived hold the ID Google assigned, which is used as is.
+    """
+    derived_id = calendar_event_id(record['game_id'], record['league_id'])
+    stored_id = record['calendar_event_id']
+    if stored_id and stored_id != derived_id:
+        return stored_id, False
+    return derived_id, True
+
+def delete_calendar_events(service, synced_records):
+    """Deletes the events of calendar_synced_games rows in batches, returns (deleted_game_ids, failed_game_ids)
+
+    The rows need game_id, league_id and calendar_event_id, see synced_event_id().
+
+    Deletes that still fail after the governor's retries are added to calendar_dead_letters,
+    the caller commits them along with its own changes.
+    """
+    deletes = []
+    records = {record['game_id']: record for record in synced_records}
+    for record in synced_records:
+        event_id, _ = synced_event_id(record)
+        request = service.events().delete(calendarId=PUBLIC_CALENDAR_ID, eventId=event_id)
+        deletes.append((record['game_id'], request))
+    results = execute_calendar_batch(service, deletes)
+
+    deleted = []
+    failed = []
+    for game_id, (response, error) in results.items():
+        if calendar_event_gone(error, synced_event_id(records[game_id])[1]):
+            deleted.append(game_id)
+        else:
+            app.logger.warning(f"Calendar delete failed for game {game_id}: {error}")
+            failed.append((game_id, records[game_id]['league_id'], 'delete', str(error)))
+    get_db().executemany('INSERT INTO calendar_dead_letters (game_id, league_id, operation, error) VALUES (?, ?, ?, ?)',
+                         failed)
+    return deleted, [row[0] for row in failed]
+
+def calendar_event_id(game_id, league_id):
+    """Derives a game's Google Calendar event ID, so events can be inserted and deleted without a lookup
+
+    Calendar event IDs may only use the base32hex characters a-v and 0-9.
+    """
+    digest = hashlib.sha1(f"{CALENDAR_EVENT_NAMESPACE}:{league_id}:{game_id}".encode()).digest()
+    return base64.b32hexencode(digest).decode().rstrip('=').lower()
 
 def create_game_event(game):
     """Creates the calendar event for a game in database"""
     date = str(game['game_date'])
 
-    # Puts the date into the expected format for Google Calendar
+    # Puts the date into the expected format for Google Calendar, games without a time start at 7 PM
     if ' ' in date:
-        date_part = date.split(' ')[0]
+        date_part, time_part = date.split(' ', 1)
     elif 'T' in date:
-        date_part = date.split('T')[0]
+        date_part, time_part = date.split('T', 1)
     else:
-        date_part = date
-    time_part = '19:00:00'
+        date_part, time_part = date, SCHEDULE_GAME_TIME
+    time_part = time_part[:8] if len(time_part) >= 8 else SCHEDULE_GAME_TIME
 
-    # Create start datetime (7 PM)
+    # Create start datetime
     start_datetime = f"{date_part}T{time_part}"
 
     # Formats the start dateTime
     start_dt = datetime.strptime(start_datetime, '%Y-%m-%dT%H:%M:%S')
-    # Formats and adds 2hrs to the end dateTime
-    end_dt = start_dt + timedelta(hours=2)
+    # Formats and adds the game's length to the end dateTime
+    end_dt = start_dt + SCHEDULE_GAME_DURATION
     end_datetime = end_dt.strftime('%Y-%m-%dT%H:%M:%S')
 
     # Assigns a color based on the league's id
     color = str(game['league_id'])
 
+    # Adds the final score once the game has been played
+    description = f"League: {game['league_name']}\nSport: {game['sport']}\n\nHome Team: {game['home_team']}\nAway Team: {game['away_team']}"
+    if game['home_score'] is not None and game['away_score'] is not None:
+        description += f"\n\nFinal Score: {game['home_score']} - {game['away_score']}"
+
     # Creates the event
     event = {
+        'id': calendar_event_id(game['id'], game['league_id']),
         'summary': f"{game['home_team']} vs {game['away_team']}", # Makes the Title
-        'description': f"League: {game['league_name']}\nSport: {game['sport']}\n\nHome Team: {game['home_team']}\nAway Team: {game['away_team']}",
+        'description': description,
         'start': {
             'dateTime': start_datetime,
             'timeZone': 'America/Chicago'
@@ -1441,17 +2557,39 @@ def create_game_event(game):
             'timeZone': 'America/Chicago'
         },
         'colorId': color,
+        # Marks the event as ours so reconciliation can find it on a shared calendar
+        'extendedProperties': {
+            'private': {
+                'source': CALENDAR_EVENT_NAMESPACE,
+                'game_id': str(game['id']),
+                'league_id': str(game['league_id']),
+            }
+        },
     }
+    # Where the game is played, when the scheduler gave it a venue
+    if 'venue' in game.keys() and game['venue']:
+        event['location'] = game['venue']
     return event
 
+def calendar_event_hash(event):
+    """Hashes the parts of an event that create_game_event fills in, so a local and a remote event can be compared"""
+    fields = [event.get('summary'), event.get('description'), event.get('colorId'), event.get('location')]
+    for key in ('start', 'end'):
+        when = event.get(key) or {}
+        # Google answers with a UTC offset on dateTime, only the local date and time matter here
+        fields += [str(when.get('dateTime', ''))[:19], when.get('timeZone')]
+    return hashlib.sha1(json.dumps(fields).encode()).hexdigest()
+
 def sync_games_to_calendar():
-    """Sync games within 30 days to Google Calendar"""
+    """Sync changed games and games entering the 30 day window to Google Calendar, returns metrics for the run"""
     service = get_calendar_service()
     if not service:
-        flash("Service not working for calendar")
-        return False
+        app.logger.warning("Calendar sync skipped: calendar service not available")
+        return None
 
     db = get_db()
+    started = time.monotonic()
+    stats = {'scanned': 0, 'inserted': 0, 'patched': 0, 'deleted': 0, 'failed': 0, 'seconds': 0.0}
 
     # Gets the date and the date 30 days from today for the server syncing limit
     today = datetime.now().date()
@@ -1459,8 +2597,33 @@ def sync_games_to_calendar():
     today_str = today.strftime('%Y-%m-%d')
     next_week_str = next_week.strftime('%Y-%m-%d')
 
-    # Get all games within 30 days from database
-    games = db.execute("""
+    # Where the last run stopped: the last game change it handled and the end of its window
+    state = db.execute('SELECT last_change_id, window_end FROM calendar_sync_state WHERE id = 1').fetchone()
+
+    # Games changed by the triggers on the games table since the last run
+    changes = db.execute('SELECT game_id, MAX(id) AS change_id FROM game_changes WHERE id > ? GROUP BY game_id',
+                         [state['last_change_id']]).fetchall()
+    last_change_id = max([row['change_id'] for row in changes], default=state['last_change_id'])
+    changed_ids = set(row['game_id'] for row in changes)
+
+    # Games that moved into the 30 day window since the last run (the whole window on the first run)
+    if state['window_end'] is None:
+        entering = db.execute('SELECT id FROM games WHERE game_date >= ? AND game_date <= ?',
+                              [today_str, next_week_str]).fetchall()
+    else:
+        entering = db.execute('SELECT id FROM games WHERE game_date > ? AND game_date <= ?',
+                              [state['window_end'], next_week_str]).fetchall()
+    game_ids = changed_ids | set(row['id'] for row in entering)
+    stats['scanned'] = len(game_ids)
+
+    # Load the current games and their synced events, chunked to stay under SQLite's variable limit
+    games = {}
+    synced = {}
+    ids = sorted(game_ids)
+    for start in range(0, len(ids), SQL_CHUNK_SIZE):
+        chunk = ids[start:start + SQL_CHUNK_SIZE]
+        marks = ','.join('?' * len(chunk))
+        for game in db.execute(f"""
                        SELECT games.id,
                               games.game_date,
                               games.league_id,
@@ -1469,81 +2632,725 @@ def sync_games_to_calendar():
                               home_team.name as home_team,
                               away_team.name as away_team,
                               leagues.league_name,
-                              leagues.sport
+                              leagues.sport,
+                              venues.name as venue
                        FROM games
                                 JOIN teams home_team ON games.home_team_id = home_team.id
                                 JOIN teams away_team ON games.away_team_id = away_team.id
                                 JOIN leagues ON games.league_id = leagues.id
-                           WHERE games.game_date >= ? AND games.game_date <= ?
-                       ORDER BY games.game_date
-                       """,[today_str, next_week_str]).fetchall()
+                                LEFT JOIN venues ON games.venue_id = venues.id
+                       WHERE games.id IN ({marks})
+                       """, chunk):
+            games[game['id']] = game
+        for record in db.execute(f'SELECT game_id, league_id, calendar_event_id FROM calendar_synced_games '
+                                 f'WHERE game_id IN ({marks})', chunk):
+            synced[record['game_id']] = record
+
+    # Work out the one calendar call each game needs
+    events = service.events()
+    operations = {}
+    requests = []
+    for game_id in ids:
+        game = games.get(game_id)
+        record = synced.get(game_id)
+        if game is None:
+            # Game was deleted, remove its event if it still has one
+            if record is None:
+                continue
+            operations[game_id] = 'delete'
+            request = events.delete(calendarId=PUBLIC_CALENDAR_ID, eventId=synced_event_id(record)[0])
+        elif record is not None:
+            # Already on the calendar, only touch it if the game itself changed
+            if game_id not in changed_ids:
+                continue
+            operations[game_id] = 'patch'
+            # An event keeps its ID, older events have the one Google assigned
+            body = create_game_event(game)
+            del body['id']
+            request = events.patch(calendarId=PUBLIC_CALENDAR_ID, eventId=synced_event_id(record)[0], body=body)
+        elif today_str <= str(game['game_date']) <= next_week_str:
+            operations[game_id] = 'insert'
+            request = events.insert(calendarId=PUBLIC_CALENDAR_ID, body=create_game_event(game))
+        else:
+            # Unsynced game outside the window, it gets inserted once it enters the window
+            continue
+        requests.append((game_id, request))
+    results = execute_calendar_batch(service, requests)
+
+    # A 409 on insert means an earlier run already created the event (e.g. it crashed before
+    # committing), so the insert turns into a patch of that event
+    conflicts = []
+    for game_id, operation in operations.items():
+        error = results[game_id][1]
+        if operation == 'insert' and isinstance(error, googleapiclient.errors.HttpError) and error.resp.status == 409:
+            body = dict(create_game_event(games[game_id]), status='confirmed')
+            conflicts.append((game_id, events.patch(calendarId=PUBLIC_CALENDAR_ID, eventId=body['id'], body=body)))
+    results.update(execute_calendar_batch(service, conflicts))
+
+    # Apply every result to calendar_synced_games in one transaction
+    inserted = []
+    patched = []
+    deleted = []
+    dead_letters = []
+    for game_id, operation in operations.items():
+        response, error = results[game_id]
+        if operation == 'delete' and calendar_event_gone(error, synced_event_id(synced[game_id])[1]):
+            deleted.append((game_id,))
+        elif error is not None:
+            # The governor already retried it, park it in the dead letters table
+            app.logger.warning(f"Calendar {operation} failed for game {game_id}: {error}")
+            league_id = games[game_id]['league_id'] if game_id in games else synced[game_id]['league_id']
+            dead_letters.append((game_id, league_id, operation, str(error)))
+        elif operation == 'insert':
+            inserted.append((game_id, games[game_id]['league_id'], calendar_event_id(game_id, games[game_id]['league_id'])))
+        else:
+            patched.append((game_id,))
+
+    db.executemany('INSERT INTO calendar_synced_games (game_id, league_id, calendar_event_id) VALUES (?, ?, ?)',
+                   inserted)
+    db.executemany('UPDATE calendar_synced_games SET synced_at = CURRENT_TIMESTAMP WHERE game_id = ?', patched)
+    db.executemany('DELETE FROM calendar_synced_games WHERE game_id = ?', deleted)
+
+    # Move the watermark forward and drop the changes that have been handled
+    db.execute('UPDATE calendar_sync_state SET last_change_id = ?, window_end = ? WHERE id = 1',
+               [last_change_id, next_week_str])
+    db.execute('DELETE FROM game_changes WHERE id <= ?', [last_change_id])
+    db.executemany('INSERT INTO calendar_dead_letters (game_id, league_id, operation, error) VALUES (?, ?, ?, ?)',
+                   dead_letters)
+    db.commit()
 
-    # Get already synced game IDs from database
-    synced_games = db.execute('SELECT game_id FROM calendar_synced_games').fetchall()
-    synced_game_ids = set(row['game_id'] for row in synced_games)
+    stats['inserted'] = len(inserted)
+    stats['patched'] = len(patched)
+    stats['deleted'] = len(deleted)
+    stats['failed'] = len(dead_letters)
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    app.logger.info(f"Calendar sync: scanned={stats['scanned']} inserted={stats['inserted']} "
+                    f"patched={stats['patched']} deleted={stats['deleted']} failed={stats['failed']} "
+                    f"seconds={stats['seconds']}")
+    return stats
+
+
+@app.cli.command('calendar-sync')
+@click.option('--watch', is_flag=True, help='Keep running and sync again every interval.')
+@click.option('--interval', default=300, show_default=True, help='Seconds between syncs in watch mode.')
+@click.option('--requeue-dead-letters', is_flag=True, help='Retry the calls in calendar_dead_letters first.')
+def calendar_sync_command(watch, interval, requeue_dead_letters):
+    """Syncs upcoming games to Google Calendar outside of the web requests."""
+    if not GOOGLE_CALENDAR_AVAILABLE:
+        print('Google Calendar libraries are not installed.')
+        return
 
-    # Only sync games that aren't already tracked as synced
-    new_games = []
-    for game in games:
-        if game['id'] not in synced_game_ids:
-            new_games.append(game)
+    if requeue_dead_letters:
+        # Marks the games as changed again so the next sync redoes their calls
+        db = get_db()
+        db.execute("INSERT INTO game_changes (game_id, league_id, change) "
+                   "SELECT DISTINCT game_id, league_id, 'retry' FROM calendar_dead_letters")
+        requeued = db.execute('DELETE FROM calendar_dead_letters').rowcount
+        db.commit()
+        print(f'Requeued {requeued} dead letters.')
+
+    while True:
+        # Fresh app context per run, so each run has its own query stats and leaves no transaction open.
+        # get_db() still reuses this thread's warm connection between runs.
+        with app.app_context():
+            stats = sync_games_to_calendar()
+        if stats is None:
+            print('Calendar service not available.')
+        else:
+            print(f"Checked {stats['scanned']} games: {stats['inserted']} inserted, {stats['patched']} patched, "
+                  f"{stats['deleted']} deleted, {stats['failed']} failed in {stats['seconds']}s")
+        if not watch:
+            break
+        time.sleep(interval)
 
-    # Ends the process if no new games
-    if len(new_games) == 0:
-        return True
+def reconcile_calendar(full=False):
+    """Diffs the games pushed to Google Calendar against the remote events and fixes the drift
+
+    Only events changed since the last reconciliation are listed unless full is set. Returns
+    drift counts for the run, or None if the calendar or the event listing is not available.
+    """
+    service = get_calendar_service()
+    if not service:
+        app.logger.warning("Calendar reconcile skipped: calendar service not available")
+        return None
 
-    # Loops through the new games creating events and adding them to the calendar
-    for game in new_games:
+    db = get_db()
+    started = time.monotonic()
+    stats = {'remote': 0, 'local': 0, 'patched': 0, 'inserted': 0, 'deleted': 0, 'adopted': 0, 'failed': 0,
+             'seconds': 0.0}
+    state = db.execute('SELECT reconciled_at FROM calendar_sync_state WHERE id = 1').fetchone()
+    updated_min = None if full else state['reconciled_at']
+    run_started = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    # Page through our events on the calendar, deleted ones included so we can see them
+    events = service.events()
+    remote = {}
+    options = {'updatedMin': updated_min} if updated_min else {}
+    request = events.list(calendarId=PUBLIC_CALENDAR_ID, privateExtendedProperty=f"source={CALENDAR_EVENT_NAMESPACE}",
+                          showDeleted=True, maxResults=2500, **options)
+    while request is not None:
+        response, error = execute_calendar_batch(service, [('list', request)])['list']
+        if error is not None:
+            app.logger.warning(f"Calendar reconcile could not list events: {error}")
+            return None
+        for event in response.get('items', []):
+            remote[event['id']] = event
+        request = events.list_next(request, response)
+    stats['remote'] = len(remote)
+
+    # Every game we think is on the calendar, with the data its event is built from
+    game_query = """SELECT games.id, games.game_date, games.league_id, games.home_score, games.away_score,
+                           home_team.name as home_team, away_team.name as away_team, leagues.league_name, leagues.sport,
+                           venues.name as venue
+                    FROM games
+                             JOIN teams home_team ON games.home_team_id = home_team.id
+                             JOIN teams away_team ON games.away_team_id = away_team.id
+                             JOIN leagues ON games.league_id = leagues.id
+                             LEFT JOIN venues ON games.venue_id = venues.id"""
+    local = {}
+    legacy = set()
+    for record in db.execute(f"""SELECT calendar_synced_games.game_id AS synced_game_id,
+                                        calendar_synced_games.league_id AS synced_league_id,
+                                        calendar_synced_games.calendar_event_id, synced.*
+                                 FROM calendar_synced_games LEFT JOIN ({game_query}) AS synced
+                                 ON calendar_synced_games.game_id = synced.id"""):
+        # A game whose row or teams are gone (e.g. after del_team) no longer has a valid event
+        game = record if record['id'] is not None else None
+        game_id, league_id = record['synced_game_id'], record['synced_league_id']
+        event_id, derived = synced_event_id({'game_id': game_id, 'league_id': league_id,
+                                             'calendar_event_id': record['calendar_event_id']})
+        local[event_id] = (game_id, league_id, game)
+        if not derived:
+            # Older events only get the source property when the sync patches them, so they may be unlisted
+            legacy.add(event_id)
+    stats['local'] = len(local)
+
+    # Our live events that the sync table doesn't know about: adopt them if their game still exists
+    unknown = {}
+    for event_id, event in remote.items():
+        if event_id not in local and event.get('status') != 'cancelled':
+            private = (event.get('extendedProperties') or {}).get('private') or {}
+            if private.get('game_id', '').isdecimal():
+                unknown[int(private['game_id'])] = event_id
+    ids = sorted(unknown)
+    adoptable = {}
+    for start in range(0, len(ids), SQL_CHUNK_SIZE):
+        chunk = ids[start:start + SQL_CHUNK_SIZE]
+        for game in db.execute(f"{game_query} WHERE games.id IN ({','.join('?' * len(chunk))})", chunk):
+            if calendar_event_id(game['id'], game['league_id']) == unknown[game['id']]:
+                adoptable[unknown[game['id']]] = game
+
+    # Work out the minimal set of calls
+    operations = {}
+    requests = []
+    for event_id, (game_id, league_id, game) in local.items():
+        event = remote.get(event_id)
+        if game is None:
+            if event is not None and event.get('status') == 'cancelled':
+                operations[event_id] = ('forget', game_id, league_id)
+                continue
+            operations[event_id] = ('delete', game_id, league_id)
+            requests.append((event_id, events.delete(calendarId=PUBLIC_CALENDAR_ID, eventId=event_id)))
+        elif event is None:
+            # A missing event only means drift when we listed everything and could have seen it
+            if not full or event_id in legacy:
+                continue
+            operations[event_id] = ('insert', game_id, league_id)
+            requests.append((event_id, events.insert(calendarId=PUBLIC_CALENDAR_ID, body=create_game_event(game))))
+        elif event.get('status') == 'cancelled':
+            # Deleted on the calendar by hand, bring it back
+            operations[event_id] = ('insert', game_id, league_id)
+            body = dict(create_game_event(game), id=event_id, status='confirmed')
+            requests.append((event_id, events.patch(calendarId=PUBLIC_CALENDAR_ID, eventId=event_id, body=body)))
+        elif calendar_event_hash(event) != calendar_event_hash(create_game_event(game)):
+            operations[event_id] = ('patch', game_id, league_id)
+            requests.append((event_id, events.patch(calendarId=PUBLIC_CALENDAR_ID, eventId=event_id,
+                                                    body=dict(create_game_event(game), id=event_id))))
+    for event_id, event in remote.items():
+        if event_id in local or event.get('status') == 'cancelled':
+            continue
+        game = adoptable.get(event_id)
+        if game is None:
+            # Our event, but its game is gone
+            operations[event_id] = ('delete', None, None)
+            requests.append((event_id, events.delete(calendarId=PUBLIC_CALENDAR_ID, eventId=event_id)))
+        elif calendar_event_hash(event) != calendar_event_hash(create_game_event(game)):
+            operations[event_id] = ('adopt', game['id'], game['league_id'])
+            requests.append((event_id, events.patch(calendarId=PUBLIC_CALENDAR_ID, eventId=event_id,
+                                                    body=create_game_event(game))))
+        else:
+            operations[event_id] = ('adopt', game['id'], game['league_id'])
+    results = execute_calendar_batch(service, requests)
+
+    # Apply the results to calendar_synced_games in one transaction
+    forget = []
+    adopted = []
+    dead_letters = []
+    for event_id, (operation, game_id, league_id) in operations.items():
+        error = results.get(event_id, (None, None))[1]
+        if operation in ('delete', 'forget') and calendar_event_gone(error, event_id not in legacy):
+            stats['deleted'] += operation == 'delete'
+            if game_id is not None:
+                forget.append((game_id,))
+        elif error is not None:
+            app.logger.warning(f"Calendar reconcile {operation} failed for event {event_id}: {error}")
+            stats['failed'] += 1
+            if game_id is not None:
+                dead_letters.append((game_id, league_id, operation, str(error)))
+        elif operation == 'adopt':
+            adopted.append((game_id, league_id, event_id))
+        else:
+            stats['inserted' if operation == 'insert' else 'patched'] += 1
+    stats['adopted'] = len(adopted)
+
+    db.executemany('DELETE FROM calendar_synced_games WHERE game_id = ?', forget)
+    db.executemany('INSERT OR REPLACE INTO calendar_synced_games (game_id, league_id, calendar_event_id) VALUES (?, ?, ?)',
+                   adopted)
+    db.executemany('INSERT INTO calendar_dead_letters (game_id, league_id, operation, error) VALUES (?, ?, ?, ?)',
+                   dead_letters)
+    db.execute('UPDATE calendar_sync_state SET reconciled_at = ? WHERE id = 1', [run_started])
+    db.commit()
 
-        already_synced = db.execute(
-            'SELECT game_id FROM calendar_synced_games WHERE game_id = ?',
-            [game['id']]
-        ).fetchone()
+    stats['seconds'] = round(time.monotonic() - started, 3)
+    app.logger.info("Calendar reconcile: " + ' '.join(f"{key}={value}" for key, value in stats.items()))
+    return stats
 
-        if already_synced:
-            continue  # Skip if already synced
-
-        event = create_game_event(game)
-        # Insert new event
-        created_event = service.events().insert(
-            calendarId=PUBLIC_CALENDAR_ID,
-            body=event
-        ).execute()
-        # Store the game_id and calendar event_id in the database
-        db.execute(
-            'INSERT INTO calendar_synced_games (game_id, league_id, calendar_event_id) VALUES (?, ?,?)',
-            [game['id'], game['league_id'], created_event['id']]
-        )
-        db.commit()
-    flash('All games synced')
-    return True
+
+@app.cli.command('calendar-reconcile')
+@click.option('--full', is_flag=True, help='List every event instead of only the ones changed since the last run.')
+def calendar_reconcile_command(full):
+    """Compares the games on Google Calendar with the database and fixes any drift."""
+    if not GOOGLE_CALENDAR_AVAILABLE:
+        print('Google Calendar libraries are not installed.')
+        return
+
+    stats = reconcile_calendar(full)
+    if stats is None:
+        print('Calendar service not available.')
+        return
+    print(f"Compared {stats['remote']} remote events with {stats['local']} synced games: "
+          f"{stats['patched']} patched, {stats['inserted']} inserted, {stats['deleted']} deleted, "
+          f"{stats['adopted']} adopted, {stats['failed']} failed in {stats['seconds']}s")
 
 # Helper for standings
 def get_standings(league_id):
-    """Helper function to get the leagues standings"""
-    db = get_db()
-    cur = db.execute('SELECT id, name FROM teams WHERE league_id = ?', [league_id])
-    teams = cur.fetchall()
+    """Helper function to get the leagues standings
 
+    Reads the materialized standings table, so the cost depends on the number of teams and not on
+    how many games have been played. Teams without a finished game get a zero record.
+    """
+    db = get_db()
+    cur = db.execute("""SELECT teams.id AS team_id, teams.name AS team_name,
+                               COALESCE(standings.games_played, 0) AS games_played,
+                               COALESCE(standings.wins, 0) AS wins,
+                               COALESCE(standings.losses, 0) AS losses,
+                               COALESCE(standings.ties, 0) AS ties,
+                               COALESCE(standings.points_for, 0) AS points_for,
+                               COALESCE(standings.points_against, 0) AS points_against,
+                               COALESCE(standings.streak_result, '') AS streak_result,
+                               COALESCE(standings.streak_length, 0) AS streak_length
+                        FROM teams LEFT JOIN standings ON standings.team_id = teams.id
+                        WHERE teams.league_id = ?""", [league_id])
     standings = []
-    for team in teams:
-        # gets team wins from table
-        cur = db.execute(
-            'SELECT COUNT(*) FROM games WHERE league_id = ? AND ((home_team_id = ? AND home_score > away_score) OR (away_team_id = ? AND away_score > home_score))',[league_id, team['id'], team['id']])
-        wins = cur.fetchone()[0]
-
-        # gets team losses from the table
-        cur = db.execute(
-            'SELECT COUNT(*) FROM games WHERE league_id = ? AND ((home_team_id = ? AND home_score < away_score) OR (away_team_id = ? AND away_score < home_score))',[league_id, team['id'], team['id']])
-        losses = cur.fetchone()[0]
-
-        standings.append({
-            'team_id': team['id'],
-            'team_name': team['name'],
-            'wins': wins,
-            'losses': losses
-        })
+    for row in cur:
+        team = dict(row)
+        team['differential'] = team['points_for'] - team['points_against']
+        # Ties count as half a win
+        if team['games_played']:
+            team['win_pct'] = (team['wins'] + team['ties'] / 2) / team['games_played']
+        else:
+            team['win_pct'] = 0.0
+        team['streak'] = f"{team['streak_result']}{team['streak_length']}" if team['streak_length'] else ''
+        del team['streak_result'], team['streak_length']
+        standings.append(team)
+    return standings
+
+# Standings of every team with a finished game, computed from scratch. Used to rebuild and to
+# check the standings table. The streak is the latest result and how many games in a row it held.
+# Follows a "results" CTE of (id, game_date, team_id, scored, allowed) rows, one per side of each finished game.
+# ranked numbers each team's games from the latest back, latest holds the result of each team's last game.
+STANDINGS_RANKED_CTES = """
+    ranked AS (
+        SELECT team_id, scored, allowed,
+               CASE WHEN scored > allowed THEN 'W' WHEN scored < allowed THEN 'L' ELSE 'T' END AS result,
+               ROW_NUMBER() OVER (PARTITION BY team_id ORDER BY game_date DESC, id DESC) AS recency
+        FROM results
+    ), latest AS (
+        SELECT team_id, result FROM ranked WHERE recency = 1
+    )"""
+
+STANDINGS_SQL = f"""
+    WITH results AS (
+        SELECT id, game_date, home_team_id AS team_id, home_score AS scored, away_score AS allowed
+        FROM games WHERE home_score IS NOT NULL AND away_score IS NOT NULL
+                     AND (:league_id IS NULL OR league_id = :league_id)
+        UNION ALL
+        SELECT id, game_date, away_team_id, away_score, home_score
+        FROM games WHERE home_score IS NOT NULL AND away_score IS NOT NULL
+                     AND (:league_id IS NULL OR league_id = :league_id)
+    ), {STANDINGS_RANKED_CTES}
+    SELECT ranked.team_id, teams.league_id, COUNT(*) AS games_played,
+           SUM(ranked.result = 'W') AS wins, SUM(ranked.result = 'L') AS losses, SUM(ranked.result = 'T') AS ties,
+           SUM(scored) AS points_for, SUM(allowed) AS points_against, latest.result AS streak_result,
+           COALESCE(MIN(CASE WHEN ranked.result != latest.result THEN recency END) - 1, COUNT(*)) AS streak_length
+    FROM ranked
+    JOIN latest ON latest.team_id = ranked.team_id
+    JOIN teams ON teams.id = ranked.team_id
+    GROUP BY ranked.team_id"""
+
+STANDINGS_FIELDS = ('league_id', 'games_played', 'wins', 'losses', 'ties', 'points_for', 'points_against',
+                    'streak_result', 'streak_length')
+
+def game_result(scored, allowed):
+    """Returns 'W', 'L' or 'T' for one side of a game"""
+    if scored > allowed:
+        return 'W'
+    if scored < allowed:
+        return 'L'
+    return 'T'
+
+# Adds a delta row to a team's standings, creating the row on its first game
+STANDINGS_UPSERT = """INSERT INTO standings (team_id, league_id, games_played, wins, losses, ties, points_for, points_against)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(team_id) DO UPDATE SET
+        games_played = games_played + excluded.games_played,
+        wins = wins + excluded.wins,
+        losses = losses + excluded.losses,
+        ties = ties + excluded.ties,
+        points_for = points_for + excluded.points_for,
+        points_against = points_against + excluded.points_against"""
+
+def standings_deltas(game, home_score, away_score, sign):
+    """The STANDINGS_UPSERT rows that add (sign=1) or subtract (sign=-1) one finished game"""
+    rows = []
+    for team_id, scored, allowed in ((game['home_team_id'], home_score, away_score),
+                                     (game['away_team_id'], away_score, home_score)):
+        result = game_result(scored, allowed)
+        rows.append((team_id, game['league_id'], sign, sign * (result == 'W'), sign * (result == 'L'),
+                     sign * (result == 'T'), sign * scored, sign * allowed))
+    return rows
+
+def apply_game_to_standings(db, game, home_score, away_score, sign):
+    """Adds (sign=1) or subtracts (sign=-1) one finished game from both teams' standings rows"""
+    db.executemany(STANDINGS_UPSERT, standings_deltas(game, home_score, away_score, sign))
+
+def refresh_streaks(db, team_ids):
+    """Recomputes the current streak of the teams from their finished games, one statement per SQL_CHUNK_SIZE teams
+
+    Every team passed in must have a finished game, which holds for the teams of a game just scored.
+    """
+    team_ids = list(team_ids)
+    for start in range(0, len(team_ids), SQL_CHUNK_SIZE):
+        chunk = team_ids[start:start + SQL_CHUNK_SIZE]
+        marks = ','.join('?' * len(chunk))
+        db.execute(f"""WITH results AS (
+                           SELECT id, game_date, home_team_id AS team_id, home_score AS scored, away_score AS allowed
+                           FROM games WHERE home_score IS NOT NULL AND away_score IS NOT NULL
+                                        AND home_team_id IN ({marks})
+                           UNION ALL
+                           SELECT id, game_date, away_team_id, away_score, home_score
+                           FROM games WHERE home_score IS NOT NULL AND away_score IS NOT NULL
+                                        AND away_team_id IN ({marks})
+                       ), {STANDINGS_RANKED_CTES}, streaks AS (
+                           SELECT ranked.team_id, latest.result AS streak_result,
+                                  COALESCE(MIN(CASE WHEN ranked.result != latest.result THEN recency END) - 1,
+                                           COUNT(*)) AS streak_length
+                           FROM ranked JOIN latest ON latest.team_id = ranked.team_id
+                           GROUP BY ranked.team_id
+                       )
+                       UPDATE standings SET streak_result = streaks.streak_result, streak_length = streaks.streak_length
+                       FROM streaks WHERE standings.team_id = streaks.team_id""", chunk + chunk)
+
+def set_game_score(db, game_id, home_score, away_score):
+    """Writes a game's score and updates both teams' standings
+
+    A previous score is subtracted before the new one is applied, so edits don't double count.
+    The game's version goes up by one, see ingest_scores().
+    The caller commits. Returns False if the game doesn't exist.
+    """
+    game = db.execute('SELECT league_id, home_team_id, away_team_id, home_score, away_score FROM games WHERE id = ?',
+                      [game_id]).fetchone()
+    if game is None:
+        return False
+    home_score, away_score = int(home_score), int(away_score)
+    if game['home_score'] is not None and game['away_score'] is not None:
+        apply_game_to_standings(db, game, game['home_score'], game['away_score'], -1)
+    db.execute('UPDATE games SET home_score = ?, away_score = ?, version = version + 1 WHERE id = ?',
+               [home_score, away_score, game_id])
+    apply_game_to_standings(db, game, home_score, away_score, 1)
+    refresh_streaks(db, [game['home_team_id'], game['away_team_id']])
+    prune_game_changes(db)
+    bump_league_versions(db, [game['league_id']])
+    return True
+
+def score_error(home_score, away_score):
+    """Checks a submitted score, returns the message to show or None if it is valid"""
+    # isdecimal, not isdigit: '²' is a digit but int() refuses it
+    if not home_score.isdecimal() or not away_score.isdecimal():
+        return 'Scores must be numbers'
+    if int(home_score) < 0 or int(away_score) < 0:
+        return 'Scores cannot be negative'
+    return None
+
+def set_game_scores(db, scores):
+    """set_game_score() for many (game_id, home_score, away_score) rows at once
+
+    The games and the standings are each written with one executemany, then the touched teams'
+    streaks are refreshed. Every game must exist and appear once. The caller commits.
+    """
+    game_ids = [game_id for game_id, _, _ in scores]
+    games = {}
+    for start in range(0, len(game_ids), SQL_CHUNK_SIZE):
+        chunk = game_ids[start:start + SQL_CHUNK_SIZE]
+        for game in db.execute('SELECT id, league_id, home_team_id, away_team_id, home_score, away_score FROM games '
+                               f"WHERE id IN ({','.join('?' * len(chunk))})", chunk):
+            games[game['id']] = game
+
+    deltas, updates, team_ids = [], [], set()
+    for game_id, home_score, away_score in scores:
+        game = games[game_id]
+        home_score, away_score = int(home_score), int(away_score)
+        # A previous score is subtracted first, like an edit
+        if game['home_score'] is not None and game['away_score'] is not None:
+            deltas += standings_deltas(game, game['home_score'], game['away_score'], -1)
+        deltas += standings_deltas(game, home_score, away_score, 1)
+        updates.append((home_score, away_score, game_id))
+        team_ids.update((game['home_team_id'], game['away_team_id']))
+
+    db.executemany('UPDATE games SET home_score = ?, away_score = ?, version = version + 1 WHERE id = ?', updates)
+    db.executemany(STANDINGS_UPSERT, deltas)
+    refresh_streaks(db, sorted(team_ids))
+    prune_game_changes(db)
+    bump_league_versions(db, [game['league_id'] for game in games.values()])
+
+def parse_score_import(db, league_id, lines):
+    """Validates a CSV of one league's scores
+
+    Each row names its game by game_id, or by home_team, away_team and date (YYYY-MM-DD), and gives
+    home_score and away_score. Returns (scores, errors): the (game_id, home_score, away_score) rows for
+    set_game_scores() and a (line, message) pair for every row that can't be imported.
+    """
+    reader = csv.DictReader(lines)
+    columns = {name.strip() for name in reader.fieldnames or ()}
+    if not {'home_score', 'away_score'} <= columns or \
+            not ('game_id' in columns or {'home_team', 'away_team', 'date'} <= columns):
+        return [], [(1, 'The header needs game_id or home_team, away_team and date, plus home_score and away_score')]
+
+    # Every game of the league, looked up by id and by teams and day
+    game_ids = set()
+    games_by_teams = {}
+    for game in db.execute("""SELECT games.id, home.name AS home_team, away.name AS away_team, date(games.game_date) AS day
+                              FROM games
+                              JOIN teams home ON games.home_team_id = home.id
+                              JOIN teams away ON games.away_team_id = away.id
+                              WHERE games.league_id = ?""", [league_id]):
+        game_ids.add(game['id'])
+        games_by_teams.setdefault((game['home_team'], game['away_team'], game['day']), []).append(game['id'])
+
+    scores, errors, seen = [], [], {}
+    for row in reader:
+        line = reader.line_num
+        row = {(key or '').strip(): (value or '').strip() for key, value in row.items() if isinstance(value, str)}
+        if row.get('game_id'):
+            game_id = int(row['game_id']) if row['game_id'].isdecimal() else None
+            if game_id not in game_ids:
+                errors.append((line, f"Game {row['game_id']} not found in this league"))
+                continue
+        else:
+            matches = games_by_teams.get((row.get('home_team'), row.get('away_team'), row.get('date')), [])
+            if len(matches) != 1:
+                errors.append((line, f"{'No game' if not matches else 'More than one game'} matches "
+                                     f"{row.get('home_team')} vs {row.get('away_team')} on {row.get('date')}"))
+                continue
+            game_id = matches[0]
+
+        error = score_error(row.get('home_score', ''), row.get('away_score', ''))
+        if error:
+            errors.append((line, error))
+        elif game_id in seen:
+            errors.append((line, f"Game {game_id} is already scored on line {seen[game_id]}"))
+        else:
+            seen[game_id] = line
+            scores.append((game_id, int(row['home_score']), int(row['away_score'])))
+    return scores, errors
 
+def import_scores(db, league_id, lines):
+    """Validates and applies a CSV of scores in one transaction
+
+    Nothing is written unless every row is valid. Returns (imported, errors) like parse_score_import().
+    """
+    scores, errors = parse_score_import(db, league_id, lines)
+    if errors or not scores:
+        return 0, errors
+    set_game_scores(db, scores)
+    db.commit()
+    return len(scores), []
+
+def ingest_scores(db, payload, user):
+    """Applies a score API batch for user, returns (response body, status code)
+
+    payload is {"scores": [{"game_id", "home_score", "away_score", "version"}, ...]}. A score with a
+    version only applies if the game is still at that version, one without only if the game has no score
+    yet, so concurrent scorekeepers never overwrite each other. The batch is all or nothing: invalid rows
+    give 400 and stale ones 409 with the games' current versions. Like edit_score, changing a score that
+    is already in takes a site admin or the game's league admin, otherwise 403. The caller holds the
+    write lock and commits.
+    """
+    items = payload.get('scores') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        return {'error': 'Send a JSON object with a non-empty "scores" list'}, 400
+    if len(items) > app.config['SCORE_API_MAX_BATCH']:
+        return {'error': f"At most {app.config['SCORE_API_MAX_BATCH']} scores per request"}, 400
+
+    errors, seen = [], set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or type(item.get('game_id')) is not int:
+            errors.append({'index': index, 'error': 'game_id must be an integer'})
+            continue
+        # The form rules, on JSON integers (bools are ints to Python, but not scores)
+        if type(item.get('home_score')) is not int or type(item.get('away_score')) is not int:
+            error = 'Scores must be numbers'
+        else:
+            error = score_error(str(item['home_score']), str(item['away_score']))
+        if error is None and 'version' in item and type(item['version']) is not int:
+            error = 'version must be an integer'
+        if error is None and item['game_id'] in seen:
+            error = f"Game {item['game_id']} appears more than once"
+        if error:
+            errors.append({'index': index, 'game_id': item['game_id'], 'error': error})
+        seen.add(item['game_id'])
+    if errors:
+        return {'errors': errors}, 400
+
+    game_ids = [item['game_id'] for item in items]
+    games = {}
+    for start in range(0, len(game_ids), SQL_CHUNK_SIZE):
+        chunk = game_ids[start:start + SQL_CHUNK_SIZE]
+        for game in db.execute(f"""SELECT games.id, home_score, away_score, version, leagues.league_admin
+                                   FROM games JOIN leagues ON games.league_id = leagues.id
+                                   WHERE games.id IN ({','.join('?' * len(chunk))})""", chunk):
+            games[game['id']] = game
+    missing = [{'index': index, 'game_id': game_id, 'error': f'Game {game_id} not found'}
+               for index, game_id in enumerate(game_ids) if game_id not in games]
+    if missing:
+        return {'errors': missing}, 400
+
+    # Only admins may overwrite a final score
+    forbidden = []
+    if user['role'] != 'admin':
+        for index, game_id in enumerate(game_ids):
+            game = games[game_id]
+            if game['home_score'] is not None and game['away_score'] is not None and game['league_admin'] != user['id']:
+                forbidden.append({'index': index, 'game_id': game_id,
+                                  'error': f'You do not have permission to edit the score of game {game_id}'})
+    if forbidden:
+        return {'errors': forbidden}, 403
+
+    # Optimistic concurrency: each write names the version it was based on
+    conflicts = []
+    for item in items:
+        game = games[item['game_id']]
+        scored = game['home_score'] is not None and game['away_score'] is not None
+        if item.get('version', None if scored else game['version']) != game['version']:
+            conflicts.append({'game_id': game['id'], 'version': game['version'],
+                              'home_score': game['home_score'], 'away_score': game['away_score']})
+    if conflicts:
+        return {'error': 'Some games changed since they were read', 'conflicts': conflicts}, 409
+
+    set_game_scores(db, [(item['game_id'], item['home_score'], item['away_score']) for item in items])
+    return {'games': [{'game_id': item['game_id'], 'version': games[item['game_id']]['version'] + 1}
+                      for item in items]}, 200
+
+def rebuild_standings(league_id=None):
+    """Recomputes the standings table from the games, for one league or all of them. Returns the team rows written."""
+    db = get_db()
+    if league_id is None:
+        deleted = db.execute('DELETE FROM standings').rowcount
+    else:
+        deleted = db.execute('DELETE FROM standings WHERE league_id = ?', [league_id]).rowcount
+    cur = db.execute(f"INSERT INTO standings (team_id, {', '.join(STANDINGS_FIELDS)}) {STANDINGS_SQL}",
+                     {'league_id': league_id})
+    if deleted or cur.rowcount:
+        bump_league_versions(db, [row[0] for row in db.execute('SELECT id FROM leagues')] if league_id is None else [league_id])
+    db.commit()
+    return cur.rowcount
+
+def check_standings(league_id=None):
+    """Compares the standings table with a full recomputation
+
+    Returns (team_id, field, stored, expected) for every difference, an empty list means consistent.
+    """
+    db = get_db()
+    expected = {row['team_id']: row for row in db.execute(STANDINGS_SQL, {'league_id': league_id})}
+    if league_id is None:
+        stored = {row['team_id']: row for row in db.execute('SELECT * FROM standings')}
+    else:
+        stored = {row['team_id']: row for row in db.execute('SELECT * FROM standings WHERE league_id = ?', [league_id])}
+
+    # A team without a row has a zero record
+    empty = {field: 0 for field in STANDINGS_FIELDS}
+    empty['streak_result'] = ''
+
+    mismatches = []
+    for team_id in sorted(expected.keys() | stored.keys()):
+        stored_row = stored.get(team_id, empty)
+        expected_row = expected.get(team_id, empty)
+        for field in STANDINGS_FIELDS:
+            if field == 'league_id' and (team_id not in stored or team_id not in expected):
+                continue
+            if stored_row[field] != expected_row[field]:
+                mismatches.append((team_id, field, stored_row[field], expected_row[field]))
+    return mismatches
+
+@app.cli.command('rebuild-standings')
+@click.option('--league-id', type=int, default=None, help='Only rebuild this league.')
+def rebuild_standings_command(league_id):
+    """Recomputes the standings table from the finished games."""
+    print(f"Rebuilt standings for {rebuild_standings(league_id)} teams.")
+
+@app.cli.command('check-standings')
+@click.option('--league-id', type=int, default=None, help='Only check this league.')
+def check_standings_command(league_id):
+    """Reports differences between the standings table and the games."""
+    mismatches = check_standings(league_id)
+    for team_id, field, stored, expected in mismatches:
+        print(f"Team {team_id}: {field} is {stored!r}, expected {expected!r}")
+    if mismatches:
+        print(f"{len(mismatches)} differences, run `flask rebuild-standings` to repair.")
+        raise SystemExit(1)
+    print('Standings are consistent.')
+
+@app.cli.command('import-scores')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--league-id', type=int, required=True, help='League the games belong to.')
+def import_scores_command(path, league_id):
+    """Imports a CSV of game scores, all rows or none."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        imported, errors = import_scores(get_db(), league_id, f)
+    for line, message in errors:
+        print(f"Line {line}: {message}")
+    if errors:
+        print(f"{len(errors)} rows have errors, no scores were imported.")
+        raise SystemExit(1)
+    print(f"Imported {imported} scores.")
+
+# Sort options for the standings table: (field, descending) pairs, earlier pairs take priority
+STANDINGS_SORT_KEYS = {
+    'wins': [('wins', True), ('win_pct', True), ('differential', True), ('team_name', False)],
+    'win_pct': [('win_pct', True), ('wins', True), ('differential', True), ('team_name', False)],
+    'differential': [('differential', True), ('win_pct', True), ('team_name', False)],
+    'points_for': [('points_for', True), ('team_name', False)],
+    'points_against': [('points_against', False), ('team_name', False)],
+    'name': [('team_name', False)],
+}
+
+def sort_standings(standings, sort_by):
+    """Sorts standings by one of STANDINGS_SORT_KEYS, unknown options sort by wins"""
+    keys = STANDINGS_SORT_KEYS.get(sort_by, STANDINGS_SORT_KEYS['wins'])
+    standings = list(standings)
+    # Python's sort is stable, so sorting by the least important key first gives the combined order
+    for field, descending in reversed(keys):
+        standings.sort(key=operator.itemgetter(field), reverse=descending)
     return standings
 
 #Helper for league games
@@ -1560,6 +3367,126 @@ def get_league_games(league_id):
     games = cur.fetchall()
     return games
 
+# Values of the CSV manager column that mark a team's manager
+LEAGUE_IMPORT_TRUE = {'1', 'y', 'yes', 'true', 'manager'}
+
+def read_league_import(f, filename):
+    """Reads a league import file into (league, teams)
+
+    JSON files hold an object with league_name, sport, max_teams, league_admin and a teams list, or just
+    the teams list. Each team is {"name": ..., "manager": username, "players": [usernames]}. CSV files have
+    a team,username header and one row per player, an optional manager column marks the team manager and
+    a row without a username adds an empty team. Raises ValueError if the file can't be read.
+    """
+    if filename.lower().endswith('.json'):
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as error:
+            raise ValueError(f'The file is not valid JSON: {error}')
+        # Either just the list of teams, or an object with the league's details and its teams
+        if isinstance(data, list):
+            data = {'teams': data}
+        teams = data.get('teams') if isinstance(data, dict) else None
+        if not isinstance(teams, list) or \
+                not all(isinstance(team, dict) and isinstance(team.get('players', []), list) for team in teams):
+            raise ValueError('The JSON needs a list of teams, each with a name and a list of players')
+        return ({key: data[key] for key in ('league_name', 'sport', 'max_teams', 'league_admin') if key in data},
+                [{'name': str(team.get('name') or '').strip(), 'manager': str(team.get('manager') or '').strip() or None,
+                  'players': [str(player).strip() for player in team.get('players', [])]} for team in teams])
+
+    reader = csv.DictReader(f)
+    if not {'team', 'username'} <= {name.strip() for name in reader.fieldnames or ()}:
+        raise ValueError('The CSV header needs team and username columns')
+    teams = {}
+    for row in reader:
+        row = {(key or '').strip(): (value or '').strip() for key, value in row.items() if isinstance(value, str)}
+        team = teams.setdefault(row.get('team', ''), {'name': row.get('team', ''), 'manager': None, 'players': []})
+        if row.get('username'):
+            team['players'].append(row['username'])
+            if row.get('manager', '').lower() in LEAGUE_IMPORT_TRUE:
+                team['manager'] = row['username']
+    return {}, list(teams.values())
+
+def list_names(names, limit=20):
+    """Joins names for a message, cutting long lists short"""
+    names = sorted(names)
+    shown = ', '.join(names[:limit])
+    return shown if len(names) <= limit else f'{shown} and {len(names) - limit} more'
+
+def import_league(db, league, teams):
+    """Creates a league with its teams and rosters in one transaction
+
+    league has league_name, sport, max_teams and the league_admin username, teams are read_league_import()
+    teams. Every check runs over the whole import: all usernames are looked up together and a player may
+    only be on one team. A team's manager is its listed manager, or its first player like join_team_submit.
+    Returns (league_id, errors), nothing is written when there are errors.
+    """
+    errors = []
+    league_name = str(league.get('league_name') or '').strip()
+    if not league_name:
+        errors.append('League name required')
+    elif db.execute('SELECT 1 FROM leagues WHERE league_name = ?', [league_name]).fetchone():
+        errors.append('League name already taken')
+    if not league.get('sport'):
+        errors.append('Sport is required')
+    max_teams = str(league.get('max_teams') or len(teams))
+    if not max_teams.isdecimal() or int(max_teams) <= 1:
+        errors.append('Max teams must be 2 or more')
+    elif len(teams) > int(max_teams):
+        errors.append(f"You added {len(teams)} teams but max is {max_teams}.")
+
+    # Team names must be present and unique within the league
+    names, duplicates = set(), set()
+    for team in teams:
+        (duplicates if team['name'] in names else names).add(team['name'])
+    if '' in names | duplicates:
+        errors.append('Every team needs a name')
+    duplicates.discard('')
+    if duplicates:
+        errors.append(f'Team names used more than once: {list_names(duplicates)}')
+
+    # A listed manager plays for their team, then each player may only be on one team in the league
+    for team in teams:
+        if team['manager'] and team['manager'] not in team['players']:
+            team['players'].append(team['manager'])
+    player_teams = {}
+    for team in teams:
+        for username in dict.fromkeys(team['players']):
+            player_teams.setdefault(username, []).append(team['name'])
+    repeated = [f"{username} ({', '.join(team_names)})" for username, team_names in player_teams.items()
+                if len(team_names) > 1]
+    if repeated:
+        errors.append(f'Players on more than one team: {list_names(repeated)}')
+
+    # Every username in one lookup, chunked to stay under SQLite's variable limit
+    admin = str(league.get('league_admin') or '').strip()
+    usernames = list(player_teams.keys() | {admin})
+    user_ids = {}
+    for start in range(0, len(usernames), SQL_CHUNK_SIZE):
+        chunk = usernames[start:start + SQL_CHUNK_SIZE]
+        user_ids.update(db.execute(f"SELECT username, id FROM users WHERE username IN ({','.join('?' * len(chunk))})",
+                                   chunk).fetchall())
+    if admin not in user_ids:
+        errors.append(f'User "{admin}" not found.')
+    unknown = player_teams.keys() - user_ids.keys()
+    if unknown:
+        errors.append(f'Users not found: {list_names(unknown)}')
+    if errors:
+        return None, errors
+
+    league_id = db.execute('INSERT INTO leagues (league_name, sport, max_teams, league_admin) VALUES (?, ?, ?, ?)',
+                           [league_name, league['sport'], int(max_teams), user_ids[admin]]).lastrowid
+    db.executemany('INSERT INTO teams (name, league_id, team_manager) VALUES (?, ?, ?)',
+                   [(team['name'], league_id, user_ids[team['manager'] or team['players'][0]] if team['players'] else None)
+                    for team in teams])
+    team_ids = dict(db.execute('SELECT name, id FROM teams WHERE league_id = ?', [league_id]).fetchall())
+    db.executemany('INSERT INTO memberships (user_id, team_id, league_id) VALUES (?, ?, ?)',
+                   [(user_ids[username], team_ids[team['name']], league_id)
+                    for team in teams for username in dict.fromkeys(team['players'])])
+    bump_league_versions(db, [league_id])
+    db.commit()
+    return league_id, []
+
 @app.route('/whole_league_creation', methods=["GET", "POST"])
 def whole_league_creation():
         """Route to create a whole league by an admin"""
@@ -1630,14 +3557,31 @@ def whole_league_creation():
                     max_teams=maxteams,
                     team_names=rawTeamNames
                 )
-            db = get_db()
-            username = (request.form.get('league_admin') or '').strip()
-
-            # Find the user by username
-            user_row = get_user_by_username(username)
-
-            if user_row is None:
-                flash(f'User "{username}" not found.')
+            # Typed team names come first, an uploaded file adds teams and their rosters
+            teams = [{'name': name, 'manager': None, 'players': []} for name in separatedTeamNames]
+            league = {'league_name': league_name, 'sport': sport, 'max_teams': maxteams,
+                      'league_admin': (request.form.get('league_admin') or '').strip()}
+            upload = request.files.get('roster_file')
+            errors = []
+            if upload is not None and upload.filename:
+                try:
+                    _, file_teams = read_league_import(io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''),
+                                                       upload.filename)
+                except (ValueError, UnicodeDecodeError, csv.Error) as error:
+                    errors = [str(error) if isinstance(error, ValueError) else 'The file is not a UTF-8 CSV or JSON file']
+                else:
+                    typed = {team['name']: team for team in teams}
+                    for team in file_teams:
+                        if team['name'] in typed:
+                            typed[team['name']].update(team)
+                        else:
+                            teams.append(team)
+
+            if not errors:
+                league_id, errors = import_league(get_db(), league, teams)
+            if errors:
+                for error in errors:
+                    flash(error, "error")
                 return render_template(
                     "whole_league_creation.html",
                     step=2,
@@ -1647,25 +3591,32 @@ def whole_league_creation():
                     team_names=rawTeamNames
                 )
 
-            user_id = user_row['id']
-            # Insert league (column is max_teams per your other routes)
-            cur = db.execute(
-                "INSERT INTO leagues (league_name, sport, max_teams, league_admin) VALUES (?, ?, ?, ?)",
-                (league_name, sport, maxteams, user_id)
-            )
-            league_id = cur.lastrowid
-
-            for name in separatedTeamNames:
-                db.execute(
-                    "INSERT INTO teams (name, league_id) VALUES (?, ?)",
-                    (name, league_id)
-                )
-
-            db.commit()
-
             flash("League and teams created successfully.")
             return redirect(url_for('home_page'))
 
+@app.cli.command('import-league')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--league-name', help='Name of the new league, if the file has none.')
+@click.option('--sport', help='Sport of the league, if the file has none.')
+@click.option('--max-teams', type=int, help='Team limit, the number of teams by default.')
+@click.option('--league-admin', help='Username of the league admin, if the file has none.')
+def import_league_command(path, **options):
+    """Creates a league with teams and rosters from a CSV or JSON file."""
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            league, teams = read_league_import(f, path)
+    except ValueError as error:
+        print(error)
+        raise SystemExit(1)
+    league.update({key: value for key, value in options.items() if value is not None})
+    league_id, errors = import_league(get_db(), league, teams)
+    for error in errors:
+        print(error)
+    if errors:
+        raise SystemExit(1)
+    players = sum(len(set(team['players'])) for team in teams)
+    print(f"Created league {league_id} with {len(teams)} teams and {players} players.")
+
 # Route for the verification link that moves users from pending to actual users table
 @app.route('/verify-email/<int:pending_id>/<token>')
 def verify_email(pending_id, token):
@@ -0,0 +1,388 @@
+"""Offline benchmarks for Interlink's slow paths.
+
+Each benchmark builds a throwaway database, so it never touches interlinkData.db.
+Run `python benchmark.py <benchmark> --help` to see the options of one benchmark.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import app as interlink
+import fake_calendar
+
+
+def percentile(values, pct):
+    """Returns the pct percentile of a list of numbers (nearest rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class TempDatabase:
+    """Points the app at a fresh, initialized database file for the duration of a with block"""
+
+    def __enter__(self):
+        self.original = interlink.app.config['DATABASE']
+        self.fd, interlink.app.config['DATABASE'] = tempfile.mkstemp(suffix='.db')
+        with interlink.app.app_context():
+            interlink.init_db()
+        return interlink.app.config['DATABASE']
+
+    def __exit__(self, *exc):
+        os.close(self.fd)
+        os.unlink(interlink.app.config['DATABASE'])
+        interlink.app.config['DATABASE'] = self.original
+
+
+def insert_games(db, league_id, count, days=30):
+    """Inserts count unplayed games between the league's teams, spread over the next days"""
+    team_ids = [row[0] for row in db.execute('SELECT id FROM teams WHERE league_id=?', [league_id])]
+    today = datetime.now().date()
+    rows = []
+    for i in range(count):
+        home = team_ids[i % len(team_ids)]
+        away = team_ids[(i + 1) % len(team_ids)]
+        game_date = (today + timedelta(days=i % days)).strftime('%Y-%m-%d') + ' 19:00:00'
+        rows.append((league_id, home, away, game_date))
+    db.executemany('INSERT INTO games (league_id, home_team_id, away_team_id, game_date) VALUES (?, ?, ?, ?)', rows)
+    db.commit()
+
+
+def bench_sync(args):
+    """Calendar sync throughput and batch latency against the offline calendar stand-in"""
+    from googleapiclient.http import BatchHttpRequest
+
+    server = fake_calendar.serve(latency=args.latency, rate_limit_rate=args.rate_limit_rate)
+    interlink.GOOGLE_CALENDAR_AVAILABLE = True
+    interlink.CALENDAR_API_ROOT = server.url
+    interlink.PUBLIC_CALENDAR_ID = interlink.PUBLIC_CALENDAR_ID or 'benchmark@group.calendar.google.com'
+    interlink.calendar_bucket = interlink.TokenBucket(args.quota, max(args.quota, interlink.CALENDAR_BATCH_SIZE))
+
+    # Times every batch round trip the sync makes
+    latencies = []
+    original_execute = BatchHttpRequest.execute
+
+    def timed_execute(self, *a, **kw):
+        started = time.perf_counter()
+        try:
+            return original_execute(self, *a, **kw)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    BatchHttpRequest.execute = timed_execute
+    print(f"{'games':>8} {'seconds':>9} {'games/s':>9} {'batches':>8} {'p50 ms':>8} {'p99 ms':>8} {'failed':>7}")
+    try:
+        for count in args.games:
+            with TempDatabase():
+                with interlink.app.app_context():
+                    insert_games(interlink.get_db(), 1, count)
+                    latencies.clear()
+                    started = time.perf_counter()
+                    stats = interlink.sync_games_to_calendar()
+                    elapsed = time.perf_counter() - started
+            print(f"{count:>8} {elapsed:>9.2f} {count / elapsed:>9.0f} {len(latencies):>8} "
+                  f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 99) * 1000:>8.1f} "
+                  f"{stats['failed']:>7}")
+    finally:
+        BatchHttpRequest.execute = original_execute
+        server.shutdown()
+
+
+# Connection settings get_db() used before the connection manager: a fresh connection per app
+# context with SQLite's defaults (rollback journal, synchronous=FULL)
+LEGACY_DB_CONFIG = {
+    'SQLITE_REUSE_CONNECTIONS': False,
+    'SQLITE_JOURNAL_MODE': None,
+    'SQLITE_SYNCHRONOUS': None,
+    'SQLITE_MMAP_SIZE': None,
+    'SQLITE_CACHE_SIZE': None,
+    'SQLITE_BUSY_TIMEOUT': None,
+}
+
+
+def bench_db(args):
+    """Per-request database cost of the legacy connection handling against the tuned connection manager"""
+    import random
+    import sqlite3
+    import threading
+
+    tuned_config = {key: interlink.app.config[key] for key in LEGACY_DB_CONFIG}
+
+    def fake_request(rng, latencies, errors):
+        # A league_page style read, and every so often a score write
+        started = time.perf_counter()
+        try:
+            with interlink.app.app_context():
+                db = interlink.get_db()
+                db.execute('SELECT * FROM leagues WHERE id = 1').fetchone()
+                db.execute('SELECT * FROM teams WHERE league_id = 1').fetchall()
+                interlink.get_league_games(1)
+                if rng.random() < args.write_ratio:
+                    db.execute('UPDATE games SET home_score = ?, away_score = ? WHERE id = ?',
+                               [rng.randint(0, 9), rng.randint(0, 9), rng.randint(1, args.games)])
+                    db.commit()
+        except sqlite3.OperationalError:
+            errors.append(1)
+        latencies.append(time.perf_counter() - started)
+
+    print(f"{'config':>8} {'threads':>8} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'locked':>7}")
+    for name, config in (('legacy', LEGACY_DB_CONFIG), ('tuned', tuned_config)):
+        interlink.app.config.update(config)
+        with TempDatabase():
+            with interlink.app.app_context():
+                insert_games(interlink.get_db(), 1, args.games)
+            latencies = []
+            errors = []
+
+            def worker(seed):
+                rng = random.Random(seed)
+                for _ in range(args.requests):
+                    fake_request(rng, latencies, errors)
+                interlink.close_thread_db()
+
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            interlink.close_thread_db()
+
+        total = args.threads * args.requests
+        print(f"{name:>8} {args.threads:>8} {total:>9} {total / elapsed:>8.0f} "
+              f"{percentile(latencies, 50) * 1000:>8.2f} {percentile(latencies, 99) * 1000:>8.2f} {len(errors):>7}")
+    interlink.app.config.update(tuned_config)
+
+
+def legacy_standings(league_id):
+    """get_standings() before the single pass engine: two COUNT queries per team"""
+    db = interlink.get_db()
+    standings = []
+    for team in db.execute('SELECT id, name FROM teams WHERE league_id = ?', [league_id]).fetchall():
+        wins = db.execute('SELECT COUNT(*) FROM games WHERE league_id = ? AND ((home_team_id = ? AND home_score > away_score) '
+                          'OR (away_team_id = ? AND away_score > home_score))', [league_id, team['id'], team['id']]).fetchone()[0]
+        losses = db.execute('SELECT COUNT(*) FROM games WHERE league_id = ? AND ((home_team_id = ? AND home_score < away_score) '
+                            'OR (away_team_id = ? AND away_score < home_score))', [league_id, team['id'], team['id']]).fetchone()[0]
+        standings.append({'team_id': team['id'], 'team_name': team['name'], 'wins': wins, 'losses': losses})
+    return standings
+
+
+def insert_league(db, name, team_count):
+    """Inserts a league with team_count teams and returns its id"""
+    league_id = db.execute('INSERT INTO leagues (league_name, sport, max_teams, status) VALUES (?, ?, ?, ?)',
+                           [name, 'Soccer', team_count, 'active']).lastrowid
+    db.executemany('INSERT INTO teams (name, league_id) VALUES (?, ?)',
+                   [(f'{name} Team {i + 1}', league_id) for i in range(team_count)])
+    db.commit()
+    return league_id
+
+
+def bench_standings(args):
+    """Legacy per-team COUNT standings against reading the materialized standings table"""
+    import random
+
+    rng = random.Random(1)
+    print(f"{'teams':>6} {'games':>7} {'legacy ms':>10} {'queries':>8} {'table ms':>10} {'queries':>8} {'speedup':>8}")
+    for team_count in args.teams:
+        with TempDatabase():
+            with interlink.app.app_context():
+                db = interlink.get_db()
+                league_id = insert_league(db, 'Bench', team_count)
+                team_ids = [row[0] for row in db.execute('SELECT id FROM teams WHERE league_id = ?', [league_id])]
+                games = []
+                for i in range(team_count * args.games_per_team // 2):
+                    home, away = rng.sample(team_ids, 2)
+                    games.append((league_id, home, away, (datetime(2025, 1, 1) + timedelta(hours=i)).strftime('%Y-%m-%d %H:%M:%S'), rng.randint(0, 9), rng.randint(0, 9)))
+                db.executemany('INSERT INTO games (league_id, home_team_id, away_team_id, game_date, home_score, away_score) '
+                               'VALUES (?, ?, ?, ?, ?, ?)', games)
+                db.commit()
+                interlink.rebuild_standings(league_id)
+
+                results = []
+                for standings in (legacy_standings, interlink.get_standings):
+                    times = []
+                    for _ in range(args.repeat):
+                        queries = interlink.QueryStats()
+                        db.stats = queries
+                        started = time.perf_counter()
+                        standings(league_id)
+                        times.append(time.perf_counter() - started)
+                    results.append((percentile(times, 50), queries.count))
+        (legacy, legacy_queries), (engine, engine_queries) = results
+        print(f"{team_count:>6} {len(games):>7} {legacy * 1000:>10.1f} {legacy_queries:>8} "
+              f"{engine * 1000:>10.1f} {engine_queries:>8} {legacy / engine:>7.1f}x")
+
+
+def legacy_schedule(db, league_id, team_ids, start_date, games_week):
+    """generate_schedule() before the round robin engine: shuffled pairings inserted one row at a time
+
+    The old date()/month_days() helpers are replaced by timedelta, they gave the same dates.
+    """
+    import random
+
+    pairings = []
+    for i in range(len(team_ids)):
+        for j in range(i + 1, len(team_ids)):
+            pairings.append((team_ids[i], team_ids[j]))
+            pairings.append((team_ids[j], team_ids[i]))
+    random.shuffle(pairings)
+    day = start_date
+    current_game_count = 0
+    for home_id, away_id in pairings:
+        db.execute('INSERT INTO games (league_id, home_team_id, away_team_id, game_date, home_score, away_score) '
+                   'VALUES (?, ?, ?, ?, NULL, NULL)', [league_id, home_id, away_id, f'{day:%Y-%m-%d} 19:00:00'])
+        current_game_count += 1
+        if current_game_count >= games_week:
+            day += timedelta(days=7)
+            current_game_count = 0
+        else:
+            day += timedelta(days=3)
+    db.commit()
+
+
+def round_robin_insert(db, league_id, team_ids, start_date, games_week, venues=(), times=(interlink.SCHEDULE_GAME_TIME,)):
+    """What generate_schedule() does now: pack the round robin into slots, then one executemany"""
+    options = {'start_date': start_date, 'weekdays': interlink.default_weekdays(start_date, games_week),
+               'times': list(times), 'venues': list(venues), 'blackout_dates': set()}
+    schedule = interlink.build_schedule(db, league_id, team_ids, options)
+    db.executemany('INSERT INTO games (league_id, home_team_id, away_team_id, game_date, venue_id, home_score, away_score) '
+                   'VALUES (?, ?, ?, ?, ?, NULL, NULL)',
+                   [(league_id, home_id, away_id, game_date, venue_id) for home_id, away_id, game_date, venue_id in schedule])
+    db.commit()
+
+
+def bench_schedule(args):
+    """Legacy shuffled schedule generation against the slot packing round robin with a bulk insert"""
+    start_date = datetime(2025, 1, 6).date()
+    venues = [f'Court {i + 1}' for i in range(args.venues)]
+
+    def packed(db, league_id, team_ids, start_date, games_week):
+        round_robin_insert(db, league_id, team_ids, start_date, games_week, venues, args.times)
+
+    print(f"{'teams':>6} {'games':>8} {'version':>12} {'seconds':>8} {'games/s':>9} {'game days':>10} {'max/team/day':>13}")
+    for team_count in args.teams:
+        for name, generate in (('legacy', legacy_schedule), ('round robin', packed)):
+            with TempDatabase():
+                with interlink.app.app_context():
+                    db = interlink.get_db()
+                    league_id = insert_league(db, 'Bench', team_count)
+                    team_ids = [row[0] for row in db.execute('SELECT id FROM teams WHERE league_id = ?', [league_id])]
+                    started = time.perf_counter()
+                    generate(db, league_id, team_ids, start_date, args.games_per_week)
+                    elapsed = time.perf_counter() - started
+                    games, days, busiest = db.execute(
+                        'SELECT (SELECT COUNT(*) FROM games WHERE league_id = :league),'
+                        ' (SELECT COUNT(DISTINCT game_date) FROM games WHERE league_id = :league), MAX(played) FROM ('
+                        ' SELECT COUNT(*) AS played FROM (SELECT home_team_id AS team_id, game_date FROM games WHERE league_id = :league'
+                        ' UNION ALL SELECT away_team_id, game_date FROM games WHERE league_id = :league) GROUP BY team_id, game_date)',
+                        {'league': league_id}).fetchone()
+            print(f"{team_count:>6} {games:>8} {name:>12} {elapsed:>8.2f} {games / elapsed:>9.0f} {days:>10} {busiest:>13}")
+
+
+def bench_scores(args):
+    """Score API submissions per second with concurrent scorekeepers, retries and stale writes"""
+    import random
+    import threading
+    import uuid
+
+    # The test client keeps each scorekeeper's login in a signed session cookie
+    interlink.app.config['SECRET_KEY'] = interlink.app.config['SECRET_KEY'] or 'benchmark'
+    with TempDatabase():
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute("INSERT INTO users (username, password_hash, name, email) VALUES ('scorer', 'x', 'Scorer', 'scorer@test.com')")
+            league_id = insert_league(db, 'Load League', 16)
+            insert_games(db, league_id, args.games)
+        statuses = []
+        latencies = []
+
+        def scorekeeper(seed):
+            rng = random.Random(seed)
+            client = interlink.app.test_client()
+            with client.session_transaction() as sess:
+                sess['logged_in'] = True
+                sess['username'] = 'scorer'
+            versions = {}
+            for _ in range(args.requests):
+                # Each scorekeeper only knows the versions it has seen, so other scorekeepers make it stale
+                games = rng.sample(range(1, args.games + 1), args.batch)
+                scores = [dict({'game_id': game_id, 'home_score': rng.randint(0, 9), 'away_score': rng.randint(0, 9)},
+                               **({'version': versions[game_id]} if game_id in versions else {})) for game_id in games]
+                key = uuid.uuid4().hex
+                for attempt in range(2 if rng.random() < args.retry_ratio else 1):
+                    started = time.perf_counter()
+                    rv = client.post('/api/v1/scores', json={'scores': scores}, headers={'Idempotency-Key': key})
+                    latencies.append(time.perf_counter() - started)
+                    statuses.append(rv.status_code if attempt == 0 else 'replay')
+                body = rv.get_json()
+                for game in body.get('games', []) + body.get('conflicts', []):
+                    versions[game['game_id']] = game['version']
+            interlink.close_thread_db()
+
+        threads = [threading.Thread(target=scorekeeper, args=(i,)) for i in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        with interlink.app.app_context():
+            consistent = not interlink.check_standings(league_id)
+        interlink.close_thread_db()
+
+    print(f"{'threads':>8} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'200':>6} {'409':>6} {'replays':>8} {'standings':>10}")
+    print(f"{args.threads:>8} {len(statuses):>9} {len(statuses) / elapsed:>8.0f} {percentile(latencies, 50) * 1000:>8.2f} "
+          f"{percentile(latencies, 99) * 1000:>8.2f} {statuses.count(200):>6} {statuses.count(409):>6} "
+          f"{statuses.count('replay'):>8} {'ok' if consistent else 'DRIFT':>10}")
+
+
+BENCHMARKS = {
+    'sync': bench_sync,
+    'db': bench_db,
+    'standings': bench_standings,
+    'schedule': bench_schedule,
+    'scores': bench_scores,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    sync_parser = subparsers.add_parser('sync', help=bench_sync.__doc__)
+    sync_parser.add_argument('--games', type=int, nargs='+', default=[1000, 10000, 100000])
+    sync_parser.add_argument('--latency', type=float, default=0.0, help='seconds the fake calendar adds per request')
+    sync_parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of calls answered with 429')
+    sync_parser.add_argument('--quota', type=float, default=100000, help='calendar calls per second the governor allows')
+
+    db_parser = subparsers.add_parser('db', help=bench_db.__doc__)
+    db_parser.add_argument('--threads', type=int, default=8)
+    db_parser.add_argument('--requests', type=int, default=500, help='requests per thread')
+    db_parser.add_argument('--games', type=int, default=2000)
+    db_parser.add_argument('--write-ratio', type=float, default=0.1, help='fraction of requests that write a score')
+
+    standings_parser = subparsers.add_parser('standings', help=bench_standings.__doc__)
+    standings_parser.add_argument('--teams', type=int, nargs='+', default=[32, 128, 512])
+    standings_parser.add_argument('--games-per-team', type=int, default=40)
+    standings_parser.add_argument('--repeat', type=int, default=5, help='runs per implementation, the median is shown')
+
+    schedule_parser = subparsers.add_parser('schedule', help=bench_schedule.__doc__)
+    schedule_parser.add_argument('--teams', type=int, nargs='+', default=[8, 32, 128, 512])
+    schedule_parser.add_argument('--games-per-week', type=int, default=2)
+    schedule_parser.add_argument('--venues', type=int, default=0, help='courts to pack games into, 0 for no venue limit')
+    schedule_parser.add_argument('--times', nargs='+', default=[interlink.SCHEDULE_GAME_TIME], help='game start times')
+
+    scores_parser = subparsers.add_parser('scores', help=bench_scores.__doc__)
+    scores_parser.add_argument('--threads', type=int, default=8, help='concurrent scorekeepers')
+    scores_parser.add_argument('--requests', type=int, default=200, help='requests per scorekeeper')
+    scores_parser.add_argument('--batch', type=int, default=1, help='scores per request')
+    scores_parser.add_argument('--games', type=int, default=2000)
+    scores_parser.add_argument('--retry-ratio', type=float, default=0.1, help='fraction of requests sent twice with the same key')
+
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
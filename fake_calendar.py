@@ -0,0 +1,191 @@
+"""Offline stand-in for the Google Calendar API used for load testing the calendar sync.
+
+Run it with `python fake_calendar.py --port 8085` and start the app with
+CALENDAR_API_ROOT=http://127.0.0.1:8085/ so every calendar call goes here instead of Google.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+EVENTS_PATH = re.compile(r'^/calendar/v3/calendars/(?P<calendar>[^/]+)/events(?:/(?P<event>[^/]+))?$')
+BATCH_PATH = '/batch/calendar/v3'
+
+
+class FakeCalendar:
+    """In memory calendar that answers insert, patch, delete, list and batch calls"""
+
+    def __init__(self, latency=0.0, rate_limit_rate=0.0, gone_rate=0.0, seed=None):
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.gone_rate = gone_rate
+        self.random = random.Random(seed)
+        self.events = {}
+        self.counts = {'insert': 0, 'patch': 0, 'delete': 0, 'list': 0, 'batch': 0, '410': 0, '429': 0}
+        self.lock = threading.Lock()
+
+    def now(self):
+        return time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+
+    def live_events(self):
+        """Events that haven't been deleted"""
+        return [event for event in self.events.values() if event['status'] != 'cancelled']
+
+    def list_events(self, params):
+        """Answers events().list with paging and the updatedMin, showDeleted and privateExtendedProperty filters"""
+        items = sorted(self.events.values(), key=lambda event: event['id'])
+        updated_min = params.get('updatedMin', [None])[0]
+        # Like Google, deleted events are always listed when updatedMin is given
+        if params.get('showDeleted', ['false'])[0] != 'true' and updated_min is None:
+            items = [event for event in items if event['status'] != 'cancelled']
+        if updated_min:
+            items = [event for event in items if event['updated'] >= updated_min.replace('Z', '.000Z')]
+        for condition in params.get('privateExtendedProperty', []):
+            name, _, value = condition.partition('=')
+            items = [event for event in items
+                     if ((event.get('extendedProperties') or {}).get('private') or {}).get(name) == value]
+
+        start = int(params.get('pageToken', ['0'])[0])
+        size = int(params.get('maxResults', ['250'])[0])
+        page = {'kind': 'calendar#events', 'items': items[start:start + size]}
+        if start + size < len(items):
+            page['nextPageToken'] = str(start + size)
+        return page
+
+    def handle(self, method, path, body):
+        """Handles one (non-batch) API call and returns (status, json body)"""
+        path, _, query = path.partition('?')
+        match = EVENTS_PATH.match(path)
+        if match is None:
+            return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+
+        with self.lock:
+            # Injected quota errors, like Google returns when the project is over its rate
+            if self.random.random() < self.rate_limit_rate:
+                self.counts['429'] += 1
+                return 429, {'error': {'code': 429, 'message': 'Rate Limit Exceeded'}}
+
+            event_id = match.group('event')
+            if method == 'POST' and event_id is None:
+                self.counts['insert'] += 1
+                event = json.loads(body or b'{}')
+                event.setdefault('id', uuid.uuid4().hex)
+                # Like Google, IDs of deleted events can't be reused either
+                if event['id'] in self.events:
+                    return 409, {'error': {'code': 409, 'message': 'The requested identifier already exists.'}}
+                event['status'] = 'confirmed'
+                event['updated'] = self.now()
+                self.events[event['id']] = event
+                return 200, event
+
+            if method == 'GET' and event_id is None:
+                self.counts['list'] += 1
+                return 200, self.list_events(parse_qs(query))
+
+            if method == 'PATCH':
+                self.counts['patch'] += 1
+                if event_id not in self.events:
+                    return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+                self.events[event_id].update(json.loads(body or b'{}'))
+                self.events[event_id]['updated'] = self.now()
+                return 200, self.events[event_id]
+
+            if method == 'DELETE':
+                self.counts['delete'] += 1
+                if event_id not in self.events:
+                    return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+                # Deleted events are kept as cancelled and answer 410 Gone, plus some injected ones
+                if self.events[event_id]['status'] == 'cancelled' or self.random.random() < self.gone_rate:
+                    self.counts['410'] += 1
+                    self.events[event_id]['status'] = 'cancelled'
+                    return 410, {'error': {'code': 410, 'message': 'Resource has been deleted'}}
+                self.events[event_id]['status'] = 'cancelled'
+                self.events[event_id]['updated'] = self.now()
+                return 204, None
+
+        return 405, {'error': {'code': 405, 'message': 'Method Not Allowed'}}
+
+
+class FakeCalendarHandler(BaseHTTPRequestHandler):
+    """Turns HTTP requests into FakeCalendar calls"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, body, content_type='application/json'):
+        data = b'' if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode())
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        calendar = self.server.calendar
+        if calendar.latency:
+            time.sleep(calendar.latency)
+
+        if self.path.startswith(BATCH_PATH):
+            with calendar.lock:
+                calendar.counts['batch'] += 1
+            self._respond(200, *self._handle_batch(body))
+        else:
+            status, payload = calendar.handle(self.command, self.path, body)
+            self._respond(status, payload)
+
+    def _handle_batch(self, body):
+        """Answers a multipart/mixed batch the way googleapiclient's BatchHttpRequest expects"""
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+        message = BytesParser().parsebytes(header + body)
+        boundary = uuid.uuid4().hex
+        parts = []
+        for part in message.get_payload():
+            request_head, _, request_body = part.get_payload().replace('\r\n', '\n').partition('\n\n')
+            method, path = request_head.split('\n', 1)[0].split(' ')[:2]
+            status, payload = self.server.calendar.handle(method, path, request_body.encode())
+            # Long Content-IDs arrive folded over two lines
+            content_id = ' '.join(part['Content-ID'].split()).replace('<', '<response-', 1)
+            data = '' if payload is None else json.dumps(payload)
+            parts.append(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                         f"HTTP/1.1 {status} {self.responses.get(status, ('',))[0]}\r\n"
+                         f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n{data}\r\n")
+        response = ''.join(parts) + f"--{boundary}--\r\n"
+        return response.encode(), f'multipart/mixed; boundary={boundary}'
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _handle
+
+
+def serve(host='127.0.0.1', port=0, **options):
+    """Starts the fake calendar on a background thread and returns the server, its url is server.url"""
+    server = ThreadingHTTPServer((host, port), FakeCalendarHandler)
+    server.daemon_threads = True
+    server.calendar = FakeCalendar(**options)
+    server.url = f"http://{host}:{server.server_address[1]}/"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline Google Calendar API stand-in')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every HTTP request')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of calls answered with 429')
+    parser.add_argument('--gone-rate', type=float, default=0.0, help='fraction of deletes answered with 410')
+    args = parser.parse_args()
+
+    server = serve(port=args.port, latency=args.latency, rate_limit_rate=args.rate_limit_rate,
+                   gone_rate=args.gone_rate)
+    print(f"Fake calendar listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,24 +1,101 @@
+import io
+import json
 import os
 import unittest
 import tempfile
+import time
+from unittest import mock
 import app as interlink
+from werkzeug.datastructures import MultiDict
 from werkzeug.security import generate_password_hash
 
 
+class FakeCalendarRequest:
+    """Stands in for a googleapiclient HttpRequest"""
+    def __init__(self, service, method, kwargs):
+        self.service = service
+        self.method = method
+        self.kwargs = kwargs
+
+    def execute(self):
+        self.service.calls.append((self.method, self.kwargs))
+        event_id = self.kwargs.get('eventId') or self.kwargs['body']['id']
+        status = self.service.failing_ids.get(event_id)
+        if status:
+            if status in (409, 429):
+                # Conflicts and rate limits only happen the first time
+                del self.service.failing_ids[event_id]
+            raise interlink.googleapiclient.errors.HttpError(
+                type('Resp', (), {'status': status, 'reason': 'error'})(), b'error')
+        if self.method == 'delete':
+            return ''
+        return {'id': event_id}
+
+
+class FakeCalendarBatch:
+    """Stands in for a googleapiclient BatchHttpRequest"""
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batches.append(len(self.requests))
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.execute(), None)
+            except Exception as e:
+                self.callback(request_id, None, e)
+
+
+class FakeCalendarService:
+    """Records the Calendar API calls the app makes"""
+    def __init__(self, failing_ids=None):
+        self.calls = []
+        self.batches = []
+        # Maps event ids to the HTTP status their calls fail with
+        self.failing_ids = dict(failing_ids or {})
+
+    def events(self):
+        return self
+
+    def insert(self, **kwargs):
+        return FakeCalendarRequest(self, 'insert', kwargs)
+
+    def delete(self, **kwargs):
+        return FakeCalendarRequest(self, 'delete', kwargs)
+
+    def patch(self, **kwargs):
+        return FakeCalendarRequest(self, 'patch', kwargs)
+
+    def new_batch_http_request(self, callback):
+        return FakeCalendarBatch(self, callback)
+
+
 class InterlinkTestCase(unittest.TestCase):
 
     def setUp(self):
         self.db_fd, interlink.app.config['DATABASE'] = tempfile.mkstemp()
         interlink.app.config['SECRET_KEY'] = 'key-for-testing'
         interlink.app.testing = True
+        interlink.app.config['SQL_ENFORCE_BUDGETS'] = True
         self.original_calendar_available = interlink.GOOGLE_CALENDAR_AVAILABLE
         interlink.GOOGLE_CALENDAR_AVAILABLE = False
+        self.original_calendar_bucket = interlink.calendar_bucket
+        interlink.calendar_bucket = interlink.TokenBucket(100000, 100000)
+        # Jobs are resumed by hand in the tests that need it, not by whichever request comes first
+        interlink._schedule_jobs_resumed = True
         self.app = interlink.app.test_client()
         with interlink.app.app_context():
             interlink.init_db()
 
     def tearDown(self):
         interlink.GOOGLE_CALENDAR_AVAILABLE = self.original_calendar_available
+        interlink.calendar_bucket = self.original_calendar_bucket
+        interlink.close_thread_db()
 
         os.close(self.db_fd)
         os.unlink(interlink.app.config['DATABASE'])
@@ -309,8 +386,8 @@ class InterlinkTestCase(unittest.TestCase):
            db.commit()
 
 
-           # Test get_roster function
-           roster = interlink.get_roster('Test Team', 'name')
+           # Test get_rosters function
+           roster = interlink.get_rosters([team_id], 'name')[team_id]
 
 
            assert len(roster) == 2
@@ -460,6 +537,26 @@ class InterlinkTestCase(unittest.TestCase):
        assert b'Roster:' in rv.data
 
 
+    def test_team_view_by_name_shows_games_and_unknown_team_redirects(self):
+       with interlink.app.app_context():
+           db = interlink.get_db()
+           league_id = db.execute('INSERT INTO leagues (league_name, sport, max_teams) VALUES (?, ?, ?)',
+                                  ('Basketball League', 'Basketball', 8)).lastrowid
+           home_id = db.execute('INSERT INTO teams (name, league_id) VALUES (?, ?)', ('Cheese', league_id)).lastrowid
+           away_id = db.execute('INSERT INTO teams (name, league_id) VALUES (?, ?)', ('Crackers', league_id)).lastrowid
+           db.execute('INSERT INTO games (league_id, home_team_id, away_team_id, game_date) VALUES (?, ?, ?, ?)',
+                      (league_id, home_id, away_id, '2030-06-02 19:00:00'))
+           db.commit()
+
+       # Older links only carry the team name
+       rv = self.app.get('/team_view?team_name=Cheese&league_name=Basketball League&sport=Basketball&league_status=Active')
+       assert b'Crackers' in rv.data
+
+       rv = self.app.get('/team_view?team_name=Nobody&league_name=Basketball League', follow_redirects=True)
+       assert rv.status_code == 200
+       assert b'Team does not exist!' in rv.data
+
+
     def test_team_view_join_button_submits_to_correct_team(self):
        with interlink.app.app_context():
            db = interlink.get_db()
@@ -522,8 +619,8 @@ class InterlinkTestCase(unittest.TestCase):
            db.commit()
 
 
-           # Test get_roster function
-           roster = interlink.get_roster('Cheese', 'name')
+           # Test get_rosters function
+           roster = interlink.get_rosters([team_id], 'name')[team_id]
 
 
            assert len(roster) == 3
@@ -804,6 +901,32 @@ class InterlinkTestCase(unittest.TestCase):
         ), follow_redirects=True)
         self.assertIn(b'Scores must be numbers', rv.data)
 
+    def test_submit_score_superscript_digit_fails(self):
+        """'²' passes isdigit() but not int(), it must be a form error and not a 500"""
+        league_id, user_id = self.create_user_league_teams('SuperscriptLeague', 2)
+        with interlink.app.app_context():
+            self.assertEqual(interlink.score_error('²', '1'), 'Scores must be numbers')
+            db = interlink.get_db()
+            team_ids = [row['id'] for row in db.execute('SELECT id FROM teams WHERE league_id = ?', (league_id,))]
+            db.execute('INSERT INTO games (league_id, home_team_id, away_team_id, game_date) VALUES (?, ?, ?, ?)',
+                       [league_id, team_ids[0], team_ids[1], '2025-01-01 01:00:00'])
+            db.commit()
+            game_id = db.execute('SELECT id FROM games WHERE league_id = ?', (league_id,)).fetchone()['id']
+
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'testuser'
+            sess['role'] = 'user'
+
+        rv = self.app.post('/submit_score', data=dict(
+            league_selected=str(league_id),
+            game_id=str(game_id),
+            home_score='²',
+            away_score='5'
+        ), follow_redirects=True)
+        self.assertEqual(rv.status_code, 200)
+        self.assertIn(b'Scores must be numbers', rv.data)
+
     def test_user_page_loads(self):
         """Simple test that user page loads with login"""
         with interlink.app.app_context():
@@ -1004,5 +1127,1513 @@ class InterlinkTestCase(unittest.TestCase):
 
         self.assertTrue(rv.status_code in [200, 302])
 
+# CALENDAR SYNC
+    def test_home_page_does_not_sync_calendar(self):
+        """Test the home page renders without touching Google Calendar"""
+        interlink.GOOGLE_CALENDAR_AVAILABLE = True
+        original_sync = interlink.sync_games_to_calendar
+        interlink.sync_games_to_calendar = lambda: self.fail('home page should not sync the calendar')
+        try:
+            rv = self.app.get('/')
+        finally:
+            interlink.sync_games_to_calendar = original_sync
+        self.assertEqual(rv.status_code, 200)
+
+    def test_calendar_sync_command_without_service(self):
+        """Test the calendar-sync command exits cleanly when no service account is configured"""
+        interlink.GOOGLE_CALENDAR_AVAILABLE = True
+        original_service = interlink.get_calendar_service
+        interlink.get_calendar_service = lambda: None
+        try:
+            result = interlink.app.test_cli_runner().invoke(args=['calendar-sync'])
+        finally:
+            interlink.get_calendar_service = original_service
+        self.assertIn('Calendar service not available.', result.output)
+
+    def create_scheduled_league(self, num_games):
+        """Helper that creates a league with two teams and unplayed games starting today"""
+        db = interlink.get_db()
+        league_id = db.execute('INSERT INTO leagues (league_name, sport, max_teams) VALUES (?, ?, ?)',
+                               ('Calendar League', 'Soccer', 8)).lastrowid
+        home_id = db.execute('INSERT INTO teams (name, league_id) VALUES (?, ?)', ('Home', league_id)).lastrowid
+        away_id = db.execute('INSERT INTO teams (name, league_id) VALUES (?, ?)', ('Away', league_id)).lastrowid
+        today = interlink.datetime.now().date()
+        for day in range(num_games):
+            game_date = (today + interlink.timedelta(days=day % 30)).strftime('%Y-%m-%d') + ' 19:00:00'
+            db.execute('INSERT INTO games (league_id, home_team_id, away_team_id, game_date) VALUES (?, ?, ?, ?)',
+                       (league_id, home_id, away_id, game_date))
+        db.commit()
+        return league_id
+
+    def test_sync_games_to_calendar_batches_inserts(self):
+        """Test new games are inserted in batches of at most 50 and recorded as synced"""
+        service = FakeCalendarService()
+        original_service = interlink.get_calendar_service
+        interlink.get_calendar_service = lambda: service
+        try:
+            with interlink.app.app_context():
+                self.create_scheduled_league(120)
+                stats = interlink.sync_games_to_calendar()
+                synced = interlink.get_db().execute('SELECT COUNT(*) FROM calendar_synced_games').fetchone()[0]
+        finally:
+            interlink.get_calendar_service = original_service
+
+        self.assertEqual(service.batches, [50, 50, 20])
+        self.assertEqual(stats['inserted'], 120)
+        self.assertEqual(synced, 120)
+
+    def test_sync_games_to_calendar_only_sends_changes(self):
+        """Test a second sync only patches and deletes the games changed since the first"""
+        service = FakeCalendarService()
+        original_service = interlink.get_calendar_service
+        interlink.get_calendar_service = lambda: service
+        try:
+            with interlink.app.app_context():
+                self.create_scheduled_league(10)
+                interlink.sync_games_to_calendar()
+                service.calls.clear()
+
+                db = interlink.get_db()
+                db.execute("UPDATE games SET game_date = ? WHERE id = 1", [interlink.datetime.now().strftime('%Y-%m-%d 20:00:00')])
+                db.execute('UPDATE games SET home_score = 3, away_score = 1 WHERE id = 2')
+                db.execute('DELETE FROM games WHERE id = 3')
+                db.commit()
+                stats = interlink.sync_games_to_calendar()
+                synced = db.execute('SELECT COUNT(*) FROM calendar_synced_games').fetchone()[0]
+        finally:
+            interlink.get_calendar_service = original_service
+
+        self.assertEqual(sorted(method for method, _ in service.calls), ['delete', 'patch', 'patch'])
+        self.assertEqual((stats['inserted'], stats['patched'], stats['deleted']), (0, 2, 1))
+        self.assertEqual(synced, 9)
+
+    def test_sync_games_to_calendar_against_fake_calendar_server(self):
+        """Test a sync through the real client library against the offline calendar stand-in"""
+        import fake_calendar
+        server = fake_calendar.serve()
+        interlink.GOOGLE_CALENDAR_AVAILABLE = True
+        original_root = interlink.CALENDAR_API_ROOT
+        original_calendar_id = interlink.PUBLIC_CALENDAR_ID
+        interlink.CALENDAR_API_ROOT = server.url
+        interlink.PUBLIC_CALENDAR_ID = 'test@group.calendar.google.com'
+        interlink._calendar_shared.clear()
+        interlink._calendar_local.__dict__.clear()
+        try:
+            with interlink.app.app_context():
+                self.create_scheduled_league(60)
+                stats = interlink.sync_games_to_calendar()
+        finally:
+            interlink.CALENDAR_API_ROOT = original_root
+            interlink.PUBLIC_CALENDAR_ID = original_calendar_id
+            interlink._calendar_shared.clear()
+            interlink._calendar_local.__dict__.clear()
+            server.shutdown()
+
+        self.assertEqual(stats['inserted'], 60)
+        self.assertEqual(server.calendar.counts['batch'], 2)
+        self.assertEqual(len(server.calendar.live_events()), 60)
+
+    def test_reconcile_calendar_fixes_drift(self):
+        """Test reconciliation patches, restores and deletes only the events that drifted"""
+        import fake_calendar
+        server = fake_calendar.serve()
+        interlink.GOOGLE_CALENDAR_AVAILABLE = True
+        original_root = interlink.CALENDAR_API_ROOT
+        original_calendar_id = interlink.PUBLIC_CALENDAR_ID
+        interlink.CALENDAR_API_ROOT = server.url
+        interlink.PUBLIC_CALENDAR_ID = 'test@group.calendar.google.com'
+        interlink._calendar_shared.clear()
+        interlink._calendar_local.__dict__.clear()
+        try:
+            with interlink.app.app_context():
+                league_id = self.create_scheduled_league(5)
+                interlink.sync_games_to_calendar()
+
+                # Drift: an event edited by hand, one deleted by hand, a deleted game and a new score
+                server.calendar.events[interlink.calendar_event_id(1, league_id)]['summary'] = 'Edited'
+                server.calendar.events[interlink.calendar_event_id(2, league_id)]['status'] = 'cancelled'
+                db = interlink.get_db()
+                db.execute('DELETE FROM games WHERE id = 3')
+                db.execute('UPDATE games SET home_score = 2, away_score = 1 WHERE id = 4')
+                db.commit()
+
+                first = interlink.reconcile_calendar(full=True)
+                second = interlink.reconcile_calendar()
+                synced = db.execute('SELECT COUNT(*) FROM calendar_synced_games').fetchone()[0]
+        finally:
+            interlink.CALENDAR_API_ROOT = original_root
+            interlink.PUBLIC_CALENDAR_ID = original_calendar_id
+            interlink._calendar_shared.clear()
+            interlink._calendar_local.__dict__.clear()
+            server.shutdown()
+
+        self.assertEqual((first['patched'], first['inserted'], first['deleted']), (2, 1, 1))
+        self.assertEqual((second['patched'], second['inserted'], second['deleted']), (0, 0, 0))
+        self.assertEqual(synced, 4)
+        self.assertEqual(len(server.calendar.live_events()), 4)
+
+    def test_delete_calendar_events_reports_partial_failures(self):
+        """Test a failed delete in a batch doesn't stop the other deletes"""
+        service = FakeCalendarService(failing_ids={interlink.calendar_event_id(2, 1): 403})
+        records = [{'game_id': game_id, 'league_id': 1, 'calendar_event_id': interlink.calendar_event_id(game_id, 1)}
+                   for game_id in (1, 2, 3)]
+        with interlink.app.app_context():
+            deleted, failed = interlink.delete_calendar_events(service, records)
+            dead_letters = interlink.get_db().execute(
+                'SELECT game_id, operation FROM calendar_dead_letters').fetchall()
+
+        self.assertEqual(sorted(deleted), [1, 3])
+        self.assertEqual(failed, [2])
+        self.assertEqual([tuple(row) for row in dead_letters], [(2, 'delete')])
+
+    def test_delete_calendar_events_uses_stored_google_ids(self):
+        """Test events synced before IDs were derived are deleted by their stored ID, and a 404 keeps the row"""
+        service = FakeCalendarService(failing_ids={'googleid2': 404, interlink.calendar_event_id(3, 1): 404})
+        records = [{'game_id': 1, 'league_id': 1, 'calendar_event_id': 'googleid1'},
+                   {'game_id': 2, 'league_id': 1, 'calendar_event_id': 'googleid2'},
+                   {'game_id': 3, 'league_id': 1, 'calendar_event_id': None}]
+        with interlink.app.app_context():
+            deleted, failed = interlink.delete_calendar_events(service, records)
+
+        self.assertEqual([kwargs['eventId'] for _, kwargs in service.calls],
+                         ['googleid1', 'googleid2', interlink.calendar_event_id(3, 1)])
+        # A 404 on a derived ID means the event is gone, on a stored Google ID it proves nothing
+        self.assertEqual(sorted(deleted), [1, 3])
+        self.assertEqual(failed, [2])
+
+    def test_calendar_event_id_is_deterministic(self):
+        """Test event IDs only depend on the game and league and use Calendar's allowed characters"""
+        event_id = interlink.calendar_event_id(12, 3)
+        self.assertEqual(event_id, interlink.calendar_event_id(12, 3))
+        self.assertNotEqual(event_id, interlink.calendar_event_id(12, 4))
+        self.assertRegex(event_id, '^[a-v0-9]{5,1024}$')
+
+    def test_sync_games_to_calendar_patches_existing_event_on_conflict(self):
+        """Test an insert of an event that already exists (crashed earlier sync) becomes a patch"""
+        with interlink.app.app_context():
+            league_id = self.create_scheduled_league(2)
+        service = FakeCalendarService(failing_ids={interlink.calendar_event_id(1, league_id): 409})
+        original_service = interlink.get_calendar_service
+        interlink.get_calendar_service = lambda: service
+        try:
+            with interlink.app.app_context():
+                stats = interlink.sync_games_to_calendar()
+                synced = interlink.get_db().execute('SELECT COUNT(*) FROM calendar_synced_games').fetchone()[0]
+        finally:
+            interlink.get_calendar_service = original_service
+
+        self.assertEqual([method for method, _ in service.calls], ['insert', 'insert', 'patch'])
+        self.assertEqual((stats['inserted'], stats['failed']), (2, 0))
+        self.assertEqual(synced, 2)
+
+    def test_execute_calendar_batch_retries_rate_limited_calls(self):
+        """Test calls answered with 429 are retried in a later batch instead of failing"""
+        service = FakeCalendarService(failing_ids={'event2': 429})
+        requests = [(game_id, service.delete(calendarId='calendar', eventId=f'event{game_id}'))
+                    for game_id in (1, 2, 3)]
+        with mock.patch.object(interlink, 'calendar_backoff', return_value=0):
+            results = interlink.execute_calendar_batch(service, requests)
+
+        self.assertEqual(service.batches, [3, 1])
+        self.assertTrue(all(error is None for _, error in results.values()))
+
+    def test_token_bucket_paces_calls(self):
+        """Test the token bucket makes callers wait once the burst is used up"""
+        bucket = interlink.TokenBucket(rate=100, capacity=5)
+        started = interlink.time.monotonic()
+        bucket.take(5)
+        bucket.take(5)
+        self.assertGreaterEqual(interlink.time.monotonic() - started, 0.04)
+
+    def test_get_calendar_service_is_cached_per_thread(self):
+        """Test credentials are loaded once and each thread reuses its own client"""
+        from google.auth.credentials import AnonymousCredentials
+        loads = []
+
+        def fake_from_file(filename, scopes):
+            loads.append(filename)
+            return AnonymousCredentials()
+
+        interlink.GOOGLE_CALENDAR_AVAILABLE = True
+        original_file = interlink.SERVICE_ACCOUNT_FILE
+        interlink.SERVICE_ACCOUNT_FILE = 'service-account.json'
+        interlink._calendar_shared.clear()
+        loader_patch = mock.patch.object(interlink.service_account.Credentials, 'from_service_account_file',
+                                         side_effect=fake_from_file)
+        loader_patch.start()
+        try:
+            first = interlink.get_calendar_service()
+            second = interlink.get_calendar_service()
+            other_thread = []
+            worker = interlink.threading.Thread(target=lambda: other_thread.append(interlink.get_calendar_service()))
+            worker.start()
+            worker.join()
+        finally:
+            interlink.SERVICE_ACCOUNT_FILE = original_file
+            loader_patch.stop()
+            interlink._calendar_shared.clear()
+            interlink._calendar_local.__dict__.clear()
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other_thread[0])
+        self.assertEqual(loads, ['service-account.json'])
+
+# DATABASE CONNECTIONS
+    def test_get_db_applies_sqlite_pragmas(self):
+        """Test connections are opened in WAL mode with the configured busy timeout"""
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            self.assertEqual(db.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(db.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+
+    def test_get_db_reuses_connection_per_thread(self):
+        """Test app contexts on one thread share a connection and uncommitted work is rolled back"""
+        with interlink.app.app_context():
+            first = interlink.get_db()
+            first.execute("INSERT INTO leagues (league_name, sport, max_teams) VALUES ('Abandoned', 'Soccer', 4)")
+        with interlink.app.app_context():
+            second = interlink.get_db()
+            abandoned = second.execute("SELECT COUNT(*) FROM leagues WHERE league_name = 'Abandoned'").fetchone()[0]
+
+        other_thread = []
+        def other_request():
+            with interlink.app.app_context():
+                other_thread.append(interlink.get_db().connection)
+        worker = interlink.threading.Thread(target=other_request)
+        worker.start()
+        worker.join()
+
+        self.assertIs(first.connection, second.connection)
+        self.assertEqual(abandoned, 0)
+        self.assertIsNot(first.connection, other_thread[0])
+
+    def test_init_db_marks_all_migrations_applied(self):
+        """Test a fresh database starts at the newest migration so migrate has nothing to do"""
+        with interlink.app.app_context():
+            version = interlink.get_db().execute('PRAGMA user_version').fetchone()[0]
+            applied = interlink.migrate_db()
+        self.assertEqual(version, interlink.get_migrations()[-1][0])
+        self.assertEqual(applied, [])
+
+    def test_migrate_adds_missing_indexes(self):
+        """Test migrate brings an older database up to date and is safe to re-run"""
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute('DROP INDEX idx_teams_name')
+            db.execute('PRAGMA user_version = 0')
+            db.commit()
+        result = interlink.app.test_cli_runner().invoke(args=['migrate'])
+        with interlink.app.app_context():
+            plan = interlink.get_db().execute('EXPLAIN QUERY PLAN SELECT id FROM teams WHERE name = ?',
+                                              ['Cheese']).fetchall()
+
+        self.assertIn('Applied migrations: 1, 2', result.output)
+        self.assertIn('idx_teams_name', plan[0]['detail'])
+
+    # SQL INSTRUMENTATION
+
+    def test_normalize_sql_collapses_literals_and_in_lists(self):
+        """Test statements that differ only in literals and IN list length share a shape"""
+        first = interlink.normalize_sql("SELECT * FROM teams\n  WHERE id IN (1, 2, 3) AND name = 'A''s'")
+        second = interlink.normalize_sql("SELECT * FROM teams WHERE id IN (?,?) AND name = ?")
+        self.assertEqual(first, 'SELECT * FROM teams WHERE id IN (?) AND name = ?')
+        self.assertEqual(first, second)
+
+    def test_query_stats_flags_repeated_shapes(self):
+        """Test a statement shape run once per row is reported as an N+1"""
+        stats = interlink.QueryStats()
+        stats.record('SELECT * FROM leagues WHERE id = 1', 0.001)
+        for team_id in range(12):
+            stats.record(f'SELECT name FROM teams WHERE id = {team_id}', 0.001)
+        self.assertEqual(stats.count, 13)
+        self.assertAlmostEqual(stats.total_time, 0.013)
+        self.assertEqual(stats.n_plus_one(10), [('SELECT name FROM teams WHERE id = ?', 12)])
+
+    def test_record_queries_collects_per_request_stats(self):
+        """Test each request's queries are recorded under its endpoint"""
+        with interlink.record_queries() as recorded:
+            self.app.get('/')
+            self.app.get('/league/1')
+        self.assertEqual([endpoint for endpoint, _ in recorded], ['home_page', 'league_page'])
+        self.assertLessEqual(recorded[0][1].count, interlink.app.config['SQL_QUERY_BUDGETS']['home_page'])
+        self.assertGreater(recorded[1][1].count, 0)
+
+    def test_query_budget_exceeded_fails_the_request(self):
+        """Test an endpoint over its query budget raises while budgets are enforced"""
+        with mock.patch.dict(interlink.app.config['SQL_QUERY_BUDGETS'], {'home_page': 0}):
+            with self.assertRaises(interlink.QueryBudgetExceeded):
+                self.app.get('/')
+
+    # STANDINGS
+
+    def record_games(self, league_id, results):
+        """Plays games given as (home_id, away_id, home_score, away_score), one day apart, and returns their ids"""
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            game_ids = []
+            for day, (home, away, home_score, away_score) in enumerate(results):
+                game_id = db.execute('INSERT INTO games (league_id, home_team_id, away_team_id, game_date) VALUES (?, ?, ?, ?)',
+                                     [league_id, home, away, f'2025-01-{day + 1:02d} 19:00:00']).lastrowid
+                interlink.set_game_score(db, game_id, home_score, away_score)
+                game_ids.append(game_id)
+            db.commit()
+            return game_ids
+
+    def test_del_team_leaves_standings_consistent(self):
+        """Test deleting a team that has played also drops its standings row, so check_standings stays clean"""
+        league_id, _ = self.create_user_league_teams('DeleteLeague', 3)
+        with interlink.app.app_context():
+            first, second, third = [row['id'] for row in interlink.get_db().execute(
+                'SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+        self.record_games(league_id, [(first, second, 2, 1), (third, first, 0, 0)])
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute("UPDATE users SET role = 'admin' WHERE username = 'testuser'")
+            db.commit()
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'testuser'
+
+        rv = self.app.post(f'/league/{league_id}/admin/delete_team', data={'team_id': third}, follow_redirects=True)
+        self.assertIn(b'Team &#34;Team 3&#34; deleted.', rv.data)
+        with interlink.app.app_context():
+            self.assertIsNone(interlink.get_db().execute('SELECT 1 FROM standings WHERE team_id = ?', [third]).fetchone())
+            self.assertEqual(interlink.check_standings(league_id), [])
+
+    def test_get_standings_tallies_record_points_and_streak(self):
+        """Test standings count ties, points for/against, win percentage and the latest streak"""
+        league_id, _ = self.create_user_league_teams('StandingsLeague', 3)
+        with interlink.app.app_context():
+            first, second, third = [row['id'] for row in interlink.get_db().execute(
+                'SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+        self.record_games(league_id, [(first, second, 3, 1), (second, third, 2, 2),
+                                      (third, first, 0, 4), (second, first, 5, 1), (third, second, 1, 0)])
+        with interlink.app.app_context():
+            standings = {team['team_name']: team for team in interlink.get_standings(league_id)}
+
+        self.assertEqual({key: standings['Team 1'][key] for key in
+                          ('wins', 'losses', 'ties', 'points_for', 'points_against', 'differential', 'streak')},
+                         {'wins': 2, 'losses': 1, 'ties': 0, 'points_for': 8, 'points_against': 6,
+                          'differential': 2, 'streak': 'L1'})
+        self.assertEqual(standings['Team 2']['ties'], 1)
+        self.assertAlmostEqual(standings['Team 2']['win_pct'], 1.5 / 4)
+        self.assertEqual(standings['Team 3']['streak'], 'W1')
+        self.assertEqual(standings['Team 3']['games_played'], 3)
+
+    def test_sort_standings_breaks_ties_by_later_keys(self):
+        """Test sort options order by their main field and fall back to the next key on ties"""
+        standings = [
+            {'team_name': 'B', 'wins': 2, 'win_pct': 0.5, 'differential': 3, 'points_for': 10, 'points_against': 7},
+            {'team_name': 'A', 'wins': 2, 'win_pct': 0.5, 'differential': 3, 'points_for': 9, 'points_against': 6},
+            {'team_name': 'C', 'wins': 1, 'win_pct': 1.0, 'differential': 9, 'points_for': 12, 'points_against': 3},
+        ]
+        names = lambda rows: [row['team_name'] for row in rows]
+        self.assertEqual(names(interlink.sort_standings(standings, 'wins')), ['A', 'B', 'C'])
+        self.assertEqual(names(interlink.sort_standings(standings, 'win_pct')), ['C', 'A', 'B'])
+        self.assertEqual(names(interlink.sort_standings(standings, 'points_against')), ['C', 'A', 'B'])
+        self.assertEqual(names(interlink.sort_standings(standings, 'bogus')), ['A', 'B', 'C'])
+
+    def test_league_page_standings_query_count_is_independent_of_team_count(self):
+        """Test the seeded 30 team league renders its standings within the league_page budget"""
+        with interlink.record_queries() as recorded:
+            rv = self.app.get('/league/1?sort=differential')
+        self.assertEqual(rv.status_code, 200)
+        self.assertLessEqual(recorded[0][1].count, interlink.app.config['SQL_QUERY_BUDGETS']['league_page'])
+
+    def test_set_game_score_edit_replaces_the_old_result(self):
+        """Test editing a score subtracts the old result so the standings match a full recomputation"""
+        league_id, _ = self.create_user_league_teams('EditedLeague', 2)
+        with interlink.app.app_context():
+            first, second = [row['id'] for row in interlink.get_db().execute(
+                'SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+        game_ids = self.record_games(league_id, [(first, second, 1, 0), (first, second, 2, 0)])
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            interlink.set_game_score(db, game_ids[1], 0, 3)
+            db.commit()
+            standings = {team['team_id']: team for team in interlink.get_standings(league_id)}
+            mismatches = interlink.check_standings(league_id)
+
+        self.assertEqual((standings[first]['wins'], standings[first]['losses']), (1, 1))
+        self.assertEqual(standings[first]['points_for'], 1)
+        self.assertEqual(standings[second]['streak'], 'W1')
+        self.assertEqual(mismatches, [])
+
+    def test_check_standings_finds_drift_and_rebuild_repairs_it(self):
+        """Test the consistency checker reports a hand edited row and rebuild-standings fixes it"""
+        league_id, _ = self.create_user_league_teams('DriftLeague', 2)
+        with interlink.app.app_context():
+            first, second = [row['id'] for row in interlink.get_db().execute(
+                'SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+        self.record_games(league_id, [(first, second, 2, 1), (second, first, 3, 3)])
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute('UPDATE standings SET wins = 5 WHERE team_id = ?', [first])
+            db.commit()
+            before = interlink.check_standings()
+
+        result = interlink.app.test_cli_runner().invoke(args=['rebuild-standings'])
+        with interlink.app.app_context():
+            after = interlink.check_standings()
+            row = interlink.get_db().execute('SELECT * FROM standings WHERE team_id = ?', [first]).fetchone()
+
+        self.assertEqual(before, [(first, 'wins', 5, 1)])
+        self.assertIn('Rebuilt standings for 2 teams', result.output)
+        self.assertEqual(after, [])
+        self.assertEqual((row['ties'], row['streak_result'], row['streak_length']), (1, 'T', 1))
+
+    # ROSTERS
+
+    def fill_rosters(self, league_id, players_per_team):
+        """Adds players_per_team new users to every team of the league and returns the team ids"""
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            team_ids = [row['id'] for row in db.execute('SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+            for team_id in team_ids:
+                for i in range(players_per_team):
+                    user_id = db.execute('INSERT INTO users (username, password_hash, name, email) VALUES (?, ?, ?, ?)',
+                                         [f'p{team_id}_{i}', 'x', f'Player {team_id}-{i}', f'p{team_id}_{i}@test.com']).lastrowid
+                    db.execute('INSERT INTO memberships (user_id, team_id, league_id) VALUES (?, ?, ?)',
+                               [user_id, team_id, league_id])
+            db.commit()
+            return team_ids
+
+    def test_get_rosters_loads_many_teams_in_one_query(self):
+        """Test the batch loader returns every requested team's roster in both shapes"""
+        league_id, _ = self.create_user_league_teams('RosterLeague', 3)
+        team_ids = self.fill_rosters(league_id, 2)
+        with interlink.app.app_context():
+            interlink.get_db().execute('DELETE FROM memberships WHERE team_id = ?', [team_ids[2]])
+            interlink.get_db().commit()
+        with interlink.app.app_context():
+            with interlink.app.test_request_context():
+                names = interlink.get_rosters(team_ids, 'name')
+                objects = interlink.get_rosters(team_ids[:1], 'object')
+                queries = interlink.g.sql_stats.count
+
+        self.assertEqual(names[team_ids[0]], [f'Player {team_ids[0]}-0', f'Player {team_ids[0]}-1'])
+        self.assertEqual(names[team_ids[2]], [])
+        self.assertEqual([player['username'] for player in objects[team_ids[0]]], [f'p{team_ids[0]}_0', f'p{team_ids[0]}_1'])
+        self.assertEqual(queries, 2)
+
+    def test_league_manager_query_count_is_independent_of_roster_size(self):
+        """Test league_manager stays within its query budget with full rosters"""
+        league_id, _ = self.create_user_league_teams('FullRosters', 8)
+        self.fill_rosters(league_id, 15)
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'testuser'
+            sess['role'] = 'user'
+
+        with interlink.record_queries() as recorded:
+            rv = self.app.get(f'/league/{league_id}/league_manager')
+        self.assertEqual(rv.status_code, 200)
+        self.assertIn(b'Player', rv.data)
+        self.assertLessEqual(recorded[0][1].count, interlink.app.config['SQL_QUERY_BUDGETS']['league_manager'])
+
+    # MATCH SCHEDULE PAGES
+
+    def test_get_schedule_page_walks_each_section_by_keyset(self):
+        """Test upcoming games page oldest first and finished games newest first without repeats"""
+        league_id, _ = self.create_user_league_teams('PagedLeague', 2)
+        with interlink.app.app_context():
+            first, second = [row['id'] for row in interlink.get_db().execute(
+                'SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+        self.record_games(league_id, [(first, second, 1, 0), (second, first, 2, 2), (first, second, 0, 3)])
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            # Two games share a date so the id breaks the tie
+            db.executemany('INSERT INTO games (league_id, home_team_id, away_team_id, game_date) VALUES (?, ?, ?, ?)',
+                           [(league_id, first, second, '2025-02-01 19:00:00'), (league_id, second, first, '2025-02-01 19:00:00'),
+                            (league_id, first, second, '2025-02-02 19:00:00')])
+            db.commit()
+
+            upcoming, cursor, after = [], None, None
+            while True:
+                page, cursor = interlink.get_schedule_page(league_id, False, after, per_page=2)
+                upcoming.extend(page)
+                if cursor is None:
+                    break
+                after = interlink.parse_schedule_cursor(cursor)
+            finished, finished_cursor = interlink.get_schedule_page(league_id, True, per_page=2)
+
+        self.assertEqual([(game['game_date'], game['id']) for game in upcoming],
+                         sorted((game['game_date'], game['id']) for game in upcoming))
+        self.assertEqual(len(set(game['id'] for game in upcoming)), 3)
+        self.assertEqual(upcoming[0]['home_team'], 'Team 1')
+        self.assertEqual([game['game_date'][:10] for game in finished], ['2025-01-03', '2025-01-02'])
+        self.assertIsNotNone(finished_cursor)
+
+    def test_match_schedule_limits_page_size_and_ignores_bad_cursors(self):
+        """Test the page size is capped and a malformed cursor starts from the first page"""
+        league_id, _ = self.create_user_league_teams('CappedLeague', 2)
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            first, second = [row['id'] for row in db.execute('SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+            db.executemany('INSERT INTO games (league_id, home_team_id, away_team_id, game_date) VALUES (?, ?, ?, ?)',
+                           [(league_id, first, second, f'2025-03-{day:02d} 19:00:00') for day in range(1, 6)])
+            db.commit()
+
+        with interlink.record_queries() as recorded:
+            rv = self.app.get(f'/match-schedule/{league_id}?per_page=2&upcoming=garbage')
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.data.count(b'Team 1 vs Team 2'), 2)
+        self.assertIn(b'2025-03-01', rv.data)
+        self.assertIn(b'More scheduled games', rv.data)
+        self.assertLessEqual(recorded[0][1].count, interlink.app.config['SQL_QUERY_BUDGETS']['match_schedule'])
+        self.assertIsNone(interlink.parse_schedule_cursor('2025-03-01 19:00:00,abc'))
+        self.assertIsNone(interlink.parse_schedule_cursor('2025-03-01 19:00:00,²'))
+        self.assertEqual(self.app.get(f'/match-schedule/{league_id}?per_page=²').status_code, 200)
+        self.assertEqual(interlink.parse_schedule_cursor('2025-03-01 19:00:00,7'), ('2025-03-01 19:00:00', 7))
+
+    # USER PAGE
+
+    def test_user_page_query_count_is_independent_of_team_count(self):
+        """Test a user on several teams gets every league's games within the user_page budget"""
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            user_id = db.execute('INSERT INTO users (username, password_hash, name, email, role) VALUES (?, ?, ?, ?, ?)',
+                                 ['busy', 'x', 'Busy Player', 'busy@test.com', 'user']).lastrowid
+            for number in range(4):
+                league_id = db.execute('INSERT INTO leagues (league_name, sport, max_teams) VALUES (?, ?, ?)',
+                                       [f'Busy League {number}', 'Soccer', 4]).lastrowid
+                home = db.execute('INSERT INTO teams (name, league_id) VALUES (?, ?)', [f'Home {number}', league_id]).lastrowid
+                away = db.execute('INSERT INTO teams (name, league_id) VALUES (?, ?)', [f'Away {number}', league_id]).lastrowid
+                db.execute('INSERT INTO memberships (user_id, team_id, league_id) VALUES (?, ?, ?)', [user_id, home, league_id])
+                db.executemany('INSERT INTO games (league_id, home_team_id, away_team_id, game_date) VALUES (?, ?, ?, ?)',
+                               [(league_id, home, away, f'2025-04-0{day} 19:00:00') for day in (1, 2)])
+            db.commit()
+
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'busy'
+            sess['role'] = 'user'
+        with interlink.record_queries() as recorded:
+            rv = self.app.get('/user_page')
+
+        self.assertEqual(rv.status_code, 200)
+        for number in range(4):
+            self.assertIn(f'Busy League {number}'.encode(), rv.data)
+            self.assertIn(f'Away {number}'.encode(), rv.data)
+        self.assertLessEqual(recorded[0][1].count, interlink.app.config['SQL_QUERY_BUDGETS']['user_page'])
+
+    # SCHEDULE GENERATION
+
+    def test_round_robin_rounds_are_balanced(self):
+        """Test every team plays once per round and meets every opponent home and away"""
+        for team_count in (2, 5, 8):
+            rounds = interlink.round_robin_rounds(range(1, team_count + 1))
+            games = [game for pairs in rounds for game in pairs]
+            for pairs in rounds:
+                playing = [team for game in pairs for team in game]
+                self.assertEqual(len(playing), len(set(playing)))
+            self.assertEqual(len(games), team_count * (team_count - 1))
+            self.assertEqual(len(set(games)), len(games))
+
+        # The fixed team alternates home and away every round, through both cycles
+        homes = [any(home == 1 for home, _ in pairs) for pairs in interlink.round_robin_rounds(range(1, 9))]
+        self.assertTrue(all(homes[i] != homes[i + 1] for i in range(len(homes) - 1)))
+
+    def test_round_dates_step_over_month_and_year_ends(self):
+        """Test game days are spread over each week and roll into the next year"""
+        start = interlink.datetime(2025, 12, 29).date()
+        days = interlink.round_dates(start, 4, 2)
+        self.assertEqual([f'{day:%Y-%m-%d}' for day in days], ['2025-12-29', '2026-01-01', '2026-01-05', '2026-01-08'])
+
+    def test_generate_schedule_writes_round_robin(self):
+        """Test the route replaces unplayed games with a double round robin, one game per team per day"""
+        league_id, _ = self.create_user_league_teams('ScheduledLeague', 5)
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute("UPDATE leagues SET status = 'active' WHERE id = ?", [league_id])
+            db.commit()
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'testuser'
+            sess['role'] = 'user'
+
+        self.app.post(f'/league/{league_id}/generate-schedule', data={'start_date': '2025-06-02', 'games_per_week': '2'})
+        with interlink.app.app_context():
+            games = interlink.get_db().execute('SELECT home_team_id, away_team_id, game_date FROM games WHERE league_id = ?',
+                                               [league_id]).fetchall()
+
+        self.assertEqual(len(games), 20)
+        per_day = {}
+        for game in games:
+            for team_id in (game['home_team_id'], game['away_team_id']):
+                per_day.setdefault((team_id, game['game_date']), 0)
+                per_day[(team_id, game['game_date'])] += 1
+        self.assertEqual(max(per_day.values()), 1)
+        self.assertEqual(min(game['game_date'] for game in games), '2025-06-02 19:00:00')
+
+    def assert_valid_packing(self, games, venue_ids=True):
+        """Checks no two games overlap at a venue and no team plays on the same or back to back days"""
+        if venue_ids:
+            starts = {}
+            for _, _, game_date, venue_id in games:
+                starts.setdefault(venue_id, []).append(interlink.schedule_seconds(game_date))
+            duration = interlink.SCHEDULE_GAME_DURATION.total_seconds()
+            for venue_starts in starts.values():
+                venue_starts.sort()
+                self.assertTrue(all(later - earlier >= duration for earlier, later in zip(venue_starts, venue_starts[1:])))
+        days = {}
+        for home_id, away_id, game_date, _ in games:
+            day = interlink.datetime.strptime(game_date[:10], '%Y-%m-%d').date().toordinal()
+            for team_id in (home_id, away_id):
+                days.setdefault(team_id, []).append(day)
+        for played in days.values():
+            played.sort()
+            self.assertTrue(all(later - earlier >= 2 for earlier, later in zip(played, played[1:])))
+
+    def test_pack_schedule_respects_venues_blackouts_and_bookings(self):
+        """Test games fill free venue slots, skip blackout dates and overlapping bookings of other leagues"""
+        start = interlink.datetime(2025, 6, 2).date()
+        blackout = {interlink.datetime(2025, 6, 4).date()}
+        # A 19:00 game overlaps both the 18:00 and the 20:00 game at its venue
+        booked = {1: [interlink.schedule_seconds('2025-06-02 19:00:00')]}
+        days = interlink.play_days(start, {0, 2, 4}, blackout)
+        games = interlink.pack_schedule(interlink.round_robin_rounds(range(1, 7)), days,
+                                        ['18:00:00', '20:00:00'], [1, 2], booked)
+
+        self.assertEqual(len(games), 30)
+        self.assert_valid_packing(games)
+        dates = {game_date[:10] for _, _, game_date, _ in games}
+        self.assertNotIn('2025-06-04', dates)
+        self.assertFalse([game_date for _, _, game_date, venue_id in games
+                          if venue_id == 1 and game_date.startswith('2025-06-02')])
+        self.assertEqual(len([game for game in games if game[2].startswith('2025-06-02')]), 2)
+        self.assertTrue(all(interlink.datetime.strptime(day, '%Y-%m-%d').weekday() in (0, 2, 4) for day in dates))
+
+    def test_pack_schedule_64_team_double_round_robin_is_fast(self):
+        """Test a 64 team double round robin over four courts is packed well under a second"""
+        started = interlink.time.perf_counter()
+        days = interlink.play_days(interlink.datetime(2025, 1, 6).date(), {0, 1, 2, 3, 4, 5, 6})
+        games = interlink.pack_schedule(interlink.round_robin_rounds(range(64)), days,
+                                        ['17:00:00', '18:30:00', '20:00:00'], [1, 2, 3, 4])
+        elapsed = interlink.time.perf_counter() - started
+
+        self.assertEqual(len(games), 64 * 63)
+        self.assert_valid_packing(games)
+        self.assertLess(elapsed, 0.5)
+
+    def test_generate_schedule_shares_venues_between_leagues(self):
+        """Test a second league scheduled on the same venue never overlaps the first league's games"""
+        league_ids = []
+        for name in ('Court League A', 'Court League B'):
+            with interlink.app.app_context():
+                db = interlink.get_db()
+                league_id = db.execute("INSERT INTO leagues (league_name, sport, max_teams, status) VALUES (?, 'Soccer', 4, 'active')",
+                                       [name]).lastrowid
+                db.executemany('INSERT INTO teams (name, league_id) VALUES (?, ?)',
+                               [(f'{name} {i}', league_id) for i in range(4)])
+                db.commit()
+            league_ids.append(league_id)
+            with self.app.session_transaction() as sess:
+                sess['logged_in'] = True
+                sess['username'] = 'admin'
+            self.app.post(f'/league/{league_id}/generate-schedule',
+                          data={'start_date': '2025-06-02', 'weekdays': ['0', '3'], 'times': '17:30, 18:00, 19:30',
+                                'venues': 'Shared Court', 'blackout_dates': '2025-06-05'})
+
+        with interlink.app.app_context():
+            games = interlink.get_db().execute('SELECT home_team_id, away_team_id, game_date, venue_id, league_id FROM games '
+                                               'WHERE league_id IN (?, ?)', league_ids).fetchall()
+        self.assertEqual(len(games), 24)
+        self.assertEqual(len({game['venue_id'] for game in games}), 1)
+        self.assert_valid_packing([tuple(game)[:4] for game in games])
+        self.assertNotIn('2025-06-05', {game['game_date'][:10] for game in games})
+        # 18:00 overlaps both others, so each evening has a 17:30 and a 19:30 game
+        self.assertEqual({game['game_date'][11:] for game in games}, {'17:30:00', '19:30:00'})
+
+    def test_plan_reschedule_keeps_moves_adds_and_removes(self):
+        """Test the diff keeps unchanged games, moves a pairing to its new slot and adds or removes the rest"""
+        existing = [
+            {'id': 1, 'home_team_id': 1, 'away_team_id': 2, 'game_date': '2025-06-02 19:00:00', 'venue_id': 1},
+            {'id': 2, 'home_team_id': 2, 'away_team_id': 1, 'game_date': '2025-06-05 19:00:00', 'venue_id': 1},
+            {'id': 3, 'home_team_id': 1, 'away_team_id': 3, 'game_date': '2025-06-09 19:00:00', 'venue_id': 1},
+        ]
+        schedule = [(1, 2, '2025-06-02 19:00:00', 1), (2, 1, '2025-06-06 19:00:00', 1), (3, 2, '2025-06-09 19:00:00', 1)]
+        plan = interlink.plan_reschedule(existing, schedule)
+
+        self.assertEqual(plan, {'keep': [1], 'move': [('2025-06-06 19:00:00', 1, 2)],
+                                'insert': [(3, 2, '2025-06-09 19:00:00', 1)], 'delete': [3]})
+
+    def test_generate_schedule_incremental_only_rewrites_changed_games(self):
+        """Test an incremental reschedule with a new blackout date keeps game ids and only deletes calendar events of removed games"""
+        league_id, _ = self.create_user_league_teams('IncrementalLeague', 4)
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute("UPDATE leagues SET status = 'active' WHERE id = ?", [league_id])
+            db.commit()
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'testuser'
+        form = {'start_date': '2025-06-02', 'weekdays': ['0', '3'], 'times': '19:00'}
+        self.app.post(f'/league/{league_id}/generate-schedule', data=form)
+        with interlink.app.app_context():
+            before = {row['id']: row['game_date'] for row in interlink.get_db().execute(
+                'SELECT id, game_date FROM games WHERE league_id = ?', [league_id])}
+
+        rv = self.app.post(f'/league/{league_id}/generate-schedule', follow_redirects=True,
+                           data=dict(form, incremental='1'))
+        self.assertIn(b'12 games unchanged, 0 moved, 0 added, 0 removed', rv.data)
+
+        # An extra game that the schedule doesn't want, and two games already on the calendar
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            game = db.execute('SELECT home_team_id, away_team_id FROM games WHERE league_id = ?', [league_id]).fetchone()
+            extra_id = db.execute('INSERT INTO games (league_id, home_team_id, away_team_id, game_date) VALUES (?, ?, ?, ?)',
+                                  [league_id, game['home_team_id'], game['away_team_id'], '2025-09-01 19:00:00']).lastrowid
+            kept_id = min(before)
+            db.executemany('INSERT INTO calendar_synced_games (game_id, league_id) VALUES (?, ?)',
+                           [(extra_id, league_id), (kept_id, league_id)])
+            db.commit()
+
+        service = FakeCalendarService()
+        interlink.GOOGLE_CALENDAR_AVAILABLE = True
+        with mock.patch.object(interlink, 'get_calendar_service', lambda: service):
+            rv = self.app.post(f'/league/{league_id}/generate-schedule', follow_redirects=True,
+                               data=dict(form, incremental='1', blackout_dates='2025-06-12'))
+        with interlink.app.app_context():
+            after = {row['id']: row['game_date'] for row in interlink.get_db().execute(
+                'SELECT id, game_date FROM games WHERE league_id = ?', [league_id])}
+
+        self.assertEqual(set(after), set(before))
+        moved = [game_id for game_id in after if after[game_id] != before[game_id]]
+        self.assertTrue(moved)
+        self.assertNotIn('2025-06-12', {game_date[:10] for game_date in after.values()})
+        self.assertIn(f'{12 - len(moved)} games unchanged, {len(moved)} moved, 0 added, 1 removed'.encode(), rv.data)
+        self.assertEqual(service.calls, [('delete', {'calendarId': interlink.PUBLIC_CALENDAR_ID,
+                                                     'eventId': interlink.calendar_event_id(extra_id, league_id)})])
+
+    def test_game_change_log_is_pruned_without_calendar(self):
+        """Test schedule and score writes don't pile up game_changes rows when no calendar sync will read them"""
+        league_id, _ = self.create_user_league_teams('LogLeague', 4)
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute("UPDATE leagues SET status = 'active' WHERE id = ?", [league_id])
+            db.commit()
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'testuser'
+        form = {'start_date': '2025-06-02', 'weekdays': ['0', '3']}
+
+        # With Calendar configured the sync needs the log, so it is kept
+        with mock.patch.object(interlink, 'calendar_sync_enabled', lambda: True), \
+                mock.patch.object(interlink, 'get_calendar_service', lambda: None):
+            self.app.post(f'/league/{league_id}/generate-schedule', data=form)
+        with interlink.app.app_context():
+            self.assertEqual(interlink.get_db().execute('SELECT COUNT(*) FROM game_changes').fetchone()[0], 12)
+
+        self.app.post(f'/league/{league_id}/generate-schedule', data=form)
+        with interlink.app.app_context():
+            self.assertEqual(interlink.get_db().execute('SELECT COUNT(*) FROM game_changes').fetchone()[0], 0)
+            db = interlink.get_db()
+            game_id = db.execute('SELECT MIN(id) FROM games WHERE league_id = ?', [league_id]).fetchone()[0]
+            interlink.set_game_scores(db, [(game_id, 2, 1)])
+            db.commit()
+            self.assertEqual(db.execute('SELECT COUNT(*) FROM game_changes').fetchone()[0], 0)
+
+    def test_reschedule_holds_no_write_lock_during_calendar_deletes(self):
+        """Test a reschedule at a new venue has committed everything before its paced calendar calls"""
+        league_id, _ = self.create_user_league_teams('LockLeague', 4)
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute("UPDATE leagues SET status = 'active' WHERE id = ?", [league_id])
+            home, away = db.execute('SELECT id FROM teams WHERE league_id = ? LIMIT 2', [league_id]).fetchall()
+            old_id = db.execute('INSERT INTO games (league_id, home_team_id, away_team_id, game_date) VALUES (?, ?, ?, ?)',
+                                [league_id, home['id'], away['id'], '2025-09-01 19:00:00']).lastrowid
+            db.execute('INSERT INTO calendar_synced_games (game_id, league_id) VALUES (?, ?)', [old_id, league_id])
+            db.commit()
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'testuser'
+
+        in_transaction = []
+
+        def delete_calendar_events(service, synced_records):
+            in_transaction.append(interlink.get_db().in_transaction)
+            return [record['game_id'] for record in synced_records], []
+
+        interlink.GOOGLE_CALENDAR_AVAILABLE = True
+        with mock.patch.object(interlink, 'get_calendar_service', FakeCalendarService), \
+                mock.patch.object(interlink, 'delete_calendar_events', delete_calendar_events):
+            self.app.post(f'/league/{league_id}/generate-schedule',
+                          data={'start_date': '2025-06-02', 'weekdays': ['0', '3'], 'venues': 'Brand New Court'})
+
+        self.assertEqual(in_transaction, [False])
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            self.assertEqual(db.execute('SELECT COUNT(*) FROM games WHERE league_id = ?', [league_id]).fetchone()[0], 12)
+            self.assertIsNotNone(db.execute("SELECT id FROM venues WHERE name = 'Brand New Court'").fetchone())
+
+
+    def start_schedule_job_league(self, name, team_count):
+        """Creates an active league of team_count teams with testuser logged in, for schedule job tests"""
+        league_id, _ = self.create_user_league_teams(name, team_count)
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute("UPDATE leagues SET status = 'active' WHERE id = ?", [league_id])
+            db.commit()
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'testuser'
+        return league_id
+
+    def test_generate_schedule_job_commits_in_chunks(self):
+        """Test a large schedule is queued as a job that writes every chunk and reports its progress"""
+        league_id = self.start_schedule_job_league('JobLeague', 6)
+        progress = []
+        original_apply = interlink.apply_reschedule
+
+        def apply_reschedule(db, league_id, plan, chunk_size=None, progress_callback=None):
+            def record(done, total):
+                progress.append((done, total))
+                progress_callback(done, total)
+            return original_apply(db, league_id, plan, chunk_size, record)
+
+        with mock.patch.dict(interlink.app.config, {'SCHEDULE_BACKGROUND_MIN_GAMES': 30, 'SCHEDULE_JOB_CHUNK_SIZE': 8}), \
+                mock.patch.object(interlink, 'apply_reschedule', apply_reschedule), \
+                mock.patch.object(interlink, 'start_schedule_job') as start:
+            rv = self.app.post(f'/league/{league_id}/generate-schedule', data={'start_date': '2025-06-02', 'games_per_week': '2'})
+            job_id = start.call_args.args[0]
+            self.assertTrue(rv.headers['Location'].endswith(f'/league/{league_id}/generate-schedule?job={job_id}'))
+            self.assertIn(b'schedule-job-bar', self.app.get(rv.headers['Location']).data)
+            self.assertEqual(self.app.get(f'/league/{league_id}/generate-schedule/jobs/{job_id}').get_json()['status'],
+                             'queued')
+
+            # A second submit while the job is queued points at the same job
+            rv = self.app.post(f'/league/{league_id}/generate-schedule', data={'start_date': '2025-06-02'})
+            self.assertTrue(rv.headers['Location'].endswith(f'job={job_id}'))
+            self.assertEqual(start.call_count, 1)
+
+            interlink.run_schedule_job(job_id)
+
+        self.assertEqual(progress, [(8, 30), (16, 30), (24, 30), (30, 30)])
+        status = self.app.get(f'/league/{league_id}/generate-schedule/jobs/{job_id}').get_json()
+        self.assertEqual(status, {'id': job_id, 'status': 'done', 'total': 30, 'done': 30,
+                                  'message': 'Schedule updated: 0 games unchanged, 0 moved, 30 added, 0 removed'})
+        with interlink.app.app_context():
+            count = interlink.get_db().execute('SELECT COUNT(*) FROM games WHERE league_id = ?', [league_id]).fetchone()[0]
+        self.assertEqual(count, 30)
+
+    def test_generate_schedule_job_runs_on_a_thread(self):
+        """Test the job thread finishes the schedule, and a job that can't be scheduled is marked failed"""
+        league_id = self.start_schedule_job_league('ThreadJobLeague', 4)
+        with mock.patch.dict(interlink.app.config, {'SCHEDULE_BACKGROUND_MIN_GAMES': 1}):
+            rv = self.app.post(f'/league/{league_id}/generate-schedule', data={'start_date': '2025-06-02', 'games_per_week': '2'})
+        job_id = int(rv.headers['Location'].rsplit('=', 1)[1])
+
+        def wait(job_id):
+            for _ in range(200):
+                status = self.app.get(f'/league/{league_id}/generate-schedule/jobs/{job_id}').get_json()
+                if status['status'] in ('done', 'failed'):
+                    return status
+                time.sleep(0.05)
+            self.fail(f'schedule job {job_id} did not finish')
+
+        self.assertEqual(wait(job_id)['status'], 'done')
+        with interlink.app.app_context():
+            count = interlink.get_db().execute('SELECT COUNT(*) FROM games WHERE league_id = ?', [league_id]).fetchone()[0]
+        self.assertEqual(count, 12)
+
+        # A job whose schedule doesn't fit keeps the games and records why
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            failed_id = db.execute('INSERT INTO schedule_jobs (league_id, form) VALUES (?, ?)',
+                                   [league_id, '{"start_date": ["2025-06-02"], "weekdays": ["0"], "venues": ["Court"], '
+                                               '"blackout_dates": ["2025-06-02"]}']).lastrowid
+            db.commit()
+        with mock.patch.object(interlink, 'SCHEDULE_MAX_DAYS', 3):
+            interlink.run_schedule_job(failed_id)
+        status = self.app.get(f'/league/{league_id}/generate-schedule/jobs/{failed_id}').get_json()
+        self.assertEqual(status['status'], 'failed')
+        self.assertTrue(status['message'])
+        with interlink.app.app_context():
+            count = interlink.get_db().execute('SELECT COUNT(*) FROM games WHERE league_id = ?', [league_id]).fetchone()[0]
+        self.assertEqual(count, 12)
+
+        self.assertEqual(self.app.get(f'/league/{league_id}/generate-schedule/jobs/9999').status_code, 404)
+        self.clearSession()
+        self.assertEqual(self.app.get(f'/league/{league_id}/generate-schedule/jobs/{job_id}').status_code, 401)
+
+    def test_schedule_jobs_left_by_a_dead_process_are_recovered(self):
+        """Test a running job without progress is failed and doesn't block a new one, and queued jobs are restarted"""
+        league_id = self.start_schedule_job_league('StaleJobLeague', 4)
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            stale_id = db.execute("INSERT INTO schedule_jobs (league_id, form, status, updated_at) "
+                                  "VALUES (?, '{}', 'running', datetime('now', '-1 hour'))", [league_id]).lastrowid
+            live_id = db.execute("INSERT INTO schedule_jobs (league_id, form, status) VALUES (?, '{}', 'running')",
+                                 [league_id]).lastrowid
+            queued_id = db.execute("INSERT INTO schedule_jobs (league_id, form) VALUES (?, '{}')", [league_id]).lastrowid
+            db.commit()
+
+        with mock.patch.object(interlink, 'start_schedule_job') as start:
+            self.assertEqual(interlink.resume_schedule_jobs(), [queued_id])
+        start.assert_called_once_with(queued_id)
+        status = self.app.get(f'/league/{league_id}/generate-schedule/jobs/{stale_id}').get_json()
+        self.assertEqual(status['status'], 'failed')
+        self.assertIn('stopped responding', status['message'])
+        self.assertEqual(self.app.get(f'/league/{league_id}/generate-schedule/jobs/{live_id}').get_json()['status'],
+                         'running')
+
+        # Once the live job goes quiet too, the league can be scheduled again
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute("UPDATE schedule_jobs SET status = 'failed' WHERE id = ?", [queued_id])
+            db.execute("UPDATE schedule_jobs SET updated_at = datetime('now', '-1 hour') WHERE id = ?", [live_id])
+            db.commit()
+        with mock.patch.dict(interlink.app.config, {'SCHEDULE_BACKGROUND_MIN_GAMES': 1}), \
+                mock.patch.object(interlink, 'start_schedule_job') as start:
+            rv = self.app.post(f'/league/{league_id}/generate-schedule', data={'start_date': '2025-06-02'})
+        self.assertEqual(start.call_count, 1)
+        self.assertTrue(rv.headers['Location'].endswith(f'job={start.call_args.args[0]}'))
+        with interlink.app.app_context():
+            status = interlink.get_db().execute('SELECT status FROM schedule_jobs WHERE id = ?', [live_id]).fetchone()[0]
+        self.assertEqual(status, 'failed')
+
+
+    # SCORE IMPORT
+
+    def test_import_scores_upload_sets_scores_and_standings(self):
+        """Test an uploaded CSV scores games by id or by teams and date, edits old scores and keeps standings exact"""
+        league_id, _ = self.create_user_league_teams('ImportLeague', 3)
+        with interlink.app.app_context():
+            first, second, third = [row['id'] for row in interlink.get_db().execute(
+                'SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+        played, unplayed, dated = self.record_games(league_id, [(first, second, 1, 0), (second, third, 0, 0),
+                                                                (third, first, 0, 0)])
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute('UPDATE games SET home_score = NULL, away_score = NULL WHERE id IN (?, ?)', [unplayed, dated])
+            interlink.rebuild_standings(league_id)
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'testuser'
+
+        csv_data = ('game_id,home_team,away_team,date,home_score,away_score\n'
+                    f'{played},,,,2,2\n'
+                    f'{unplayed},,,,3,1\n'
+                    ',Team 3,Team 1,2025-01-03,0,4\n')
+        rv = self.app.post(f'/league/{league_id}/import-scores', follow_redirects=True, content_type='multipart/form-data',
+                           data={'scores_file': (io.BytesIO(csv_data.encode()), 'scores.csv')})
+        self.assertIn(b'3 scores imported successfully!', rv.data)
+
+        with interlink.app.app_context():
+            scores = {row['id']: (row['home_score'], row['away_score']) for row in interlink.get_db().execute(
+                'SELECT id, home_score, away_score FROM games WHERE league_id = ?', [league_id])}
+            self.assertEqual(interlink.check_standings(league_id), [])
+            standings = {team['team_id']: team for team in interlink.get_standings(league_id)}
+        self.assertEqual(scores, {played: (2, 2), unplayed: (3, 1), dated: (0, 4)})
+        self.assertEqual((standings[first]['wins'], standings[first]['ties'], standings[first]['streak']), (1, 1, 'W1'))
+
+    def test_set_game_scores_refreshes_streaks_in_one_statement(self):
+        """Test scoring games of many teams runs a fixed number of statements and leaves the streaks exact"""
+        league_id, _ = self.create_user_league_teams('StreakLeague', 8)
+        with interlink.app.app_context():
+            teams = [row['id'] for row in interlink.get_db().execute(
+                'SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+        game_ids = self.record_games(league_id, [(home, away, 0, 0) for home in teams for away in teams if home != away])
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute('UPDATE games SET home_score = NULL, away_score = NULL WHERE league_id = ?', [league_id])
+            interlink.rebuild_standings(league_id)
+            before = interlink.g.sql_stats.count
+            interlink.set_game_scores(db, [(game_id, game_id % 3, game_id % 2) for game_id in game_ids])
+            statements = interlink.g.sql_stats.count - before
+            db.commit()
+            self.assertEqual(interlink.check_standings(league_id), [])
+        # Load the games, write the scores, the standings and the streaks, prune the change log, bump the version
+        self.assertEqual(statements, 6)
+
+    def test_import_scores_reports_every_bad_row_and_writes_nothing(self):
+        """Test invalid rows are listed by line and block the whole import, from the upload form and the CLI"""
+        league_id, _ = self.create_user_league_teams('BadImportLeague', 2)
+        with interlink.app.app_context():
+            first, second = [row['id'] for row in interlink.get_db().execute(
+                'SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+        game_id, other_id = self.record_games(league_id, [(first, second, 0, 0), (second, first, 0, 0)])
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute('UPDATE games SET home_score = NULL, away_score = NULL WHERE league_id = ?', [league_id])
+            interlink.rebuild_standings(league_id)
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'testuser'
+
+        csv_data = ('game_id,home_team,away_team,date,home_score,away_score\n'
+                    f'{game_id},,,,2,1\n'
+                    f'{other_id},,,,two,1\n'
+                    '9999,,,,1,1\n'
+                    ',Team 1,Team 2,2025-02-01,1,0\n'
+                    f'{game_id},,,,3,1\n'
+                    '²,,,,1,1\n')
+        rv = self.app.post(f'/league/{league_id}/import-scores', content_type='multipart/form-data',
+                           data={'scores_file': (io.BytesIO(csv_data.encode()), 'scores.csv')})
+        self.assertIn(b'5 rows have errors, no scores were imported.', rv.data)
+        self.assertIn(b'Scores must be numbers', rv.data)
+        self.assertIn(b'Game 9999 not found in this league', rv.data)
+        self.assertIn('Game ² not found in this league'.encode(), rv.data)
+        self.assertIn(b'No game matches Team 1 vs Team 2 on 2025-02-01', rv.data)
+        self.assertIn(f'Game {game_id} is already scored on line 2'.encode(), rv.data)
+
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as f:
+            f.write(csv_data)
+        try:
+            failed = interlink.app.test_cli_runner().invoke(args=['import-scores', path, '--league-id', str(league_id)])
+            with interlink.app.app_context():
+                scored = interlink.get_db().execute('SELECT COUNT(*) FROM games WHERE home_score IS NOT NULL').fetchone()[0]
+            with open(path, 'w') as f:
+                f.write(f'game_id,home_score,away_score\n{game_id},2,1\n{other_id},1,1\n')
+            imported = interlink.app.test_cli_runner().invoke(args=['import-scores', path, '--league-id', str(league_id)])
+        finally:
+            os.unlink(path)
+
+        self.assertEqual(failed.exit_code, 1)
+        self.assertIn('Line 3: Scores must be numbers', failed.output)
+        self.assertEqual(scored, 0)
+        self.assertIn('Imported 2 scores.', imported.output)
+        with interlink.app.app_context():
+            self.assertEqual(interlink.check_standings(league_id), [])
+
+
+    # LEAGUE IMPORT
+
+    def create_import_users(self, count):
+        """Adds an admin 'casey' and count players named player0, player1..., logs casey in"""
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute('INSERT INTO users (username, password_hash, name, email, role) VALUES (?, ?, ?, ?, ?)',
+                       ('casey', 'x', 'casey', 'casey@test.com', 'admin'))
+            db.executemany('INSERT INTO users (username, password_hash, name, email) VALUES (?, ?, ?, ?)',
+                           [(f'player{i}', 'x', f'Player {i}', f'player{i}@test.com') for i in range(count)])
+            db.commit()
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'casey'
+            sess['role'] = 'admin'
+
+    def test_whole_league_creation_imports_teams_and_rosters(self):
+        """Test an uploaded roster CSV creates its teams next to the typed ones, with members and managers"""
+        self.create_import_users(5)
+        csv_data = ('team,username,manager\n'
+                    'Lions,player0,\n'
+                    'Lions,player1,yes\n'
+                    'Tigers,player2,\n'
+                    'Tigers,player3,\n'
+                    'Typed,player4,\n')
+        rv = self.app.post('/whole_league_creation', follow_redirects=True, content_type='multipart/form-data',
+                           data={'step': '2', 'league_name': 'Imported', 'sport': 'Soccer', 'max_teams': '4',
+                                 'league_admin': 'casey', 'team_names[]': ['Typed', 'Empty', ''],
+                                 'roster_file': (io.BytesIO(csv_data.encode()), 'rosters.csv')})
+        self.assertIn(b'League and teams created successfully.', rv.data)
+
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            league = db.execute("SELECT * FROM leagues WHERE league_name = 'Imported'").fetchone()
+            teams = {row['name']: row for row in db.execute('SELECT * FROM teams WHERE league_id = ?', [league['id']])}
+            rosters = interlink.get_rosters([team['id'] for team in teams.values()], 'name')
+            users = dict(db.execute('SELECT username, id FROM users').fetchall())
+
+        self.assertEqual(league['league_admin'], users['casey'])
+        self.assertEqual(set(teams), {'Typed', 'Empty', 'Lions', 'Tigers'})
+        self.assertEqual(sorted(rosters[teams['Lions']['id']]), ['Player 0', 'Player 1'])
+        self.assertEqual(rosters[teams['Empty']['id']], [])
+        self.assertEqual(teams['Lions']['team_manager'], users['player1'])
+        self.assertEqual(teams['Tigers']['team_manager'], users['player2'])
+        self.assertEqual(teams['Typed']['team_manager'], users['player4'])
+        self.assertIsNone(teams['Empty']['team_manager'])
+
+    def test_whole_league_creation_import_reports_set_errors(self):
+        """Test unknown users, players on two teams and repeated team names are all reported and nothing is created"""
+        self.create_import_users(2)
+        teams = [{'name': 'A', 'players': ['player0', 'ghost', 'player1']}, {'name': 'B', 'players': ['player1']},
+                 {'name': 'B', 'players': ['phantom']}]
+        rv = self.app.post('/whole_league_creation', content_type='multipart/form-data',
+                           data={'step': '2', 'league_name': 'Broken', 'sport': 'Soccer', 'max_teams': '4',
+                                 'league_admin': 'casey',
+                                 'roster_file': (io.BytesIO(json.dumps(teams).encode()), 'rosters.json')})
+        self.assertIn(b'Users not found: ghost, phantom', rv.data)
+        self.assertIn(b'Players on more than one team: player1 (A, B)', rv.data)
+        self.assertIn(b'Team names used more than once: B', rv.data)
+        with interlink.app.app_context():
+            self.assertIsNone(interlink.get_db().execute("SELECT id FROM leagues WHERE league_name = 'Broken'").fetchone())
+            _, errors = interlink.import_league(interlink.get_db(), {'league_name': 'Broken', 'sport': 'Soccer',
+                                                                     'max_teams': '²', 'league_admin': 'casey'}, [])
+            self.assertIn('Max teams must be 2 or more', errors)
+
+    def test_import_league_cli_handles_thousands_of_players(self):
+        """Test flask import-league creates a 5000 player league from JSON within seconds"""
+        self.create_import_users(5000)
+        league = {'league_name': 'Huge', 'sport': 'Soccer', 'league_admin': 'casey',
+                  'teams': [{'name': f'Team {t}', 'players': [f'player{t * 50 + i}' for i in range(50)]} for t in range(100)]}
+        fd, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(league, f)
+        try:
+            started = time.perf_counter()
+            result = interlink.app.test_cli_runner().invoke(args=['import-league', path])
+            elapsed = time.perf_counter() - started
+        finally:
+            os.unlink(path)
+
+        self.assertIn('with 100 teams and 5000 players', result.output)
+        self.assertLess(elapsed, 5)
+        with interlink.app.app_context():
+            count = interlink.get_db().execute('SELECT COUNT(*) FROM memberships').fetchone()[0]
+        self.assertEqual(count, 5000)
+
+    def test_read_league_import_rejects_json_that_is_not_a_league(self):
+        """Test JSON whose top level is neither a team list nor an object is a ValueError, not a crash"""
+        for text in ('"x"', '5', 'null', '{"teams": 3}'):
+            with self.assertRaisesRegex(ValueError, 'The JSON needs a list of teams'):
+                interlink.read_league_import(io.StringIO(text), 'league.json')
+        league, teams = interlink.read_league_import(io.StringIO('[{"name": "Solo"}]'), 'league.json')
+        self.assertEqual((league, teams), ({}, [{'name': 'Solo', 'manager': None, 'players': []}]))
+
+
+    # SCORE API
+
+    def score_api_league(self):
+        """An unplayed two game league with testuser logged in, returns the game ids"""
+        league_id, _ = self.create_user_league_teams('ApiLeague', 2)
+        with interlink.app.app_context():
+            first, second = [row['id'] for row in interlink.get_db().execute(
+                'SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+        game_ids = self.record_games(league_id, [(first, second, 0, 0), (second, first, 0, 0)])
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute('UPDATE games SET home_score = NULL, away_score = NULL, version = 0 WHERE league_id = ?', [league_id])
+            interlink.rebuild_standings(league_id)
+        with self.app.session_transaction() as sess:
+            sess['logged_in'] = True
+            sess['username'] = 'testuser'
+        return league_id, game_ids
+
+    def test_score_api_versions_replays_and_conflicts(self):
+        """Test batches bump versions, keyed retries replay the first answer and stale versions get 409"""
+        league_id, (first, second) = self.score_api_league()
+        batch = {'scores': [{'game_id': first, 'home_score': 2, 'away_score': 1},
+                            {'game_id': second, 'home_score': 0, 'away_score': 0}]}
+        rv = self.app.post('/api/v1/scores', json=batch, headers={'Idempotency-Key': 'night-1'})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.get_json(), {'games': [{'game_id': first, 'version': 1}, {'game_id': second, 'version': 1}]})
+
+        # The retry of a timed out request is answered from the stored response
+        retry = self.app.post('/api/v1/scores', json=batch, headers={'Idempotency-Key': 'night-1'})
+        self.assertEqual((retry.status_code, retry.get_json()), (200, rv.get_json()))
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        reused = self.app.post('/api/v1/scores', json={'scores': batch['scores'][:1]}, headers={'Idempotency-Key': 'night-1'})
+        self.assertEqual(reused.status_code, 422)
+
+        # Without the key the same batch is stale, nothing in it is written
+        stale = self.app.post('/api/v1/scores', json={'scores': [{'game_id': first, 'home_score': 5, 'away_score': 0, 'version': 1},
+                                                                 {'game_id': second, 'home_score': 3, 'away_score': 3}]})
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.get_json()['conflicts'],
+                         [{'game_id': second, 'version': 1, 'home_score': 0, 'away_score': 0}])
+
+        edit = self.app.post('/api/v1/scores', json={'scores': [{'game_id': first, 'home_score': 5, 'away_score': 0, 'version': 1}]})
+        self.assertEqual(edit.get_json(), {'games': [{'game_id': first, 'version': 2}]})
+        with interlink.app.app_context():
+            scores = interlink.get_db().execute('SELECT id, home_score, away_score, version FROM games WHERE league_id = ? ORDER BY id',
+                                                [league_id]).fetchall()
+            self.assertEqual(interlink.check_standings(league_id), [])
+        self.assertEqual([tuple(row) for row in scores], [(first, 5, 0, 2), (second, 0, 0, 1)])
+
+    def test_score_api_rejects_bad_batches(self):
+        """Test logged out requests, malformed rows and unknown games are refused without writing"""
+        league_id, (first, second) = self.score_api_league()
+        rv = self.app.post('/api/v1/scores', json={'scores': [{'game_id': first, 'home_score': '2', 'away_score': 1},
+                                                              {'game_id': second, 'home_score': -1, 'away_score': 1},
+                                                              {'game_id': first, 'home_score': 1, 'away_score': 1},
+                                                              {'game_id': 'x'}]})
+        self.assertEqual(rv.status_code, 400)
+        self.assertEqual([error['index'] for error in rv.get_json()['errors']], [0, 1, 2, 3])
+        self.assertEqual(self.app.post('/api/v1/scores', json={'scores': [{'game_id': 9999, 'home_score': 1, 'away_score': 1}]}
+                                       ).get_json()['errors'][0]['error'], 'Game 9999 not found')
+        self.assertEqual(self.app.post('/api/v1/scores', data='not json').status_code, 400)
+
+        # A stale edit form doesn't overwrite the newer score either
+        self.app.post('/api/v1/scores', json={'scores': [{'game_id': first, 'home_score': 1, 'away_score': 0}]})
+        rv = self.app.post(f'/edit_score?game_id={first}', follow_redirects=True,
+                           data={'home_score': '4', 'away_score': '4', 'version': '0'})
+        self.assertIn(b'This score was changed by someone else', rv.data)
+
+        self.clearSession()
+        self.assertEqual(self.app.post('/api/v1/scores', json={'scores': []}).status_code, 401)
+        with interlink.app.app_context():
+            scores = interlink.get_db().execute('SELECT home_score, away_score FROM games WHERE league_id = ? ORDER BY id',
+                                                [league_id]).fetchall()
+        self.assertEqual([tuple(row) for row in scores], [(1, 0), (None, None)])
+
+    def test_score_api_only_admins_overwrite_final_scores(self):
+        """Test any user may enter a first score, but only a league or site admin may change it"""
+        league_id, (first, second) = self.score_api_league()
+        self.app.post('/api/v1/scores', json={'scores': [{'game_id': first, 'home_score': 2, 'away_score': 1}]})
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute('INSERT INTO users (username, password_hash, name, email, role) VALUES (?, ?, ?, ?, ?)',
+                       ('scorer', generate_password_hash('password'), 'Scorer', 'scorer@test.com', 'user'))
+            db.commit()
+        with self.app.session_transaction() as sess:
+            sess['username'] = 'scorer'
+
+        rv = self.app.post('/api/v1/scores', json={'scores': [{'game_id': second, 'home_score': 1, 'away_score': 1},
+                                                              {'game_id': first, 'home_score': 0, 'away_score': 5, 'version': 1}]})
+        self.assertEqual(rv.status_code, 403)
+        self.assertEqual([(error['index'], error['game_id']) for error in rv.get_json()['errors']], [(1, first)])
+        rv = self.app.post('/api/v1/scores', json={'scores': [{'game_id': second, 'home_score': 1, 'away_score': 1}]})
+        self.assertEqual(rv.status_code, 200)
+
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute("UPDATE users SET role = 'admin' WHERE username = 'scorer'")
+            db.commit()
+        rv = self.app.post('/api/v1/scores', json={'scores': [{'game_id': first, 'home_score': 0, 'away_score': 5, 'version': 1}]})
+        self.assertEqual(rv.status_code, 200)
+        with interlink.app.app_context():
+            scores = interlink.get_db().execute('SELECT home_score, away_score FROM games WHERE league_id = ? ORDER BY id',
+                                                [league_id]).fetchall()
+        self.assertEqual([tuple(row) for row in scores], [(0, 5), (1, 1)])
+
+    def test_score_api_concurrent_first_writes_have_one_winner(self):
+        """Test scorekeepers racing on one unscored game get one 200 and 409s, not a silent overwrite"""
+        league_id, (first, _) = self.score_api_league()
+        statuses = []
+
+        def scorekeeper(home_score):
+            client = interlink.app.test_client()
+            with client.session_transaction() as sess:
+                sess['logged_in'] = True
+                sess['username'] = 'testuser'
+            rv = client.post('/api/v1/scores', json={'scores': [{'game_id': first, 'home_score': home_score, 'away_score': 0}]})
+            statuses.append(rv.status_code)
+            interlink.close_thread_db()
+
+        threads = [interlink.threading.Thread(target=scorekeeper, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [200] + [409] * 7)
+        with interlink.app.app_context():
+            self.assertEqual(interlink.get_db().execute('SELECT version FROM games WHERE id = ?', [first]).fetchone()[0], 1)
+            self.assertEqual(interlink.check_standings(league_id), [])
+
+
+    # JSON API
+
+    def league_version(self, league_id):
+        with interlink.app.app_context():
+            return interlink.get_league_version(league_id)['version']
+
+    def test_api_answers_unchanged_data_with_304_from_one_query(self):
+        """Test every read endpoint sends an ETag, answers If-None-Match with 304 and changes its ETag on writes"""
+        league_id, _ = self.create_user_league_teams('ApiReadLeague', 3)
+        with interlink.app.app_context():
+            team_ids = [row['id'] for row in interlink.get_db().execute(
+                'SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+        self.record_games(league_id, [(team_ids[0], team_ids[1], 2, 1)])
+        urls = [f'/api/v1/leagues/{league_id}', f'/api/v1/leagues/{league_id}/standings',
+                f'/api/v1/leagues/{league_id}/games?finished=1', f'/api/v1/teams/{team_ids[0]}']
+
+        etags = {}
+        for url in urls:
+            rv = self.app.get(url)
+            self.assertEqual(rv.status_code, 200)
+            etags[url] = rv.headers['ETag']
+            with interlink.record_queries() as recorded:
+                cached = self.app.get(url, headers={'If-None-Match': etags[url]})
+            self.assertEqual((cached.status_code, cached.data), (304, b''))
+            self.assertEqual(cached.headers['ETag'], etags[url])
+            self.assertEqual(recorded[0][1].count, 1)
+        self.assertEqual(len(set(etags.values())), len(urls))
+
+        # A new score changes every representation of the league
+        self.record_games(league_id, [(team_ids[1], team_ids[2], 0, 3)])
+        for url in urls:
+            rv = self.app.get(url, headers={'If-None-Match': etags[url]})
+            self.assertEqual(rv.status_code, 200)
+            self.assertNotEqual(rv.headers['ETag'], etags[url])
+
+    def test_api_returns_league_standings_games_and_team(self):
+        """Test the JSON shapes of the read endpoints and their 404s"""
+        league_id, testuser_id = self.create_user_league_teams('ApiShapeLeague', 2)
+        with interlink.app.app_context():
+            first, second = [row['id'] for row in interlink.get_db().execute(
+                'SELECT id FROM teams WHERE league_id = ? ORDER BY id', [league_id])]
+        game_id, = self.record_games(league_id, [(first, second, 3, 1)])
+
+        league = self.app.get(f'/api/v1/leagues/{league_id}').get_json()
+        self.assertEqual((league['name'], league['status']), ('ApiShapeLeague', 'signup'))
+        self.assertEqual(league['teams'], [{'id': first, 'name': 'Team 1', 'manager_id': testuser_id},
+                                           {'id': second, 'name': 'Team 2', 'manager_id': testuser_id}])
+        standings = self.app.get(f'/api/v1/leagues/{league_id}/standings').get_json()['standings']
+        self.assertEqual([(team['team_id'], team['wins'], team['streak']) for team in standings],
+                         [(first, 1, 'W1'), (second, 0, 'L1')])
+        games = self.app.get(f'/api/v1/leagues/{league_id}/games?finished=1').get_json()
+        self.assertEqual((games['next'], games['games'][0]['id'], games['games'][0]['version']), (None, game_id, 1))
+        self.assertEqual(self.app.get(f'/api/v1/leagues/{league_id}/games').get_json()['games'], [])
+        self.assertEqual(self.app.get(f'/api/v1/leagues/{league_id}/games?per_page=²').status_code, 200)
+        team = self.app.get(f'/api/v1/teams/{second}').get_json()
+        self.assertEqual((team['record']['losses'], [game['id'] for game in team['games']]), (1, [game_id]))
+
+        self.assertEqual(self.app.get('/api/v1/leagues/9999').status_code, 404)
+        self.assertEqual(self.app.get('/api/v1/leagues/9999/games').status_code, 404)
+        self.assertEqual(self.app.get('/api/v1/teams/9999').status_code, 404)
+
+    def test_league_version_follows_every_table_of_the_league(self):
+        """Test league and team rows bump the version by trigger, and bulk write paths bump it once each"""
+        league_id, testuser_id = self.create_user_league_teams('VersionLeague', 6)
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            other_id = db.execute("INSERT INTO leagues (league_name, sport, max_teams) VALUES ('Other', 'Soccer', 4)").lastrowid
+            db.commit()
+        other = self.league_version(other_id)
+
+        writes = [
+            "INSERT INTO teams (name, league_id) VALUES ('Team 7', :league)",
+            "UPDATE leagues SET status = 'active' WHERE id = :league",
+        ]
+        for statement in writes:
+            before = self.league_version(league_id)
+            with interlink.app.app_context():
+                db = interlink.get_db()
+                db.execute(statement, {'league': league_id, 'user': testuser_id})
+                db.commit()
+            self.assertGreater(self.league_version(league_id), before, statement)
+
+        # 42 games written and then scored, each path is one bump rather than one per row
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            team_ids = [row['id'] for row in db.execute('SELECT id FROM teams WHERE league_id = ?', [league_id])]
+            options = interlink.parse_schedule_form(MultiDict({'start_date': '2025-06-02'}))
+            before = self.league_version(league_id)
+            interlink.reschedule_league(db, league_id, team_ids, options, False)
+            db.commit()
+            self.assertEqual(self.league_version(league_id), before + 1)
+            game_ids = [row['id'] for row in db.execute('SELECT id FROM games WHERE league_id = ?', [league_id])]
+            self.assertEqual(len(game_ids), 42)
+            interlink.set_game_scores(db, [(game_id, 1, 0) for game_id in game_ids])
+            db.commit()
+            self.assertEqual(self.league_version(league_id), before + 2)
+
+            # A rebuild that finds nothing to write doesn't bump
+            other_before = self.league_version(other_id)
+            interlink.rebuild_standings(other_id)
+            self.assertEqual(self.league_version(other_id), other_before)
+        self.assertEqual(other_before, other)
+
+
+    # PAGE CACHING
+
+    def test_public_pages_answer_304_until_the_league_changes(self):
+        """Test league_page, match_schedule and home_page send validators, 304 cheaply and vary by visitor"""
+        league_id, _ = self.create_user_league_teams('CachedLeague', 2)
+        for url, endpoint in ((f'/league/{league_id}', 'league_page'), (f'/match-schedule/{league_id}', 'match_schedule'),
+                              ('/', 'home_page')):
+            rv = self.app.get(url)
+            etag, last_modified = rv.headers['ETag'], rv.headers['Last-Modified']
+            self.assertEqual(rv.headers['Cache-Control'], 'private, no-cache')
+            with interlink.record_queries() as recorded:
+                cached = self.app.get(url, headers={'If-None-Match': etag})
+            self.assertEqual((cached.status_code, cached.data), (304, b''), url)
+            self.assertEqual(recorded, [(endpoint, recorded[0][1])])
+            self.assertEqual(recorded[0][1].count, 1)
+            # Only the ETag validates, a date can't tell visitors or same-second writes apart
+            self.assertEqual(self.app.get(url, headers={'If-Modified-Since': last_modified}).status_code, 200)
+
+            # The layout shows who is logged in, so their copy is a different page
+            with self.app.session_transaction() as sess:
+                sess['logged_in'] = True
+                sess['username'] = 'testuser'
+            logged_in = self.app.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(logged_in.status_code, 200)
+            self.assertIn(b'Logged in as', logged_in.data)
+            self.assertEqual(self.app.get(url, headers={'If-None-Match': logged_in.headers['ETag']}).status_code, 304)
+            self.clearSession()
+
+            # A write to the league changes the page
+            with interlink.app.app_context():
+                db = interlink.get_db()
+                db.execute("INSERT INTO teams (name, league_id) VALUES (?, ?)", [f'Team for {endpoint}', league_id])
+                db.commit()
+            self.assertEqual(self.app.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+        # A waiting flash message is never swallowed by a 304
+        etag = self.app.get(f'/league/{league_id}').headers['ETag']
+        with self.app.session_transaction() as sess:
+            sess['_flashes'] = [('message', 'Hello there')]
+        rv = self.app.get(f'/league/{league_id}', headers={'If-None-Match': etag})
+        self.assertEqual(rv.status_code, 200)
+        self.assertIn(b'Hello there', rv.data)
+
+    def test_page_etags_are_the_same_in_every_worker(self):
+        """Test the ETag seed comes from the code, not the process, and a configured seed replaces it"""
+        self.assertEqual(interlink.PAGE_ETAG_SEED, interlink.code_fingerprint())
+        league_id, _ = self.create_user_league_teams('SeedLeague', 2)
+        etag = self.app.get(f'/league/{league_id}').headers['ETag']
+        with mock.patch.object(interlink, 'PAGE_ETAG_SEED', interlink.code_fingerprint()):
+            self.assertEqual(self.app.get(f'/league/{league_id}', headers={'If-None-Match': etag}).status_code, 304)
+        with mock.patch.dict(interlink.app.config, {'PAGE_ETAG_SEED': 'release-42'}):
+            self.assertEqual(self.app.get(f'/league/{league_id}', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_league_write_routes_bump_the_league_version(self):
+        """Test each route that changes a league moves its version forward"""
+        league_id, testuser_id = self.create_user_league_teams('WriteLeague', 3)
+        with interlink.app.app_context():
+            db = interlink.get_db()
+            db.execute("UPDATE users SET role = 'admin' WHERE id = ?", [testuser_id])
+            db.execute('INSERT INTO users (username, password_hash, name, email) VALUES (?, ?, ?, ?)',
+                       ('joiner', 'x', 'Joiner', 'joiner@test.com'))
+            db.commit()
+
+        def version():
+            with interlink.app.app_context():
+                return interlink.get_db().execute('SELECT version FROM league_versions WHERE league_id = ?',
+                                                  [league_id]).fetchone()[0]
+
+        def login(username):
+            with self.app.session_transaction() as sess:
+                sess['logged_in'] = True
+                sess['username'] = username
+
+        def game_id():
+            with interlink.app.app_context():
+                return interlink.get_db().execute('SELECT MIN(id) FROM games WHERE league_id = ?', [league_id]).fetchone()[0]
+
+        def new_team_id():
+            with interlink.app.app_context():
+                return interlink.get_db().execute("SELECT id FROM teams WHERE name = 'New Team'").fetchone()[0]
+
+        steps = [
+            ('create_team', 'testuser', lambda: self.app.post('/create_team', data={'name': 'New Team', 'league': 'WriteLeague'})),
+            ('join_team_submit', 'joiner', lambda: self.app.post('/join_team_submit', data={'league_hidden': 'WriteLeague',
+                                                                                          'team': 'Team 1'})),
+            ('del_team', 'testuser', lambda: self.app.post(f'/league/{league_id}/admin/delete_team',
+                                                           data={'team_id': new_team_id()})),
+            ('change_league_status', 'testuser', lambda: self.app.post('/change_phase', data={'status': 'signup',
+                                                                                              'league_id': league_id})),
+            ('generate_schedule', 'testuser', lambda: self.app.post(f'/league/{league_id}/generate-schedule',
+                                                                    data={'start_date': '2025-06-02'})),
+            ('submit_score', 'testuser', lambda: self.app.post('/submit_score', data={
+                'league_selected': league_id, 'game_id': game_id(), 'home_score': '1', 'away_score': '0'})),
+            ('edit_score', 'testuser', lambda: self.app.post(f'/edit_score?game_id={game_id()}',
+                                                             data={'home_score': '2', 'away_score': '0'})),
+            ('change_league_status', 'testuser', lambda: self.app.post('/change_phase', data={'status': 'active',
+                                                                                              'league_id': league_id})),
+            ('delete_league', 'testuser', lambda: self.app.post(f'/league/{league_id}/admin/delete_league')),
+        ]
+        for name, username, step in steps:
+            login(username)
+            before = version()
+            step()
+            self.assertGreater(version(), before, name)
+
+
 if __name__ == '__main__':
     unittest.main()
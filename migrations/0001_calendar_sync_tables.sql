@@ -0,0 +1,42 @@
+-- Calendar sync tables for databases created before the change log, governor and reconciliation
+
+CREATE TABLE IF NOT EXISTS game_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    game_id INTEGER NOT NULL,
+    league_id INTEGER,
+    change TEXT NOT NULL,  -- 'insert', 'update', 'delete' or 'retry'
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER IF NOT EXISTS games_after_insert AFTER INSERT ON games
+BEGIN
+    INSERT INTO game_changes (game_id, league_id, change) VALUES (NEW.id, NEW.league_id, 'insert');
+END;
+
+CREATE TRIGGER IF NOT EXISTS games_after_update AFTER UPDATE OF league_id, home_team_id, away_team_id, game_date, home_score, away_score ON games
+BEGIN
+    INSERT INTO game_changes (game_id, league_id, change) VALUES (NEW.id, NEW.league_id, 'update');
+END;
+
+CREATE TRIGGER IF NOT EXISTS games_after_delete AFTER DELETE ON games
+BEGIN
+    INSERT INTO game_changes (game_id, league_id, change) VALUES (OLD.id, OLD.league_id, 'delete');
+END;
+
+CREATE TABLE IF NOT EXISTS calendar_sync_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_change_id INTEGER NOT NULL DEFAULT 0,
+    window_end TEXT,
+    reconciled_at TEXT
+);
+
+INSERT OR IGNORE INTO calendar_sync_state (id) VALUES (1);
+
+CREATE TABLE IF NOT EXISTS calendar_dead_letters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    game_id INTEGER NOT NULL,
+    league_id INTEGER,
+    operation TEXT NOT NULL,
+    error TEXT,
+    failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,24 @@
+-- Indexes for the lookups in app.py, checked with EXPLAIN QUERY PLAN
+
+-- get_roster, join_team_submit: SELECT id FROM teams WHERE name=?
+CREATE INDEX IF NOT EXISTS idx_teams_name ON teams(name, id);
+-- join_team_form, join_team_submit, create_team: ... FROM leagues WHERE league_name=?
+CREATE INDEX IF NOT EXISTS idx_leagues_league_name ON leagues(league_name);
+-- signup: SELECT id FROM users WHERE email=?
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+-- get_roster: SELECT user_id FROM memberships WHERE team_id=?
+CREATE INDEX IF NOT EXISTS idx_memberships_team_id ON memberships(team_id, user_id);
+-- join_team_submit, create_team, team_manager_add_player: memberships WHERE user_id=? AND league_id=?
+CREATE INDEX IF NOT EXISTS idx_memberships_user_league ON memberships(user_id, league_id, team_id);
+-- team_view, team_manager: games WHERE home_team_id=? OR away_team_id=? (one index per side of the OR)
+CREATE INDEX IF NOT EXISTS idx_games_home_team ON games(home_team_id, game_date);
+CREATE INDEX IF NOT EXISTS idx_games_away_team ON games(away_team_id, game_date);
+-- match_schedule, generate_schedule, league pages: games WHERE league_id=? ORDER BY game_date
+CREATE INDEX IF NOT EXISTS idx_games_league_date ON games(league_id, game_date);
+-- delete_league: calendar_synced_games WHERE league_id=?
+CREATE INDEX IF NOT EXISTS idx_calendar_synced_games_league_id ON calendar_synced_games(league_id);
+
+-- Covered by idx_games_league_date
+DROP INDEX IF EXISTS idx_games_league_id;
+-- game_id is already the table's rowid
+DROP INDEX IF EXISTS idx_calendar_synced_games_game_id;
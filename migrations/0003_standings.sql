@@ -0,0 +1,43 @@
+-- Materialized standings, filled from the games that already have scores
+
+CREATE TABLE IF NOT EXISTS standings (
+    team_id INTEGER PRIMARY KEY,
+    league_id INTEGER NOT NULL,
+    games_played INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    ties INTEGER NOT NULL DEFAULT 0,
+    points_for INTEGER NOT NULL DEFAULT 0,
+    points_against INTEGER NOT NULL DEFAULT 0,
+    streak_result TEXT NOT NULL DEFAULT '',  -- 'W', 'L', 'T' or '' before the first game
+    streak_length INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (team_id) REFERENCES teams(id),
+    FOREIGN KEY (league_id) REFERENCES leagues(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_standings_league_id ON standings(league_id);
+
+INSERT OR REPLACE INTO standings (team_id, league_id, games_played, wins, losses, ties,
+                                  points_for, points_against, streak_result, streak_length)
+WITH results AS (
+    SELECT id, game_date, home_team_id AS team_id, home_score AS scored, away_score AS allowed
+    FROM games WHERE home_score IS NOT NULL AND away_score IS NOT NULL
+    UNION ALL
+    SELECT id, game_date, away_team_id, away_score, home_score
+    FROM games WHERE home_score IS NOT NULL AND away_score IS NOT NULL
+), ranked AS (
+    SELECT team_id, scored, allowed,
+           CASE WHEN scored > allowed THEN 'W' WHEN scored < allowed THEN 'L' ELSE 'T' END AS result,
+           ROW_NUMBER() OVER (PARTITION BY team_id ORDER BY game_date DESC, id DESC) AS recency
+    FROM results
+), latest AS (
+    SELECT team_id, result FROM ranked WHERE recency = 1
+)
+SELECT ranked.team_id, teams.league_id, COUNT(*),
+       SUM(ranked.result = 'W'), SUM(ranked.result = 'L'), SUM(ranked.result = 'T'),
+       SUM(scored), SUM(allowed), latest.result,
+       COALESCE(MIN(CASE WHEN ranked.result != latest.result THEN recency END) - 1, COUNT(*))
+FROM ranked
+JOIN latest ON latest.team_id = ranked.team_id
+JOIN teams ON teams.id = ranked.team_id
+GROUP BY ranked.team_id;
@@ -0,0 +1,18 @@
+-- Venues for the slot aware scheduler, and the venue of each game
+
+CREATE TABLE IF NOT EXISTS venues (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+
+ALTER TABLE games ADD COLUMN venue_id INTEGER REFERENCES venues(id);
+
+-- Finds the bookings of a venue when packing games into its slots
+CREATE INDEX IF NOT EXISTS idx_games_venue_date ON games(venue_id, game_date);
+
+-- Moving a game to another venue changes its calendar event
+DROP TRIGGER IF EXISTS games_after_update;
+CREATE TRIGGER games_after_update AFTER UPDATE OF league_id, home_team_id, away_team_id, game_date, home_score, away_score, venue_id ON games
+BEGIN
+    INSERT INTO game_changes (game_id, league_id, change) VALUES (NEW.id, NEW.league_id, 'update');
+END;
@@ -0,0 +1,16 @@
+-- Status rows of schedule generation run in the background
+
+CREATE TABLE IF NOT EXISTS schedule_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    league_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',  -- 'queued', 'running', 'done' or 'failed'
+    form TEXT NOT NULL,  -- the generate schedule form as JSON
+    total INTEGER NOT NULL DEFAULT 0,  -- games to delete, move and insert
+    done INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (league_id) REFERENCES leagues(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_schedule_jobs_league_status ON schedule_jobs(league_id, status);
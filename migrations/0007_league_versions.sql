@@ -0,0 +1,114 @@
+-- Per-league version counters kept by triggers, for ETags
+
+CREATE TABLE IF NOT EXISTS league_versions (
+    league_id INTEGER PRIMARY KEY,  -- kept after the league is deleted, so versions never repeat
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT OR IGNORE INTO league_versions (league_id, version) SELECT id, 1 FROM leagues;
+
+CREATE TRIGGER IF NOT EXISTS league_version_leagues_insert AFTER INSERT ON leagues
+WHEN NEW.id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_leagues_update AFTER UPDATE ON leagues
+WHEN NEW.id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_leagues_delete AFTER DELETE ON leagues
+WHEN OLD.id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (OLD.id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_teams_insert AFTER INSERT ON teams
+WHEN NEW.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_teams_update AFTER UPDATE ON teams
+WHEN NEW.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_teams_delete AFTER DELETE ON teams
+WHEN OLD.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (OLD.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_memberships_insert AFTER INSERT ON memberships
+WHEN NEW.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_memberships_update AFTER UPDATE ON memberships
+WHEN NEW.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_memberships_delete AFTER DELETE ON memberships
+WHEN OLD.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (OLD.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_games_insert AFTER INSERT ON games
+WHEN NEW.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_games_update AFTER UPDATE ON games
+WHEN NEW.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_games_delete AFTER DELETE ON games
+WHEN OLD.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (OLD.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_standings_insert AFTER INSERT ON standings
+WHEN NEW.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_standings_update AFTER UPDATE ON standings
+WHEN NEW.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER IF NOT EXISTS league_version_standings_delete AFTER DELETE ON standings
+WHEN OLD.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (OLD.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
@@ -0,0 +1,12 @@
+-- Games, memberships and standings bump their league's version once per write path
+-- (bump_league_versions in app.py) instead of once per row
+
+DROP TRIGGER IF EXISTS league_version_memberships_insert;
+DROP TRIGGER IF EXISTS league_version_memberships_update;
+DROP TRIGGER IF EXISTS league_version_memberships_delete;
+DROP TRIGGER IF EXISTS league_version_games_insert;
+DROP TRIGGER IF EXISTS league_version_games_update;
+DROP TRIGGER IF EXISTS league_version_games_delete;
+DROP TRIGGER IF EXISTS league_version_standings_insert;
+DROP TRIGGER IF EXISTS league_version_standings_update;
+DROP TRIGGER IF EXISTS league_version_standings_delete;
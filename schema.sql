@@ -10,6 +10,8 @@ CREATE TABLE users (
     email_verified DEFAULT FALSE
 );
 
+CREATE INDEX idx_users_email ON users(email);
+
 -- LEAGUES
 CREATE TABLE leagues (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -22,6 +24,8 @@ CREATE TABLE leagues (
     FOREIGN KEY (league_admin) REFERENCES users(id)
 );
 
+CREATE INDEX idx_leagues_league_name ON leagues(league_name);
+
 -- TEAMS
 CREATE TABLE teams (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -34,6 +38,8 @@ CREATE TABLE teams (
     UNIQUE (league_id, name)  -- prevent duplicate team names per league
 );
 
+CREATE INDEX idx_teams_name ON teams(name, id);
+
 -- GAMES
 CREATE TABLE games (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -44,13 +50,43 @@ CREATE TABLE games (
     away_score INTEGER,
     game_date DATETIME,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    venue_id INTEGER,
+    version INTEGER NOT NULL DEFAULT 0,  -- bumped by every score write, for optimistic concurrency
     FOREIGN KEY (league_id) REFERENCES leagues(id),
     FOREIGN KEY (home_team_id) REFERENCES teams(id),
-    FOREIGN KEY (away_team_id) REFERENCES teams(id)
+    FOREIGN KEY (away_team_id) REFERENCES teams(id),
+    FOREIGN KEY (venue_id) REFERENCES venues(id)
 );
 
-CREATE INDEX idx_games_league_id ON games(league_id);
 CREATE INDEX idx_games_game_date ON games(game_date);
+CREATE INDEX idx_games_league_date ON games(league_id, game_date);
+CREATE INDEX idx_games_home_team ON games(home_team_id, game_date);
+CREATE INDEX idx_games_away_team ON games(away_team_id, game_date);
+CREATE INDEX idx_games_venue_date ON games(venue_id, game_date);
+
+-- VENUES, courts and fields that several leagues can share
+CREATE TABLE venues (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+
+-- STANDINGS, one row per team that has played, kept current by set_game_score()
+CREATE TABLE standings (
+    team_id INTEGER PRIMARY KEY,
+    league_id INTEGER NOT NULL,
+    games_played INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    ties INTEGER NOT NULL DEFAULT 0,
+    points_for INTEGER NOT NULL DEFAULT 0,
+    points_against INTEGER NOT NULL DEFAULT 0,
+    streak_result TEXT NOT NULL DEFAULT '',  -- 'W', 'L', 'T' or '' before the first game
+    streak_length INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (team_id) REFERENCES teams(id),
+    FOREIGN KEY (league_id) REFERENCES leagues(id)
+);
+
+CREATE INDEX idx_standings_league_id ON standings(league_id);
 
 -- MEMBERSHIPS
 CREATE TABLE memberships (
@@ -64,6 +100,9 @@ CREATE TABLE memberships (
     FOREIGN KEY (league_id) REFERENCES leagues(id)
 );
 
+CREATE INDEX idx_memberships_team_id ON memberships(team_id, user_id);
+CREATE INDEX idx_memberships_user_league ON memberships(user_id, league_id, team_id);
+
 -- SYNCED CALENDAR GAMES
 CREATE TABLE calendar_synced_games (
     game_id INTEGER PRIMARY KEY,
@@ -74,7 +113,134 @@ CREATE TABLE calendar_synced_games (
     FOREIGN KEY (league_id) REFERENCES games(league_id)
 );
 
-CREATE INDEX idx_calendar_synced_games_game_id ON calendar_synced_games(game_id);
+CREATE INDEX idx_calendar_synced_games_league_id ON calendar_synced_games(league_id);
+
+-- GAME CHANGE LOG (filled by triggers, read by the calendar sync)
+CREATE TABLE game_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    game_id INTEGER NOT NULL,
+    league_id INTEGER,
+    change TEXT NOT NULL,  -- 'insert', 'update', 'delete' or 'retry'
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER games_after_insert AFTER INSERT ON games
+BEGIN
+    INSERT INTO game_changes (game_id, league_id, change) VALUES (NEW.id, NEW.league_id, 'insert');
+END;
+
+-- Only the columns that show up in the calendar event count as a change
+CREATE TRIGGER games_after_update AFTER UPDATE OF league_id, home_team_id, away_team_id, game_date, home_score, away_score, venue_id ON games
+BEGIN
+    INSERT INTO game_changes (game_id, league_id, change) VALUES (NEW.id, NEW.league_id, 'update');
+END;
+
+CREATE TRIGGER games_after_delete AFTER DELETE ON games
+BEGIN
+    INSERT INTO game_changes (game_id, league_id, change) VALUES (OLD.id, OLD.league_id, 'delete');
+END;
+
+-- CALENDAR SYNC WATERMARK (single row)
+CREATE TABLE calendar_sync_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_change_id INTEGER NOT NULL DEFAULT 0,
+    window_end TEXT,
+    reconciled_at TEXT  -- RFC 3339 time the last reconciliation started, used as updatedMin
+);
+
+INSERT INTO calendar_sync_state (id) VALUES (1);
+
+-- CALENDAR CALLS THAT KEPT FAILING AFTER RETRIES
+CREATE TABLE calendar_dead_letters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    game_id INTEGER NOT NULL,
+    league_id INTEGER,
+    operation TEXT NOT NULL,  -- 'insert', 'patch', 'delete' or 'adopt'
+    error TEXT,
+    failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- LEAGUE VERSIONS, bumped on every write to a league's data. The JSON API derives its ETags from
+-- them, so an unchanged league is answered with one lookup. Leagues and teams bump by trigger,
+-- games, memberships and standings are written in bulk, so their write paths bump once per
+-- transaction with bump_league_versions() instead of once per row.
+CREATE TABLE league_versions (
+    league_id INTEGER PRIMARY KEY,  -- kept after the league is deleted, so versions never repeat
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER league_version_leagues_insert AFTER INSERT ON leagues
+WHEN NEW.id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER league_version_leagues_update AFTER UPDATE ON leagues
+WHEN NEW.id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER league_version_leagues_delete AFTER DELETE ON leagues
+WHEN OLD.id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (OLD.id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER league_version_teams_insert AFTER INSERT ON teams
+WHEN NEW.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER league_version_teams_update AFTER UPDATE ON teams
+WHEN NEW.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (NEW.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER league_version_teams_delete AFTER DELETE ON teams
+WHEN OLD.league_id IS NOT NULL
+BEGIN
+    INSERT INTO league_versions (league_id, version, updated_at) VALUES (OLD.league_id, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT(league_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+END;
+
+-- IDEMPOTENCY KEYS, score API responses replayed to retries of the same request
+CREATE TABLE idempotency_keys (
+    user_id INTEGER NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    request_hash TEXT NOT NULL,  -- sha256 of the body, a reused key with another body is refused
+    status_code INTEGER NOT NULL,
+    response TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, idempotency_key),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+CREATE INDEX idx_idempotency_keys_created_at ON idempotency_keys(created_at);
+
+-- SCHEDULE GENERATION JOBS, large leagues are scheduled on a background thread
+CREATE TABLE schedule_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    league_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',  -- 'queued', 'running', 'done' or 'failed'
+    form TEXT NOT NULL,  -- the generate schedule form as JSON
+    total INTEGER NOT NULL DEFAULT 0,  -- games to delete, move and insert
+    done INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (league_id) REFERENCES leagues(id)
+);
+
+CREATE INDEX idx_schedule_jobs_league_status ON schedule_jobs(league_id, status);
 
 CREATE TABLE pending_registrations(
     id INTEGER PRIMARY KEY AUTOINCREMENT,